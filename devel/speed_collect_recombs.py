@@ -0,0 +1,58 @@
+"""
+Time RecombCollector.collect_recombs, fed one offspring (two lines) per call
+as simuPOP's Recombinator does, and fed a whole generation at once.
+"""
+import ftprime
+import msprime
+import numpy as np
+from timeit import default_timer as timer
+
+N = 1000
+ngens = 20
+num_loci = 101
+
+locus_position = list(np.linspace(0.0, 1.0, num_loci))
+init_ts = msprime.simulate(2 * N, random_seed=1)
+node_ids = {(k, p): 2 * k + p for k in range(N) for p in range(2)}
+rng = np.random.RandomState(1)
+
+
+def generation(gen):
+    lines = []
+    for j in range(N):
+        child = N * gen + j
+        for p in range(2):
+            parent = N * (gen - 1) + rng.randint(N)
+            recs = sorted(rng.choice(num_loci - 1, rng.poisson(1),
+                                     replace=False))
+            lines.append(" ".join(str(x) for x in
+                                  [child, parent, rng.randint(2)] + recs))
+    return lines
+
+
+gens = [generation(gen) for gen in range(1, ngens + 1)]
+
+for name in ('per offspring', 'per generation'):
+    rc = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids,
+                                 locus_position=locus_position, seed=1)
+    start = timer()
+    for lines in gens:
+        rc.increment_time()
+        if name == 'per offspring':
+            for j in range(0, len(lines), 2):
+                rc.collect_recombs(lines[j] + "\n" + lines[j + 1] + "\n")
+        else:
+            rc.collect_recombs("\n".join(lines) + "\n")
+    end = timer()
+    print(name + ":", 1e6 * (end - start) / (N * ngens), "us per offspring")
+
+short = "12 3 0 4\n12 5 1\n"
+start = timer()
+for _ in range(10000):
+    ftprime.parse_recombs(short)
+mid = timer()
+for _ in range(10000):
+    [[int(x) for x in line.split()] for line in short.split("\n")]
+end = timer()
+print("parse_recombs, two lines:", 1e6 * (mid - start) / 10000, "us")
+print("split and int, two lines:", 1e6 * (end - mid) / 10000, "us")
@@ -0,0 +1,131 @@
+"""
+Time simplifying a forward-time Wright-Fisher simulation every few
+generations with an ARGrecorder, and with a WindowedARGrecorder: that is, the
+time spent sorting and simplifying the tables (in ``_simplify_tables``), which
+is what the windows split up.  (The rest of ``simplify``, such as moving staged
+rows into the tables, is the same for both.)
+
+For the windowed recorder this reports the wall time on this machine, and the
+critical path: the time spent outside the window tasks plus, for each batch of
+tasks, the longest one; this is what the wall time comes to with a core per
+window (if the tasks do not hold the GIL), whatever the number of cores here.
+"""
+import concurrent.futures
+import ftprime
+import msprime
+import numpy as np
+import os
+import sys
+from timeit import default_timer as timer
+
+N = 2000
+ngens = 100
+simplify_interval = 10
+num_breakpoints = 1.5
+
+
+class TimingExecutor(concurrent.futures.Executor):
+    '''
+    Runs each task at once, recording how long it takes, grouped into batches
+    of consecutive tasks running the same function.
+    '''
+
+    def __init__(self):
+        self.batches = []
+        self._last = None
+
+    def submit(self, fn, *args, **kwargs):
+        start = timer()
+        future = concurrent.futures.Future()
+        future.set_result(fn(*args, **kwargs))
+        if fn is not self._last:
+            self.batches.append([])
+            self._last = fn
+        self.batches[-1].append(timer() - start)
+        return future
+
+
+class _Timed(object):
+
+    elapsed = 0.0
+
+    def _simplify_tables(self, sample_nodes):
+        start = timer()
+        super(_Timed, self)._simplify_tables(sample_nodes)
+        self.elapsed += timer() - start
+
+
+class _Plain(_Timed, ftprime.ARGrecorder):
+    pass
+
+
+class _Windowed(_Timed, ftprime.WindowedARGrecorder):
+    pass
+
+
+class _TimedWindowed(_Windowed):
+
+    def __init__(self, executor, **kwargs):
+        super(_TimedWindowed, self).__init__(**kwargs)
+        self.executor.shutdown()
+        self.executor = executor
+
+
+def run(mutation_rate, recorder_class, **kwargs):
+    """
+    Simulate, and return the recorder and the time spent simplifying.
+    """
+    rng = np.random.RandomState(1)
+    init_ts = msprime.simulate(N, recombination_rate=1.0, random_seed=1)
+    recorder = recorder_class(ts=init_ts, node_ids={k: k for k in range(N)},
+                              **kwargs)
+    pop = np.arange(N)
+    next_id = N
+    for t in range(1, ngens + 1):
+        children = np.arange(next_id, next_id + N)
+        next_id += N
+        recorder.add_individuals(children, float(t))
+        # each child inherits alternating segments from its two parents
+        num_segments = 1 + rng.poisson(num_breakpoints, size=N)
+        child = np.repeat(children, num_segments)
+        ends = np.cumsum(num_segments)
+        starts = ends - num_segments
+        left = rng.uniform(size=len(child))
+        left[starts] = 0.0
+        left = left[np.lexsort((left, child))]
+        right = np.concatenate([left[1:], [1.0]])
+        right[ends - 1] = 1.0
+        which = (np.arange(len(child)) - np.repeat(starts, num_segments)) % 2
+        parents = rng.randint(N, size=(N, 2))
+        parent = pop[parents[np.repeat(np.arange(N), num_segments), which]]
+        recorder.add_records(left, right, parent, child)
+        if mutation_rate > 0:
+            num_muts = rng.poisson(mutation_rate, size=N)
+            recorder.add_mutations(rng.uniform(size=num_muts.sum()),
+                                   np.repeat(children, num_muts), b"1", b"0",
+                                   infinite_sites=True)
+        pop = children
+        if t % simplify_interval == 0:
+            recorder.simplify(pop)
+    return recorder, recorder.elapsed
+
+
+print("cores:", os.cpu_count())
+for mutation_rate in (0.0, 10.0):
+    print("mutation rate", mutation_rate)
+    recorder, plain = run(mutation_rate, _Plain)
+    print("    plain: %.3f s, %d edges"
+          % (plain, recorder.tables.edges.num_rows))
+    for num_windows in (2, 4, 8):
+        recorder, wall = run(mutation_rate, _Windowed,
+                             num_windows=num_windows)
+        recorder.close()
+        executor = TimingExecutor()
+        recorder, total = run(mutation_rate, _TimedWindowed, executor=executor,
+                              num_windows=num_windows)
+        tasks = sum(sum(batch) for batch in executor.batches)
+        critical = total - tasks + sum(max(batch) for batch in executor.batches)
+        print("    %d windows: wall %.3f s, critical path %.3f s "
+              "(outside tasks %.3f s), speedup %.2f"
+              % (num_windows, wall, critical, total - tasks, plain / critical))
+        sys.stdout.flush()
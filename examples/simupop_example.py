@@ -1,7 +1,8 @@
 import simuPOP as sim
 import math
 import random
-from ftprime import RecombCollector
+from ftprime import RecombCollector, SimplifyScheduler
+from ftprime.operators import simplify_operator
 import msprime
 
 popsize = 10
@@ -42,19 +43,20 @@ haploid_labels = [(k,p) for k in first_gen
                         for p in (0,1)]
 node_ids = {x:j for x, j in zip(haploid_labels, init_ts.samples())}
 
-# 5. Initialize
+# 5. Initialize, with a scheduler that decides when to simplify the
+#    underlying tree sequence (helps reduce memory usage for bigger sims),
+#    and recording each generation's recombinations all at once
 rc = RecombCollector(ts=init_ts, node_ids=node_ids,
-                     locus_position=locus_position)
+                     locus_position=locus_position,
+                     scheduler=SimplifyScheduler(memory_budget=2**30),
+                     collection='generation')
 
 recombinator = sim.Recombinator(intensity=recomb_rate,
                                 output=rc.collect_recombs,
                                 infoFields="ind_id")
 
 
-# 6. Run the simulation, simplifying the underlying tree sequence
-#    every 5 generations (helps reduce memory usage for bigger sims)
-simplify_interval = 5
-
+# 6. Run the simulation, simplifying when the scheduler says to
 pop.evolve(
     initOps=[
         sim.InitSex()
@@ -62,8 +64,7 @@ pop.evolve(
     preOps=[
         # 5. Must keep time up to date in the RecombCollector
         sim.PyOperator(lambda pop: rc.increment_time() or True),
-        # Must return true or false. True keeps whole population (?)
-        sim.PyOperator(lambda pop: rc.simplify(pop.indInfo("ind_id")) or True, step=simplify_interval),
+        simplify_operator(rc),
     ],
     matingScheme=sim.RandomMating(
         ops=[id_tagger, recombinator]),
@@ -1,2 +1,7 @@
 from .argrecorder import *
+from .parsing import *
 from .recomb_collector import *
+from .multichrom import *
+from .scheduler import *
+from .stream import *
+from .windows import *
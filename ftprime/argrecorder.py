@@ -1,13 +1,135 @@
+import concurrent.futures
 import msprime
+import threading
 import time as timer  # otherwise name clash
 import numpy as np
 
+from . import checkpoint
+from . import journal as jnl
+from .benchmarker import Timings
+from .buffers import TableBuffer
+from .idmap import DenseIDMap
+from .sites import SiteIndex
+
 NULL_ID = -1
 
 def null_tree_sequence():
     return msprime.load_tables(nodes=msprime.NodeTable(),
                                edges=msprime.EdgeTable())
 
+def sort_tables(tables, num_sorted_edges=0):
+    """
+    Sort ``tables`` as required by msprime, given that the first
+    ``num_sorted_edges`` edges are already sorted.  This is done
+    incrementally: if the parents of the remaining, new edges are all no older
+    than the parents of the old edges (and they have no parents in common)
+    then only the new edges are sorted, and put in front of the old ones.  This
+    is always the case with nonoverlapping generations.  Otherwise, everything
+    is sorted.  Sites and mutations are sorted in any case.
+
+    :param TableCollection tables: The tables to sort.
+    :param int num_sorted_edges: The number of edges known to be sorted.
+    """
+    edges = tables.edges
+    num_old = num_sorted_edges
+    if num_old > edges.num_rows:
+        num_old = 0
+    if 0 < num_old < edges.num_rows:
+        times = tables.nodes.time
+        parent = edges.parent
+        old_parent = parent[:num_old]
+        new_parent = parent[num_old:]
+        new_times = times[new_parent]
+        is_old_parent = np.zeros(tables.nodes.num_rows, dtype='bool')
+        is_old_parent[old_parent] = True
+        if (new_times.max() > times[old_parent].min()
+                or np.any(is_old_parent[new_parent])):
+            num_old = 0
+    if num_old == 0:
+        tables.sort()
+    else:
+        if num_old < edges.num_rows:
+            left = edges.left
+            child = edges.child
+            order = np.lexsort((left[num_old:], child[num_old:],
+                                new_parent, new_times))
+            right = edges.right
+            edges.set_columns(
+                    left=np.concatenate((left[num_old:][order], left[:num_old])),
+                    right=np.concatenate((right[num_old:][order], right[:num_old])),
+                    parent=np.concatenate((new_parent[order], old_parent)),
+                    child=np.concatenate((child[num_old:][order], child[:num_old])))
+        # this sorts only sites and mutations
+        tables.sort(edge_start=edges.num_rows)
+
+
+def copy_tables(tables):
+    """
+    Return a copy of the nodes, edges, sites, mutations and populations of
+    ``tables``, made by copying each column once.
+
+    :param TableCollection tables: The tables to copy.
+    :return TableCollection: The copy.
+    """
+    copy = msprime.TableCollection(sequence_length=tables.sequence_length)
+    nodes = tables.nodes
+    copy.nodes.set_columns(flags=nodes.flags, population=nodes.population,
+                           time=nodes.time)
+    edges = tables.edges
+    copy.edges.set_columns(left=edges.left, right=edges.right,
+                           parent=edges.parent, child=edges.child)
+    sites = tables.sites
+    copy.sites.set_columns(position=sites.position,
+                           ancestral_state=sites.ancestral_state,
+                           ancestral_state_offset=sites.ancestral_state_offset)
+    mutations = tables.mutations
+    copy.mutations.set_columns(site=mutations.site, node=mutations.node,
+                               derived_state=mutations.derived_state,
+                               derived_state_offset=mutations.derived_state_offset)
+    populations = tables.populations
+    copy.populations.set_columns(metadata=populations.metadata,
+                                 metadata_offset=populations.metadata_offset)
+    return copy
+
+
+def _samples_key(samples):
+    """
+    A hashable copy of a list or array of input IDs, to compare sample sets.
+    """
+    return tuple(np.asarray(samples, dtype='int64').tolist())
+
+
+def _as_bytes(state):
+    if isinstance(state, bytes):
+        return state
+    return str(state).encode()
+
+
+class _BackgroundSimplify(object):
+    '''
+    A simplification of the tables of an ARGrecorder running on another
+    thread, and what the tables were like before it started.
+    '''
+
+    def __init__(self, recorder, sample_nodes, num_new_edges):
+        tables = recorder._tables
+        self.num_nodes = tables.nodes.num_rows
+        self.num_edges = tables.edges.num_rows
+        self.num_sites = tables.sites.num_rows
+        self.num_new_edges = num_new_edges
+        self.error = None
+        self.thread = threading.Thread(target=self.run,
+                                       args=(recorder, sample_nodes))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self, recorder, sample_nodes):
+        try:
+            recorder._simplify_tables(sample_nodes)
+        except Exception as e:
+            self.error = e
+
+
 class ARGrecorder(object):
     '''
     To record the ARG, this keeps track of
@@ -18,16 +140,34 @@ class ARGrecorder(object):
     individual IDs always equal to the (output) node IDs is to allow periodic
     simplification, which decouples the two.
 
-    Between simplification steps, the EdgeTable is appended to, so it is
-    always "up to date".  However, the NodeTable is *not* kept up to date,
+    Between simplification steps, new nodes, edges, sites and mutations are
+    staged in a columnar buffer (see :class:`ftprime.buffers.TableBuffer`),
+    which is flushed into the tables whenever they are needed: at each
+    simplification step, or when the ``tables`` attribute is accessed.  So,
+    the EdgeTable is always "up to date" when looked at.  However, the
+    NodeTable is *not* kept up to date,
     because its `time` fields are recorded in *time ago*; we also keep track of
         - a list of birth times of individual IDs
     which are translated to time-ago at each simplification step, and appended
-    to the Node Table.
+    to the Node Table.  Staged birth times are translated as they are moved
+    into the NodeTable, so that only the times already there are rewritten.
+    Since simplifying does not care if all times are shifted by the same
+    amount, these are measured back from the time of the last export (by
+    ``tree_sequence``, ``snapshot``, ``update_times`` or through ``tables``),
+    and are only shifted to be measured back from the current time at the
+    next export.
+
+    Alternatively, if the (forwards) time at which the simulation will end is
+    known in advance, pass it as ``end_time``: then birth times are translated
+    to time-ago before ``end_time`` as they go into the NodeTable, and never
+    need rewriting.
 
     The internal state is stored using
         - ``self.node_ids[k]`` : the output Node ID corresponding to the input
           individual ID ``k``.
+    which is a dict by default, or a :class:`ftprime.idmap.DenseIDMap` if
+    ``id_map='dense'``: this is smaller and faster if input IDs are handed out
+    in increasing order, so that the live individuals have nearby IDs.
 
     Must be initialized with a set of tables which will serve as the history of
     this first generation of individuals.
@@ -47,16 +187,39 @@ class ARGrecorder(object):
     2. Periodically, run ``simplify(samples)`` to remove unnecessary
         information from the recorded tables.  ``samples`` should be a list of
         input IDs of all individuals whose history may be needed in the future:
-        the current generation, and any ancestral samples.
+        the current generation, and any ancestral samples.  Alternatively, run
+        ``maybe_simplify(samples)`` every generation, and let a
+        :class:`ftprime.scheduler.SimplifyScheduler` decide when.
 
     Note: at any time, individuals for whom we have complete information are
     marked as samples in the Node Table; however, this is not consulted when
     calling ``simplify``.
 
+    Sorting is done incrementally: after a sort or a simplify the tables are
+    sorted, and edges added since then belong to younger parents, so usually
+    only these new edges need sorting, after which they go in front of the
+    old ones (see ``sort_tables``).
+
+    Simplification can also run in the background, with
+    ``simplify(samples, background=True)``: while the tables are sorted and
+    simplified on another thread, new records go on being staged, with node
+    IDs numbered as if the simplified tables had as many nodes as before.
+    When the tables are next needed (see ``wait``), the staged records are
+    renumbered to follow on from the simplified tables.
+
+    Likewise, ``snapshot(samples, path)`` exports the tree sequence from a
+    copy of the tables on another thread, so that writing out intermediate
+    results does not hold up the simulation.
+
+    The state of the recorder can be saved to disk with ``save``, and restored
+    with ``load``; with a :class:`ftprime.journal.Journal`, whatever is
+    recorded after the last ``save`` can be recovered too (see ``recover``).
+
     '''
 
     def __init__(self, node_ids=None, tables=None, ts=None, time=0.0,
-                 sequence_length=None, timings=None):
+                 sequence_length=None, timings=None, id_map='dict',
+                 scheduler=None, end_time=None, journal=None):
         """
         The tables passed in define history before the simulation begins.  If
         these are missing, then the input IDs specified in ``node_ids`` must be
@@ -75,7 +238,20 @@ class ARGrecorder(object):
             from input if not provided).
         :param ftprime.benchmarker.Timings timings:  An object to record timing
         information.
+        :param str id_map: How to store the map from input IDs to node IDs:
+            either 'dict' or 'dense' (see :class:`ftprime.idmap.DenseIDMap`).
+        :param ftprime.scheduler.SimplifyScheduler scheduler: An object to
+            decide when ``maybe_simplify`` should simplify (if this is given,
+            timing information is always recorded).
+        :param float end_time: If given, the (forwards) time at which the
+            simulation will end: node times are then recorded as time before
+            ``end_time``, and never need updating.
+        :param ftprime.journal.Journal journal: If given, everything recorded
+            is also written to this journal, so that the recorder can be
+            recovered from it and the last checkpoint (see ``recover``).
         """
+        if scheduler is not None and timings is None:
+            timings = Timings()
         if timings is not None:
             self.timings = timings
             start = timer.process_time()
@@ -86,9 +262,13 @@ class ARGrecorder(object):
         self.max_time = time  # T
         # dict of output node IDs indexed by input labels
         if node_ids is None:
-            self.node_ids = {}
-        else:
+            node_ids = {}
+        if id_map == 'dict':
             self.node_ids = dict(node_ids)
+        elif id_map == 'dense':
+            self.node_ids = DenseIDMap(node_ids)
+        else:
+            raise ValueError("id_map must be 'dict' or 'dense'.")
         # the actual tables that get updated
         #  DON'T actually store ts, just the tables:
         if ts is not None:
@@ -99,7 +279,14 @@ class ARGrecorder(object):
                 for j, k in enumerate(sorted(self.node_ids.keys())):
                     assert j == self.node_ids[k]
                     tables.nodes.add_row(population=msprime.NULL_POPULATION, time=time)
-        self.tables = tables
+        self._tables = tables
+        # rows recorded since the last time the tables were needed
+        self.buffer = TableBuffer()
+        # number of edges at the start of the EdgeTable known to be sorted
+        if ts is not None:
+            self.num_sorted_edges = tables.edges.num_rows
+        else:
+            self.num_sorted_edges = 0
         if sequence_length is not None:
             if ts is not None:
                 if sequence_length != ts.sequence_length:
@@ -114,18 +301,106 @@ class ARGrecorder(object):
             else:
                 raise ValueError("If prior history is not specified, sequence",
                                  "length must be provided.")
+        # the fixed (forwards) time that node times are measured back from
+        self.end_time = end_time
+        if end_time is not None:
+            if end_time < time:
+                raise ValueError("end_time must not be before time.")
+            nodes = self._tables.nodes
+            nodes.set_columns(flags=nodes.flags, population=nodes.population,
+                              time=nodes.time + (end_time - time))
+            time = end_time
         # last (forwards) time we updated node times
         self.last_update_time = time  # T_0
         # number of nodes that have the time right
-        self.last_update_node = self.tables.nodes.num_rows
-        # list of site positions, maintained as site tables don't have
+        self.last_update_node = self._tables.nodes.num_rows
+        # index of site positions, maintained as site tables don't have
         #   efficient checking for membership
-        self.site_positions = {p:k for k, p in enumerate(self.tables.sites.position)}
+        self.site_index = SiteIndex(self._tables.sites.position)
         # for bookkeeping
         self.num_simplifies = 0
+        # a simplification running in the background, if any
+        self._background = None
+        # the thread that snapshots are exported on, started when needed
+        self._exporter = None
+        # incremented whenever anything is recorded or the tables may change
+        self.version = 0
+        self.journal = journal
+        # (version, samples, tree sequence) for the last tree sequence
+        #   exported, or for the tables themselves just after a simplify (in
+        #   which case the tree sequence is made when first asked for)
+        self._cached = None
+        self.scheduler = scheduler
+        if self.scheduler is not None:
+            self.scheduler.start(self)
         if self.timings is not None:
             self.timings.time_prepping += timer.process_time() - start
 
+    @property
+    def tables(self):
+        """
+        The underlying TableCollection, with any staged rows flushed into it.
+        Node times that have been translated to time-ago are measured back
+        from the current time (see :meth:`update_times`).  Since the tables
+        may be modified through this, afterwards they are no longer assumed to
+        be sorted.
+        """
+        self.flush()
+        self._rebase_times()
+        self.num_sorted_edges = 0
+        self.version += 1
+        return self._tables
+
+    @property
+    def num_nodes(self):
+        """
+        The number of nodes recorded, including any not yet flushed.
+        """
+        return self._node_base() + self.buffer.num_nodes
+
+    @property
+    def num_edges(self):
+        """
+        The number of edges recorded, including any not yet flushed.  (While
+        simplifying in the background, this counts the edges from before
+        simplification.)
+        """
+        if self._background is not None:
+            return self._background.num_edges + self.buffer.num_edges
+        return self._tables.edges.num_rows + self.buffer.num_edges
+
+    def _node_base(self):
+        """
+        The node ID of the first node in the buffer.
+        """
+        if self._background is not None:
+            return self._background.num_nodes
+        return self._tables.nodes.num_rows
+
+    def _site_base(self):
+        """
+        The site ID of the first site in the buffer.
+        """
+        if self._background is not None:
+            return self._background.num_sites
+        return self._tables.sites.num_rows
+
+    def flush(self):
+        """
+        Move all rows staged since the last flush into the tables (after
+        waiting for any simplification running in the background).
+        """
+        self.wait()
+        if self.timings is not None:
+            start = timer.process_time()
+        if self.end_time is None:
+            self.buffer.flush(self._tables)
+        else:
+            self.buffer.flush(self._tables, time_origin=self.end_time)
+            self.last_update_node = self._tables.nodes.num_rows
+        if self.timings is not None:
+            self.timings.time_appending += timer.process_time() - start
+
     def __str__(self):
         ret = "\n---------\n"
         ret += "Max time so far:\n"
@@ -135,7 +410,8 @@ class ARGrecorder(object):
         ret += "Node IDs:\n"
         ret += str(self.node_ids) + "\n"
         ret += "Tables:\n"
-        ret += str(self.tables) + "\n"
+        self.flush()
+        ret += str(self._tables) + "\n"
         return ret
 
     def __call__(self, parent, time, population, child, left, right):
@@ -153,19 +429,108 @@ class ARGrecorder(object):
             self.add_individual(input_id=child, time=time, population=population)
         self.add_record(left=left, right=right, parent=parent, children=(child,))
 
+    def _has_ids(self, input_ids):
+        """
+        Return a boolean array saying which of the array ``input_ids`` are
+        recorded.
+        """
+        if isinstance(self.node_ids, DenseIDMap):
+            return self.node_ids.contains(input_ids)
+        node_ids = self.node_ids
+        return np.fromiter((u in node_ids for u in input_ids.tolist()),
+                           dtype='bool', count=len(input_ids))
+
+    def _lookup(self, input_ids):
+        """
+        Return the array of output node IDs corresponding to the array
+        ``input_ids``, with ``NULL_ID`` for any that are not recorded.
+        """
+        if isinstance(self.node_ids, DenseIDMap):
+            return self.node_ids.lookup(input_ids)
+        node_ids = self.node_ids
+        return np.fromiter((node_ids.get(u, NULL_ID) for u in input_ids.tolist()),
+                           dtype='int32', count=len(input_ids))
+
+    def has_ids(self, input_ids):
+        """
+        Return a boolean array saying which of ``input_ids`` are recorded.
+
+        :param array input_ids: An array (or list) of input IDs.
+        """
+        return self._has_ids(np.asarray(input_ids, dtype='int64'))
+
     def check_ids(self, input_ids):
         """
         Check that all ``input_ids`` are valid.
         """
-        for u in input_ids:
-            if u not in self.node_ids:
-                raise ValueError("Input ID " + str(u) + " not recorded.")
+        input_ids = np.asarray(input_ids, dtype='int64')
+        found = self._has_ids(input_ids)
+        if not np.all(found):
+            u = input_ids[np.logical_not(found)][0]
+            raise ValueError("Input ID " + str(u) + " not recorded.")
 
     def get_nodes(self, input_ids):
         """
-        Return the output node IDs corresponding to a list of input IDs.
+        Return the array of output node IDs corresponding to an array (or list)
+        of input IDs.
         """
-        return [self.node_ids[j] for j in input_ids]
+        input_ids = np.asarray(input_ids, dtype='int64')
+        nodes = self._lookup(input_ids)
+        missing = (nodes == NULL_ID)
+        if np.any(missing):
+            raise KeyError(int(input_ids[missing][0]))
+        return nodes
+
+    def _reserve_populations(self, max_population):
+        """
+        Make sure that the PopulationTable has a row for every population up
+        to ``max_population``, adding any missing ones all at once.
+        """
+        populations = self._tables.populations
+        num_new = max_population + 1 - populations.num_rows
+        if num_new > 0:
+            self.wait()
+            populations.append_columns(
+                    metadata=np.zeros(0, dtype='int8'),
+                    metadata_offset=np.zeros(num_new + 1, dtype='uint32'))
+
+    def set_populations(self, input_ids, populations):
+        '''
+        Change the population of each of ``input_ids`` to the corresponding
+        entry of ``populations``.  Nodes still in the buffer are changed there,
+        in place, and the NodeTable is rewritten (once) only if some of them
+        have already been flushed to it.
+
+        :param array input_ids: The input IDs of the individuals.
+        :param array populations: Their population IDs (either one value, or
+            one per individual).
+        '''
+        input_ids = np.asarray(input_ids, dtype='int64')
+        n = len(input_ids)
+        if n == 0:
+            return
+        populations = np.broadcast_to(np.asarray(populations, dtype='int32'), (n,))
+        if np.any(populations < msprime.NULL_POPULATION):
+            raise ValueError("Illegal population: " + str(populations.min()))
+        self._reserve_populations(populations.max())
+        nodes = self.get_nodes(input_ids)
+        if np.any(nodes < self._node_base()):
+            # the node IDs change when a background simplify finishes
+            self.wait()
+            nodes = self.get_nodes(input_ids)
+        base = self._node_base()
+        staged = (nodes >= base)
+        self.buffer.set_node_populations(nodes[staged] - base,
+                                         populations[staged])
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(jnl.POPULATIONS, (input_ids, populations))
+        if not np.all(staged):
+            table = self._tables.nodes
+            new_populations = table.population
+            new_populations[nodes[~staged]] = populations[~staged]
+            table.set_columns(flags=table.flags, time=table.time,
+                              population=new_populations)
 
     def add_individual(self, input_id, time,
                        flags=msprime.NODE_IS_SAMPLE,
@@ -181,16 +546,18 @@ class ARGrecorder(object):
         :param population int: The population ID of birth of the indivdiual
             (may be omitted).  
         '''
-        if (population != msprime.NULL_POPULATION 
-                and population > self.tables.populations.num_rows):
-            if population < 0:
-                raise ValueError("Illegal population: " + str(population))
-            while self.tables.populations.num_rows <= population:
-                self.tables.populations.add_row()
+        if population < msprime.NULL_POPULATION:
+            raise ValueError("Illegal population: " + str(population))
+        self._reserve_populations(population)
+        if self.end_time is not None and time > self.end_time:
+            raise ValueError("Birth time " + str(time) + " is after end_time.")
         if input_id not in self.node_ids:
-            self.node_ids[input_id] = self.tables.nodes.num_rows
-            self.tables.nodes.add_row(flags=flags, population=population,
-                                      time=time)
+            self.node_ids[input_id] = self.num_nodes
+            self.buffer.add_node(flags, population, time)
+            self.version += 1
+            if self.journal is not None:
+                self.journal.append_row(jnl.NODES, (input_id, time, flags,
+                                                    population))
             self.max_time = max(self.max_time, time)
         else:
             # nothing bad happens if we try to add an individual more than once,
@@ -216,10 +583,95 @@ class ARGrecorder(object):
         out_parent = self.node_ids[parent]
         out_children = tuple([self.node_ids[u] for u in children])
         for child in out_children:
-            self.tables.edges.add_row(parent=out_parent,
-                                      child=child,
-                                      left=left,
-                                      right=right)
+            self.buffer.add_edge(left, right, out_parent, child)
+        self.version += 1
+        if self.journal is not None:
+            for child in children:
+                self.journal.append_row(jnl.EDGES, (left, right, parent, child))
+
+    def add_individuals(self, input_ids, times,
+                        flags=msprime.NODE_IS_SAMPLE,
+                        populations=msprime.NULL_POPULATION):
+        '''
+        Add many new individuals at once: the array version of
+        ``add_individual``.  The new individuals are assigned consecutive
+        output Node IDs, in the order given, and are staged for the NodeTable
+        with a single column append.
+
+        :param array input_ids: The input IDs of the new individuals.
+        :param array times: The times of birth of the individuals (or a single
+            time shared by all of them).
+        :param flags int: Any msprime flags to record (either one value, or one
+            per individual).
+        :param populations array: The population IDs of birth of the
+            individuals (either one value, or one per individual).
+        '''
+        input_ids = np.asarray(input_ids, dtype='int64')
+        n = len(input_ids)
+        if n == 0:
+            return
+        times = np.broadcast_to(np.asarray(times, dtype='float64'), (n,))
+        flags = np.broadcast_to(np.asarray(flags, dtype='uint32'), (n,))
+        populations = np.broadcast_to(np.asarray(populations, dtype='int32'), (n,))
+        if np.any(populations < msprime.NULL_POPULATION):
+            raise ValueError("Illegal population: " + str(populations.min()))
+        self._reserve_populations(populations.max())
+        if self.end_time is not None and times.max() > self.end_time:
+            raise ValueError("Birth time " + str(times.max()) + " is after end_time.")
+        if len(np.unique(input_ids)) < n:
+            raise ValueError("Attempted to add the same individual twice.")
+        existing = self._has_ids(input_ids)
+        if np.any(existing):
+            raise ValueError("Attempted to add " + str(input_ids[existing][0]) +
+                             ", who already exits, as a new individual.")
+        first_node = self.num_nodes
+        new_nodes = np.arange(first_node, first_node + n, dtype='int32')
+        if isinstance(self.node_ids, DenseIDMap):
+            self.node_ids.set_many(input_ids, new_nodes)
+        else:
+            self.node_ids.update(zip(input_ids.tolist(), new_nodes.tolist()))
+        self.buffer.add_nodes(flags, populations, times)
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(jnl.NODES, (input_ids, times, flags,
+                                            populations))
+        self.max_time = max(self.max_time, times.max())
+
+    def add_records(self, lefts, rights, parents, children):
+        '''
+        Add many records at once: the array version of ``add_record``, except
+        that each record has exactly one child, so that the k-th record says
+        that ``children[k]`` inherits from ``parents[k]`` on the interval
+        ``[lefts[k], rights[k])``.  All records are staged for the EdgeTable
+        with a single column append.
+
+        :param array lefts: The left endpoints of the chromosomal segments inherited.
+        :param array rights: The right endpoints of the chromosomal segments inherited.
+        :param array parents: The input IDs of the parents.
+        :param array children: The input IDs of the children.
+        '''
+        lefts = np.asarray(lefts, dtype='float64')
+        rights = np.asarray(rights, dtype='float64')
+        parents = np.asarray(parents, dtype='int64')
+        children = np.asarray(children, dtype='int64')
+        n = len(parents)
+        if not len(lefts) == len(rights) == len(children) == n:
+            raise ValueError("lefts, rights, parents and children must have "
+                             "the same length.")
+        if n == 0:
+            return
+        out_parents = self._lookup(parents)
+        if np.any(out_parents == NULL_ID):
+            raise ValueError("Parent " + str(parents[out_parents == NULL_ID][0]) +
+                             "'s birth time has not been recorded with " +
+                             ".add_individual().")
+        out_children = self._lookup(children)
+        if np.any(out_children == NULL_ID):
+            raise KeyError(children[out_children == NULL_ID][0])
+        self.buffer.add_edges(lefts, rights, out_parents, out_children)
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append(jnl.EDGES, (lefts, rights, parents, children))
 
     def add_mutation(self, position, node, derived_state, ancestral_state):
         """
@@ -232,15 +684,83 @@ class ARGrecorder(object):
         :param string ancestral_state: The original allele that the mutation
             replaces (only used if this is the first mutation at this position).
         """
-        if position not in self.site_positions:
-            site = self.tables.sites.num_rows
-            self.tables.sites.add_row(position=position,
-                                      ancestral_state=ancestral_state)
-            self.site_positions[position] = site
+        site = self.site_index.get(position)
+        if site == msprime.NULL_NODE:
+            site = self._site_base() + self.buffer.num_sites
+            self.buffer.add_site(position, _as_bytes(ancestral_state))
+            self.site_index.add(position, site)
+        self.buffer.add_mutation(site, self.node_ids[node],
+                                 _as_bytes(derived_state))
+        self.version += 1
+        if self.journal is not None:
+            self.journal.append_row(jnl.MUTATIONS, (position, node,
+                                                    _as_bytes(derived_state),
+                                                    _as_bytes(ancestral_state)))
+
+    def add_mutations(self, positions, nodes, derived_states, ancestral_states,
+                      infinite_sites=False):
+        """
+        Add many mutations at once: the array version of ``add_mutation``, so
+        that the k-th mutation occurs at ``positions[k]`` on the chromosome of
+        ``nodes[k]``.  New sites are added for the positions that do not
+        already have one, found with a single lookup in the site index.
+
+        :param array positions: The chromosomal positions of the mutations.
+        :param array nodes: The input IDs of the individuals on whose
+            chromosomes the mutations occurred.
+        :param derived_states: The allele resulting from each mutation, or a
+            single allele for all of them.
+        :param ancestral_states: The original allele that each mutation
+            replaces (only used for mutations at new positions), or a single
+            allele for all of them.
+        :param bool infinite_sites: If True, the positions are taken to be
+            distinct from each other and from those of all mutations recorded
+            so far (as for positions drawn from a continuous distribution), and
+            a new site is added for every mutation without looking them up.
+        """
+        positions = np.asarray(positions, dtype='float64')
+        input_ids = np.asarray(nodes, dtype='int64')
+        n = len(positions)
+        if len(input_ids) != n:
+            raise ValueError("positions and nodes must have the same length.")
+        if n == 0:
+            return
+        if isinstance(derived_states, (bytes, str)):
+            derived_states = [derived_states] * n
+        if isinstance(ancestral_states, (bytes, str)):
+            ancestral_states = [ancestral_states] * n
+        if len(derived_states) != n or len(ancestral_states) != n:
+            raise ValueError("derived_states and ancestral_states must be "
+                             "single alleles or have the same length as "
+                             "positions.")
+        nodes = self._lookup(input_ids)
+        if np.any(nodes == NULL_ID):
+            raise KeyError(int(input_ids[nodes == NULL_ID][0]))
+        first_site = self._site_base() + self.buffer.num_sites
+        if infinite_sites:
+            sites = np.arange(first_site, first_site + n, dtype='int32')
+            new = np.arange(n)
         else:
-            site = self.site_positions[position]
-        self.tables.mutations.add_row(site=site, node=self.node_ids[node],
-                                      derived_state=derived_state)
+            sites = self.site_index.lookup(positions)
+            missing = np.flatnonzero(sites == msprime.NULL_NODE)
+            # the first mutation at each new position gets the new site
+            new_positions, first, inverse = np.unique(
+                    positions[missing], return_index=True, return_inverse=True)
+            order = np.argsort(first)
+            rank = np.empty(len(order), dtype='int32')
+            rank[order] = np.arange(len(order), dtype='int32')
+            sites[missing] = first_site + rank[inverse.ravel()]
+            new = missing[first[order]]
+        self.buffer.add_sites(positions[new],
+                              [_as_bytes(ancestral_states[j]) for j in new])
+        self.site_index.add_many(positions[new], sites[new])
+        derived_states = [_as_bytes(x) for x in derived_states]
+        self.buffer.add_mutations(sites, nodes, derived_states)
+        self.version += 1
+        if self.journal is not None:
+            kind = jnl.INFINITE_SITES_MUTATIONS if infinite_sites else jnl.MUTATIONS
+            self.journal.append(kind, (positions, input_ids, derived_states,
+                                       [_as_bytes(x) for x in ancestral_states]))
 
     def update_times(self):
         """
@@ -249,24 +769,70 @@ class ARGrecorder(object):
         NodeTable must be in reverse time (time since the end of the
         simulation).  Therefore, this needs to (a) add an increment to any
         already-updated times in the NodeTable, and (b) reverse any times added
-        since the last update.
+        since the last update.  Times still in the buffer are reversed as they
+        are appended to the NodeTable, and the NodeTable is only rewritten if
+        (a) or (b) applies to any of its rows.  If ``end_time`` was given, there
+        is nothing to do but flush the buffer.
+
+        Simplifying does not need (a), since shifting all node times by the
+        same amount does not change the result, so this is only done when the
+        tables are exported (by ``tree_sequence`` or ``snapshot``).
+        """
+        self._convert_times(self.max_time)
+
+    def _rebase_times(self):
+        """
+        Shift the node times already translated to time-ago so that they are
+        measured back from the current time, leaving the rest alone.
         """
         dt = self.max_time - self.last_update_time
-        times = self.tables.nodes.time
-        times[:self.last_update_node] = times[:self.last_update_node] + dt
-        times[self.last_update_node:] = self.max_time - times[self.last_update_node:]
-        self.tables.nodes.set_columns(flags=self.tables.nodes.flags,
-                                      population=self.tables.nodes.population,
-                                      time=times)
+        if self.end_time is not None or dt == 0:
+            return
+        self.wait()
+        nodes = self._tables.nodes
+        times = nodes.time
+        times[:self.last_update_node] += dt
+        nodes.set_columns(flags=nodes.flags, population=nodes.population,
+                          time=times)
         self.last_update_time = self.max_time
-        self.last_update_node = self.tables.nodes.num_rows
 
-    def simplify(self, samples):
+    def _convert_times(self, time_origin):
+        """
+        Flush the buffer, and make all times in the NodeTable be measured back
+        from the (forwards) time ``time_origin``, rewriting the NodeTable only
+        if needed.
+        """
+        if self.end_time is not None:
+            self.flush()
+            return
+        self.wait()
+        nodes = self._tables.nodes
+        dt = time_origin - self.last_update_time
+        if dt != 0 or self.last_update_node < nodes.num_rows:
+            times = nodes.time
+            times[:self.last_update_node] += dt
+            times[self.last_update_node:] = time_origin - times[self.last_update_node:]
+            nodes.set_columns(flags=nodes.flags, population=nodes.population,
+                              time=times)
+        if self.timings is not None:
+            start = timer.process_time()
+        self.buffer.flush(self._tables, time_origin=time_origin)
+        if self.timings is not None:
+            self.timings.time_appending += timer.process_time() - start
+        self.last_update_time = time_origin
+        self.last_update_node = nodes.num_rows
+
+    def simplify(self, samples, background=False, return_ts=False):
         """
         Simplifies the underlying tables.  `samples` should be a list of all
         "currently living" input individual IDs: i.e., anyone who might be a
         parent or a sample in the future.
 
+        If ``background`` is True, then the sorting and simplifying is done on
+        another thread, and this returns immediately; recording may continue
+        in the meantime.  (This saves time to the extent that msprime does
+        not hold the GIL while simplifying.)
+
         Note: to get the tree sequence for a set of samples use
         :meth:``ARGrecorder.tree_sequence``.
 
@@ -274,27 +840,155 @@ class ARGrecorder(object):
         individals in ``samples`` will be assigned output IDs
         ``0,...,len(samples)-1``.
 
+        The simplified tables are then exactly the tree sequence of
+        ``samples``, so until anything more is recorded,
+        ``tree_sequence(samples)`` just makes a TreeSequence from them (once),
+        rather than sorting and simplifying again.
+
         :param list samples: A list of the input IDs whose entire history
             should be kept; information not relevant to the history of these
             samples will be discarded.
+        :param bool background: Whether to simplify on another thread.
+        :param bool return_ts: Whether to return the tree sequence of
+            ``samples`` (as from ``tree_sequence(samples)``), which is made
+            from the simplified tables; this waits for the simplification to
+            finish, even with ``background``.
+        :return TreeSequence: If ``return_ts``, the tree sequence; otherwise
+            None.
         """
         self.check_ids(samples)
-        self.update_times()
+        # node times stay measured back from last_update_time, which may be
+        # some time ago (so new nodes have negative times) until export; this
+        # also waits for any simplification running in the background
+        self._convert_times(self.last_update_time)
+        if self.scheduler is not None:
+            num_new_edges = self.scheduler.num_new_edges(self)
+        else:
+            num_new_edges = None
         sample_nodes = self.get_nodes(samples)
+        if background:
+            self._background = _BackgroundSimplify(self, sample_nodes,
+                                                   num_new_edges)
+            # new sites will be numbered after the old ones, for now
+            self.site_index.reset([])
+        else:
+            self._simplify_tables(sample_nodes)
+            self.site_index.reset(self._tables.sites.position)
+            self._finish_simplify(num_new_edges)
+        # update index map: sample[k] now maps to k
+        if isinstance(self.node_ids, DenseIDMap):
+            self.node_ids.reset(samples)
+        else:
+            self.node_ids = {k : v for v, k in enumerate(np.asarray(samples).tolist())}
+        self.version += 1
+        self._cached = (self.version, _samples_key(samples), None)
+        if self.journal is not None:
+            self.journal.append(jnl.SIMPLIFY, (samples,))
+        if return_ts:
+            return self.tree_sequence(samples)
+
+    def _simplify_tables(self, sample_nodes):
+        """
+        Sort and simplify the tables, with no other changes to the state.
+        """
         if self.timings is not None:
             start = timer.process_time()
-        self.tables.sort()
+        sort_tables(self._tables, self.num_sorted_edges)
         if self.timings is not None:
             start2 = timer.process_time()
             self.timings.time_sorting += start2 - start
-        self.tables.simplify(sample_nodes)
+        self._tables.simplify(sample_nodes)
         if self.timings is not None:
             self.timings.time_simplifying += timer.process_time() - start2
-        # update the internal state
-        self.last_update_node = self.tables.nodes.num_rows
-        # update index map: sample[k] now maps to k
-        self.node_ids = {k : v for v, k in enumerate(samples)}
+
+    def _finish_simplify(self, num_new_edges):
+        """
+        Update the internal state after the tables have been simplified.
+        """
+        self.last_update_node = self._tables.nodes.num_rows
+        self.num_sorted_edges = self._tables.edges.num_rows
         self.num_simplifies += 1
+        if self.scheduler is not None:
+            self.scheduler.record_simplify(self, num_new_edges)
+
+    def wait(self):
+        """
+        Wait for any simplification running in the background to finish, and
+        renumber the nodes and sites recorded in the meantime to follow on from
+        those in the simplified tables.
+        """
+        background = self._background
+        if background is None:
+            return
+        background.thread.join()
+        self._background = None
+        if background.error is not None:
+            raise background.error
+        # nodes recorded since were numbered from background.num_nodes
+        first = background.num_nodes
+        delta = self._tables.nodes.num_rows - first
+        self.buffer.shift_nodes(first, delta)
+        if isinstance(self.node_ids, DenseIDMap):
+            self.node_ids.shift(first, delta)
+        else:
+            self.node_ids = {k: (v + delta if v >= first else v)
+                             for k, v in self.node_ids.items()}
+        # and sites from background.num_sites
+        num_sites = self._tables.sites.num_rows
+        self.site_index.reset(self._tables.sites.position)
+        positions = np.array(self.buffer.site_position, dtype='float64')
+        new_sites = self.site_index.lookup(positions)
+        missing = (new_sites == msprime.NULL_NODE)
+        new_sites[missing] = np.arange(num_sites, num_sites + np.sum(missing),
+                                       dtype='int32')
+        self.buffer.renumber_sites(background.num_sites, new_sites, num_sites)
+        self.site_index.add_many(positions[missing], new_sites[missing])
+        self._finish_simplify(background.num_new_edges)
+
+    def close(self):
+        """
+        Wait for any simplification or snapshot export running in the
+        background to finish; the tables may still be used afterwards.
+        """
+        self.wait()
+        if self._exporter is not None:
+            self._exporter.shutdown()
+            self._exporter = None
+        if self.journal is not None:
+            self.journal.flush()
+
+    def maybe_simplify(self, samples, background=False):
+        """
+        Simplify, as with ``simplify(samples, background)``, if the scheduler
+        says it is time to.  This first waits for any simplification running
+        in the background, so that the scheduler counts the edges it kept,
+        rather than those from before it.
+
+        :param list samples: A list of the input IDs whose entire history
+            should be kept.
+        :param bool background: Whether to simplify on another thread.
+        :return bool: Whether simplification happened.
+        """
+        if self.scheduler is None:
+            raise ValueError("maybe_simplify() needs a scheduler.")
+        self.wait()
+        if self.scheduler.should_simplify(self):
+            self.simplify(samples, background=background)
+            return True
+        return False
+
+    def sort_tables(self):
+        """
+        Sort the underlying tables, as required by msprime, using only the
+        edges past the first ``num_sorted_edges`` if possible (see
+        :func:`sort_tables`).  Node times must be up to date (see
+        ``update_times``).
+        """
+        self.flush()
+        sort_tables(self._tables, self.num_sorted_edges)
+        self.num_sorted_edges = self._tables.edges.num_rows
+        # sorting renumbers the sites
+        self.site_index.reset(self._tables.sites.position)
 
     def tree_sequence(self, samples=None):
         """
@@ -315,30 +1009,231 @@ class ARGrecorder(object):
         else:
             self.check_ids(samples)
         self.update_times()
+        key = _samples_key(samples)
+        if (self._cached is not None and self._cached[0] == self.version
+                and self._cached[1] == key):
+            ts = self._cached[2]
+            if ts is None:
+                # the tables were simplified to samples, and nothing has
+                # happened since
+                ts = self._current_tree_sequence()
+                self._cached = (self.version, key, ts)
+            return ts
         if self.timings is not None:
             start = timer.process_time()
-        self.tables.sort()
+        self.sort_tables()
         self.mark_samples(samples)
         if self.timings is not None:
-            self.timings.time_sorting += start - timer.process_time()
-        ts = self.tables.tree_sequence()
-        sample_nodes = self.get_nodes(samples)
+            self.timings.time_sorting += timer.process_time() - start
+        ts = self._simplified_tree_sequence(self.get_nodes(samples))
+        self._cached = (self.version, key, ts)
+        return ts
+
+    def _current_tree_sequence(self):
+        """
+        Return the tree sequence of the tables as they are, just after they
+        were simplified.
+        """
+        return self._tables.tree_sequence()
+
+    def _simplified_tree_sequence(self, sample_nodes):
+        """
+        Return the tree sequence of ``sample_nodes`` from the sorted tables,
+        without changing them.
+        """
+        ts = self._tables.tree_sequence()
         return ts.simplify(samples=sample_nodes)
 
+    def save(self, path, save_extra=None):
+        """
+        Write the state of the recorder to the directory ``path``, so that it
+        can be restored with ``load``: the columns of the tables, the map from
+        input IDs to node IDs and the site index are written as raw binary
+        arrays, and everything else to a small JSON header.  The checkpoint is
+        written to a temporary directory, with the header last, and then
+        swapped in for any previous checkpoint at ``path`` (see
+        :mod:`ftprime.checkpoint`), so that a crash part-way through leaves one
+        of them whole.  Staged rows are flushed first, and any simplification
+        running in the background is waited for.  The scheduler and timings
+        are not saved.
+
+        :param str path: The directory to write to.
+        :param callable save_extra: If given, this is called with the
+            temporary directory before the header is written, to save more
+            state in the same checkpoint (as :meth:`RecombCollector.save`
+            does).
+        """
+        self.flush()
+        new = checkpoint.begin_checkpoint(path)
+        header = {
+            'sequence_length': self.sequence_length,
+            'max_time': self.max_time,
+            'last_update_time': self.last_update_time,
+            'last_update_node': self.last_update_node,
+            'end_time': self.end_time,
+            'num_sorted_edges': self.num_sorted_edges,
+            'num_simplifies': self.num_simplifies,
+            'journal_segment': None,
+        }
+        if self.journal is not None:
+            # what is recorded from now on goes in this segment or later ones
+            header['journal_segment'] = self.journal.rotate()
+        if isinstance(self.node_ids, DenseIDMap):
+            header['id_map'] = 'dense'
+            header['id_map_base'] = int(self.node_ids.base)
+            header['id_map_num_ids'] = int(self.node_ids.num_ids)
+        else:
+            header['id_map'] = 'dict'
+        if isinstance(self.node_ids, DenseIDMap):
+            checkpoint.save_array(new, 'node_ids', self.node_ids.nodes)
+        else:
+            n = len(self.node_ids)
+            checkpoint.save_array(new, 'input_ids', np.fromiter(
+                self.node_ids.keys(), dtype='int64', count=n))
+            checkpoint.save_array(new, 'node_ids', np.fromiter(
+                self.node_ids.values(), dtype='int32', count=n))
+        positions, sites = self.site_index.sorted_arrays()
+        checkpoint.save_array(new, 'site_index_positions', positions)
+        checkpoint.save_array(new, 'site_index_sites', sites)
+        checkpoint.save_tables(new, self._tables)
+        if save_extra is not None:
+            save_extra(new)
+        checkpoint.save_header(new, header)
+        checkpoint.finish_checkpoint(path, new)
+        # everything in the earlier segments is now in the checkpoint
+        if self.journal is not None:
+            self.journal.remove_before(header['journal_segment'])
+
+    @classmethod
+    def load(cls, path, mmap=True, **kwargs):
+        """
+        Restore a recorder written with ``save``.
+
+        :param str path: The directory written by ``save``.
+        :param bool mmap: Whether to memory-map the arrays, rather than reading
+            them in before they are copied.
+        :param kwargs: Passed on to the constructor, for what is not saved
+            (e.g., ``timings`` or ``scheduler``).
+        :return ARGrecorder: The recorder, as it was when saved.
+        """
+        path = checkpoint.find_checkpoint(path)
+        header = checkpoint.load_header(path)
+        tables = checkpoint.load_tables(path, header['sequence_length'],
+                                        mmap=mmap)
+        # the saved state replaces what the constructor sets up
+        recorder = cls(tables=tables, time=header['last_update_time'],
+                       sequence_length=header['sequence_length'],
+                       id_map=header['id_map'], **kwargs)
+        if header['id_map'] == 'dense':
+            recorder.node_ids.base = header['id_map_base']
+            recorder.node_ids.nodes = checkpoint.load_array(path, 'node_ids',
+                                                            mmap)
+            recorder.node_ids.num_ids = header['id_map_num_ids']
+        else:
+            input_ids = checkpoint.load_array(path, 'input_ids', mmap)
+            nodes = checkpoint.load_array(path, 'node_ids', mmap)
+            recorder.node_ids = dict(zip(input_ids.tolist(), nodes.tolist()))
+        recorder.site_index = SiteIndex.from_sorted(
+                checkpoint.load_array(path, 'site_index_positions', mmap),
+                checkpoint.load_array(path, 'site_index_sites', mmap))
+        recorder.max_time = header['max_time']
+        recorder.last_update_time = header['last_update_time']
+        recorder.last_update_node = header['last_update_node']
+        recorder.end_time = header['end_time']
+        recorder.num_sorted_edges = header['num_sorted_edges']
+        recorder.num_simplifies = header['num_simplifies']
+        return recorder
+
+    @classmethod
+    def recover(cls, path, journal, mmap=True, **kwargs):
+        """
+        Restore a recorder after a crash, by loading the checkpoint written to
+        ``path`` by ``save`` and then replaying ``journal`` onto it.  The
+        recorder goes on writing to the journal afterwards.
+
+        :param str path: The directory written by ``save``.
+        :param ftprime.journal.Journal journal: The journal the recorder was
+            writing to, opened again on the same directory.
+        :param bool mmap: Whether to memory-map the saved arrays.
+        :param kwargs: Passed on to ``load``.
+        :return ARGrecorder: The recorder, as it was when the journal was
+            last written to disk.
+        """
+        recorder = cls.load(path, mmap=mmap, **kwargs)
+        # replay only what was recorded after the checkpoint was saved
+        header = checkpoint.load_header(checkpoint.find_checkpoint(path))
+        journal.replay(recorder, start=header['journal_segment'] or 0)
+        recorder.journal = journal
+        return recorder
+
+    def snapshot(self, samples=None, path=None):
+        """
+        Export the simplified tree sequence for a given set of input samples,
+        as :meth:`ARGrecorder.tree_sequence` does, but without waiting for it:
+        the tables are copied, column by column, and the copy is sorted,
+        simplified and (if ``path`` is given) written to disk on another
+        thread, while recording carries on.  The tables themselves are not
+        sorted or changed, except that node times are brought up to date.
+        Snapshots are exported one at a time, in the order they are asked for.
+
+        :param list samples: A list of the input IDs whose history is recorded
+            in the resulting tree sequence.  If this is missing, all available
+            individuals will be used.
+        :param str path: If given, the file to write the tree sequence to.
+        :return concurrent.futures.Future: A future whose result is the tree
+            sequence, in which ``sample[k]`` corresponds to Node ID ``k``.
+        """
+        if samples is None:
+            samples = self.sample_ids()
+        else:
+            self.check_ids(samples)
+        self.update_times()
+        if self.timings is not None:
+            start = timer.process_time()
+        tables, num_sorted_edges = self._copy_tables()
+        if self.timings is not None:
+            self.timings.time_appending += timer.process_time() - start
+        sample_nodes = self.get_nodes(samples)
+        if self._exporter is None:
+            self._exporter = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        return self._exporter.submit(self._export, tables, sample_nodes,
+                                     num_sorted_edges, path)
+
+    def _copy_tables(self):
+        """
+        Return a copy of the tables to export, and the number of its edges
+        known to be sorted.
+        """
+        return copy_tables(self._tables), self.num_sorted_edges
+
+    def _export(self, tables, sample_nodes, num_sorted_edges, path):
+        """
+        Sort, simplify and write out a copy of the tables (on the export thread).
+        """
+        sort_tables(tables, num_sorted_edges)
+        tables.simplify(sample_nodes)
+        ts = tables.tree_sequence()
+        if path is not None:
+            ts.dump(path)
+        return ts
+
     def sample_ids(self):
         """
-        Return a list of the input IDs corresponding to the samples in the
-        internal tables.
+        Return the input IDs corresponding to the samples in the internal
+        tables.
 
-        :return list: A list of input IDs.
+        :return array: An array of input IDs.
         """
-        flags = self.tables.nodes.flags
-        out = []
-        for input_id in self.node_ids:
-            j = self.node_ids[input_id]
-            if flags[j] & msprime.NODE_IS_SAMPLE:
-                out.append(input_id)
-        return out
+        self.flush()
+        if isinstance(self.node_ids, DenseIDMap):
+            input_ids = self.node_ids.keys()
+            nodes = self.node_ids.values()
+        else:
+            n = len(self.node_ids)
+            input_ids = np.fromiter(self.node_ids.keys(), dtype='int64', count=n)
+            nodes = np.fromiter(self.node_ids.values(), dtype='int32', count=n)
+        flags = self._tables.nodes.flags
+        return input_ids[(flags[nodes] & msprime.NODE_IS_SAMPLE) != 0]
 
     def mark_samples(self, samples):
         """
@@ -352,8 +1247,13 @@ class ARGrecorder(object):
         self.check_ids(samples)
         sample_nodes = self.get_nodes(samples)
         sample_flag = np.array(msprime.NODE_IS_SAMPLE, dtype='uint32')
-        new_flags = self.tables.nodes.flags & ~sample_flag
+        self.flush()
+        nodes = self._tables.nodes
+        flags = nodes.flags
+        new_flags = flags & ~sample_flag
         new_flags[sample_nodes] |= sample_flag
-        self.tables.nodes.set_columns(time=self.tables.nodes.time,
-                                      population=self.tables.nodes.population,
-                                      flags=new_flags)
+        # after a simplify the samples are usually marked already
+        if not np.array_equal(new_flags, flags):
+            nodes.set_columns(time=nodes.time, population=nodes.population,
+                              flags=new_flags)
+            self.version += 1
@@ -0,0 +1,183 @@
+import msprime
+from array import array
+import numpy as np
+
+
+def _extend(buf, values, dtype):
+    """
+    Append the values in the array-like ``values`` to the ``array`` ``buf``,
+    which stores elements of numpy type ``dtype``.
+    """
+    buf.frombytes(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+
+def _view(buf, dtype):
+    """
+    Return the contents of the ``array`` ``buf`` as a numpy array of type
+    ``dtype``, without copying.
+    """
+    if len(buf) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.frombuffer(buf, dtype=dtype)
+
+
+class TableBuffer(object):
+    '''
+    A staging area for rows that are destined for a TableCollection.  Nodes,
+    edges, sites and mutations are appended to growable columnar ``array``
+    buffers, which are cheap to append to from Python, and then moved into the
+    tables all at once with ``flush()``, using one ``append_columns`` per
+    table.
+
+    Rows in the buffer are numbered as if they had already been added to the
+    tables, so that the k-th staged node will be node ``num_rows + k`` of the
+    NodeTable after flushing.
+    '''
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """
+        Discard all staged rows.
+        """
+        self.node_flags = array('I')
+        self.node_population = array('i')
+        self.node_time = array('d')
+        self.edge_left = array('d')
+        self.edge_right = array('d')
+        self.edge_parent = array('i')
+        self.edge_child = array('i')
+        self.site_position = array('d')
+        self.site_ancestral_state = []
+        self.mutation_site = array('i')
+        self.mutation_node = array('i')
+        self.mutation_derived_state = []
+
+    @property
+    def num_nodes(self):
+        return len(self.node_time)
+
+    @property
+    def num_edges(self):
+        return len(self.edge_left)
+
+    @property
+    def num_sites(self):
+        return len(self.site_position)
+
+    @property
+    def num_mutations(self):
+        return len(self.mutation_site)
+
+    def add_node(self, flags, population, time):
+        self.node_flags.append(flags)
+        self.node_population.append(population)
+        self.node_time.append(time)
+
+    def add_nodes(self, flags, population, time):
+        _extend(self.node_flags, flags, 'uint32')
+        _extend(self.node_population, population, 'int32')
+        _extend(self.node_time, time, 'float64')
+
+    def add_edge(self, left, right, parent, child):
+        self.edge_left.append(left)
+        self.edge_right.append(right)
+        self.edge_parent.append(parent)
+        self.edge_child.append(child)
+
+    def add_edges(self, left, right, parent, child):
+        _extend(self.edge_left, left, 'float64')
+        _extend(self.edge_right, right, 'float64')
+        _extend(self.edge_parent, parent, 'int32')
+        _extend(self.edge_child, child, 'int32')
+
+    def add_site(self, position, ancestral_state):
+        self.site_position.append(position)
+        self.site_ancestral_state.append(ancestral_state)
+
+    def add_sites(self, position, ancestral_state):
+        _extend(self.site_position, position, 'float64')
+        self.site_ancestral_state.extend(ancestral_state)
+
+    def add_mutation(self, site, node, derived_state):
+        self.mutation_site.append(site)
+        self.mutation_node.append(node)
+        self.mutation_derived_state.append(derived_state)
+
+    def add_mutations(self, site, node, derived_state):
+        _extend(self.mutation_site, site, 'int32')
+        _extend(self.mutation_node, node, 'int32')
+        self.mutation_derived_state.extend(derived_state)
+
+    def set_node_populations(self, rows, population):
+        """
+        Change the population of the staged nodes ``rows`` (numbered from zero
+        within the buffer) in place.
+        """
+        populations = _view(self.node_population, 'int32')
+        populations[rows] = population
+        del populations
+
+    def shift_nodes(self, first, delta):
+        """
+        Add ``delta`` to every staged reference to a node numbered ``first``
+        or above.
+        """
+        for buf in (self.edge_parent, self.edge_child, self.mutation_node):
+            nodes = _view(buf, 'int32')
+            nodes[nodes >= first] += delta
+            del nodes
+
+    def renumber_sites(self, first, new_sites, num_sites):
+        """
+        Renumber the staged sites, which are numbered from ``first``, so that
+        the j-th of them becomes site ``new_sites[j]``; those that get a number
+        below ``num_sites`` already exist in the tables, and are dropped.
+        """
+        sites = _view(self.mutation_site, 'int32')
+        staged = sites >= first
+        sites[staged] = new_sites[sites[staged] - first]
+        del sites
+        keep = np.flatnonzero(new_sites >= num_sites)
+        if len(keep) < self.num_sites:
+            position = _view(self.site_position, 'float64')[keep]
+            self.site_position = array('d')
+            _extend(self.site_position, position, 'float64')
+            self.site_ancestral_state = [self.site_ancestral_state[j]
+                                         for j in keep]
+
+    def flush(self, tables, time_origin=None):
+        """
+        Append all staged rows to ``tables``, and clear the buffer.
+
+        :param TableCollection tables: The tables to append to.
+        :param float time_origin: If given, staged node times are taken to be
+            forwards times, and are recorded as time before ``time_origin``.
+        """
+        if self.num_nodes > 0:
+            time = _view(self.node_time, 'float64')
+            if time_origin is not None:
+                time = time_origin - time
+            tables.nodes.append_columns(
+                    flags=_view(self.node_flags, 'uint32'),
+                    population=_view(self.node_population, 'int32'),
+                    time=time)
+        if self.num_edges > 0:
+            tables.edges.append_columns(
+                    left=_view(self.edge_left, 'float64'),
+                    right=_view(self.edge_right, 'float64'),
+                    parent=_view(self.edge_parent, 'int32'),
+                    child=_view(self.edge_child, 'int32'))
+        if self.num_sites > 0:
+            state, offset = msprime.pack_bytes(self.site_ancestral_state)
+            tables.sites.append_columns(
+                    position=_view(self.site_position, 'float64'),
+                    ancestral_state=state, ancestral_state_offset=offset)
+        if self.num_mutations > 0:
+            state, offset = msprime.pack_bytes(self.mutation_derived_state)
+            tables.mutations.append_columns(
+                    site=_view(self.mutation_site, 'int32'),
+                    node=_view(self.mutation_node, 'int32'),
+                    derived_state=state, derived_state_offset=offset)
+        self.clear()
@@ -0,0 +1,170 @@
+'''
+Reading and writing checkpoints: a checkpoint is a directory holding a small
+JSON header, ``header.json``, for the scalar state, and one ``.npy`` file per
+array, such as each column of the tables (e.g. ``edges_left.npy``), so that
+these are written as raw binary and can be memory-mapped when read back.  See
+:meth:`ftprime.ARGrecorder.save` and :meth:`ftprime.RecombCollector.save`.
+
+A checkpoint is never overwritten in place: it is written to a sibling
+directory, ``path + '.new'``, with the header last, and then renamed to
+``path``, after moving any previous checkpoint aside to ``path + '.old'``
+(which is removed once the new one is in place).  So, if the process dies
+part-way through, either the previous checkpoint or the new one is left
+whole, and :func:`find_checkpoint` says where.  Each file is synced to disk
+(with ``os.fsync``) as it is written, and the directories before and after
+the rename, so that this holds even if the machine goes down.
+'''
+import json
+import msprime
+import numpy as np
+import os
+import shutil
+
+# the version of the checkpoint layout, stored in each header
+CHECKPOINT_FORMAT = 1
+
+# the columns saved for each table
+_TABLE_COLUMNS = {
+    'nodes': ('flags', 'time', 'population'),
+    'edges': ('left', 'right', 'parent', 'child'),
+    'sites': ('position', 'ancestral_state', 'ancestral_state_offset'),
+    'mutations': ('site', 'node', 'derived_state', 'derived_state_offset'),
+    'populations': ('metadata', 'metadata_offset'),
+}
+
+
+def _fsync_dir(path):
+    """
+    Sync the directory ``path`` to disk, so that the files created in it (or
+    renamed into it) are there after a crash.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def begin_checkpoint(path):
+    """
+    Start writing a checkpoint that is to end up in ``path``, by making an
+    empty temporary directory next to it (removing any left by an unfinished
+    save), and return the temporary directory to write to.
+    """
+    new = path + '.new'
+    if os.path.exists(new):
+        shutil.rmtree(new)
+    os.makedirs(new)
+    return new
+
+
+def finish_checkpoint(path, new):
+    """
+    Put the checkpoint written to ``new`` (by :func:`begin_checkpoint`, and
+    with its header written last) in place at ``path``, replacing any
+    checkpoint there.
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    _fsync_dir(new)
+    _fsync_dir(parent)
+    old = path + '.old'
+    if os.path.exists(path):
+        if os.path.exists(old):
+            shutil.rmtree(old)
+        os.rename(path, old)
+    os.rename(new, path)
+    _fsync_dir(parent)
+    if os.path.exists(old):
+        shutil.rmtree(old)
+
+
+def find_checkpoint(path):
+    """
+    Return the directory holding the last complete checkpoint saved to
+    ``path``: this is ``path`` itself, unless the process died while the
+    previous checkpoint had been moved aside.
+    """
+    old = path + '.old'
+    if not os.path.exists(path) and os.path.exists(old):
+        return old
+    return path
+
+
+def save_array(path, name, array):
+    """
+    Write ``array`` to ``name.npy`` in the checkpoint directory ``path``, and
+    sync it to disk.
+    """
+    with open(os.path.join(path, name + '.npy'), 'wb') as f:
+        np.save(f, np.asarray(array), allow_pickle=False)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_array(path, name, mmap=True):
+    """
+    Read the array ``name.npy`` from the checkpoint directory ``path``.
+
+    :param bool mmap: Whether to memory-map the file (copy-on-write), rather
+        than reading it in.
+    """
+    return np.load(os.path.join(path, name + '.npy'),
+                   mmap_mode='c' if mmap else None, allow_pickle=False)
+
+
+def save_header(path, header, name='header'):
+    """
+    Write the dict ``header`` to ``name.json`` in the checkpoint directory
+    ``path``, which is created if need be, and sync it to disk.
+    """
+    if not os.path.exists(path):
+        os.makedirs(path)
+    header = dict(header, format=CHECKPOINT_FORMAT)
+    with open(os.path.join(path, name + '.json'), 'w') as f:
+        json.dump(header, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_header(path, name='header'):
+    """
+    Read the dict stored in ``name.json`` in the checkpoint directory ``path``.
+    """
+    with open(os.path.join(path, name + '.json'), 'r') as f:
+        header = json.load(f)
+    if header.get('format') != CHECKPOINT_FORMAT:
+        raise ValueError("Unknown checkpoint format in " + path + ".")
+    return header
+
+
+def save_tables(path, tables):
+    """
+    Write each column of ``tables`` to the checkpoint directory ``path``.
+
+    :param str path: The checkpoint directory (which must exist).
+    :param TableCollection tables: The tables to save.
+    """
+    for table_name, columns in _TABLE_COLUMNS.items():
+        table = getattr(tables, table_name)
+        for column in columns:
+            save_array(path, table_name + '_' + column,
+                       getattr(table, column))
+
+
+def load_tables(path, sequence_length, mmap=True):
+    """
+    Read back the tables written to the checkpoint directory ``path`` by
+    :func:`save_tables`.
+
+    :param str path: The checkpoint directory.
+    :param float sequence_length: The sequence length of the tables.
+    :param bool mmap: Whether to memory-map the columns, rather than reading
+        them in before they are copied into the tables.
+    :return TableCollection: The tables.
+    """
+    tables = msprime.TableCollection(sequence_length=sequence_length)
+    for table_name, columns in _TABLE_COLUMNS.items():
+        getattr(tables, table_name).set_columns(
+                **{column: load_array(path, table_name + '_' + column, mmap)
+                   for column in columns})
+    return tables
@@ -0,0 +1,156 @@
+import msprime
+import numpy as np
+
+
+class DenseIDMap(object):
+    '''
+    A map from (input) individual IDs to (output) node IDs, that can be used
+    in place of a dict, and is stored as an integer array over a window of
+    input IDs: input ID ``k`` maps to ``self.nodes[k - self.base]``, and input
+    IDs that are not in the map have the value ``msprime.NULL_NODE``.
+
+    This suits forwards-time simulators, like simuPOP, that hand out
+    monotonically increasing IDs: the live individuals then occupy a compact
+    window of input IDs, and the map takes four bytes per ID in that window.
+    At each simplification the map is rebuilt with ``reset``, which drops
+    everyone not in the new set of samples, and slides the window up to start
+    at the smallest remaining ID.
+
+    Besides the dict methods, ``lookup``, ``contains`` and ``set_many`` work on
+    whole arrays of input IDs at once.
+    '''
+
+    def __init__(self, node_ids=None):
+        """
+        :param dict node_ids: A dict, indexed by input IDs, of the initial
+            node IDs.
+        """
+        self.base = 0
+        self.nodes = np.full(0, msprime.NULL_NODE, dtype='int32')
+        self.num_ids = 0
+        if node_ids is not None and len(node_ids) > 0:
+            input_ids = np.fromiter(node_ids.keys(), dtype='int64',
+                                    count=len(node_ids))
+            nodes = np.fromiter(node_ids.values(), dtype='int32',
+                                count=len(node_ids))
+            self.set_many(input_ids, nodes)
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+    def __len__(self):
+        return self.num_ids
+
+    def __contains__(self, input_id):
+        k = input_id - self.base
+        return (k >= 0 and k < len(self.nodes)
+                and self.nodes[k] != msprime.NULL_NODE)
+
+    def __getitem__(self, input_id):
+        if input_id not in self:
+            raise KeyError(input_id)
+        return int(self.nodes[input_id - self.base])
+
+    def __setitem__(self, input_id, node):
+        self._reserve(input_id, input_id)
+        k = input_id - self.base
+        if self.nodes[k] == msprime.NULL_NODE:
+            self.num_ids += 1
+        self.nodes[k] = node
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def keys(self):
+        """
+        Return the input IDs in the map, in increasing order, as an array.
+        """
+        return self.base + np.flatnonzero(self.nodes != msprime.NULL_NODE)
+
+    def values(self):
+        return self.nodes[self.nodes != msprime.NULL_NODE]
+
+    def items(self):
+        return zip(self.keys().tolist(), self.values().tolist())
+
+    def update(self, pairs):
+        for input_id, node in pairs:
+            self[input_id] = node
+
+    def _reserve(self, lo, hi):
+        """
+        Make sure that the window includes all input IDs in ``[lo, hi]``,
+        leaving room to grow upwards.
+        """
+        if len(self.nodes) == 0:
+            self.base = lo
+        start = min(lo, self.base)
+        end = max(hi + 1, self.base + len(self.nodes))
+        if start < self.base or end > self.base + len(self.nodes):
+            if end > self.base + len(self.nodes):
+                # double the capacity, so that appending is amortized O(1)
+                end = max(end, start + 2 * len(self.nodes))
+            nodes = np.full(end - start, msprime.NULL_NODE, dtype='int32')
+            offset = self.base - start
+            nodes[offset:offset + len(self.nodes)] = self.nodes
+            self.base = start
+            self.nodes = nodes
+
+    def contains(self, input_ids):
+        """
+        Return a boolean array saying which of ``input_ids`` are in the map.
+
+        :param array input_ids: An array of input IDs.
+        """
+        k = np.asarray(input_ids, dtype='int64') - self.base
+        inside = np.logical_and(k >= 0, k < len(self.nodes))
+        out = np.zeros(len(k), dtype='bool')
+        out[inside] = self.nodes[k[inside]] != msprime.NULL_NODE
+        return out
+
+    def lookup(self, input_ids):
+        """
+        Return the array of node IDs corresponding to ``input_ids``, with
+        ``msprime.NULL_NODE`` for any that are not in the map.
+
+        :param array input_ids: An array of input IDs.
+        """
+        k = np.asarray(input_ids, dtype='int64') - self.base
+        inside = np.logical_and(k >= 0, k < len(self.nodes))
+        out = np.full(len(k), msprime.NULL_NODE, dtype='int32')
+        out[inside] = self.nodes[k[inside]]
+        return out
+
+    def set_many(self, input_ids, nodes):
+        """
+        Set the node ID of each of ``input_ids`` to the corresponding entry of
+        ``nodes``.
+
+        :param array input_ids: An array of input IDs.
+        :param array nodes: An array of node IDs of the same length.
+        """
+        input_ids = np.asarray(input_ids, dtype='int64')
+        if len(input_ids) == 0:
+            return
+        self._reserve(input_ids.min(), input_ids.max())
+        k = input_ids - self.base
+        self.num_ids += int(np.sum(self.nodes[np.unique(k)] == msprime.NULL_NODE))
+        self.nodes[k] = nodes
+
+    def shift(self, first, delta):
+        """
+        Add ``delta`` to every node ID that is ``first`` or above.
+        """
+        self.nodes[self.nodes >= first] += delta
+
+    def reset(self, samples):
+        """
+        Empty the map, and then map ``samples[k]`` to ``k``, so that the window
+        begins at the smallest input ID in ``samples``.
+
+        :param array samples: An array of input IDs.
+        """
+        self.base = 0
+        self.nodes = np.full(0, msprime.NULL_NODE, dtype='int32')
+        self.num_ids = 0
+        self.set_many(samples, np.arange(len(samples), dtype='int32'))
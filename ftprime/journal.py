@@ -0,0 +1,316 @@
+'''
+A write-ahead journal of what is recorded by an :class:`ftprime.ARGrecorder`,
+so that it can be recovered after a crash by loading the last checkpoint
+(see :meth:`ftprime.ARGrecorder.save`) and replaying the journal onto it.
+
+The journal is a directory of numbered segment files.  Each call that records
+something (``add_individuals``, ``add_records``, ``add_mutations``,
+``set_populations``, ``simplify``, and their one-at-a-time versions) appends
+one record, holding the arguments of the call as raw binary columns, in terms
+of input IDs; so replaying the records redoes the calls.  The one-at-a-time
+calls instead add a row to columns staged in memory for each kind, which are
+encoded as one record per kind (nodes first, then edges, then mutations) when
+anything else is recorded or enough has been staged, and replay as the array
+versions of the calls.  This gives the same result, since a row only refers
+to nodes added before it.  Records are collected in memory and written out in large sequential writes, and the file
+is synced to disk at most every ``fsync_interval`` seconds.  Saving a
+checkpoint starts a new segment, and stores its number in the checkpoint, so
+that only the segments from there on are replayed onto it; the segments
+before are removed once the checkpoint is in place.  A record that was only
+partly written when the process died is ignored on replay.
+'''
+import numpy as np
+import os
+import struct
+import time as timer
+
+# the kinds of record, and the types of their columns ('bytes' is a column of
+# byte strings)
+NODES = 1
+EDGES = 2
+MUTATIONS = 3
+INFINITE_SITES_MUTATIONS = 4
+POPULATIONS = 5
+SIMPLIFY = 6
+
+_COLUMNS = {
+    NODES: ('int64', 'float64', 'uint32', 'int32'),
+    EDGES: ('float64', 'float64', 'int64', 'int64'),
+    MUTATIONS: ('float64', 'int64', 'bytes', 'bytes'),
+    INFINITE_SITES_MUTATIONS: ('float64', 'int64', 'bytes', 'bytes'),
+    POPULATIONS: ('int64', 'int32'),
+    SIMPLIFY: ('int64',),
+}
+
+# each record starts with its kind and the length of the rest of it
+_HEADER = struct.Struct('<BQ')
+_COUNT = struct.Struct('<Q')
+
+# roughly the number of bytes each row of a record takes
+_ROW_BYTES = {kind: sum(8 if dtype == 'bytes' else np.dtype(dtype).itemsize
+                        for dtype in columns)
+              for kind, columns in _COLUMNS.items()}
+
+
+def _encode(kind, columns):
+    """
+    Return the record of ``kind`` with the given columns (all the same length),
+    as a list of bytes-like objects.
+    """
+    n = len(columns[0])
+    parts = [_COUNT.pack(n)]
+    for dtype, column in zip(_COLUMNS[kind], columns):
+        if dtype == 'bytes':
+            lengths = np.fromiter((len(x) for x in column), dtype='uint64',
+                                  count=n)
+            offset = np.zeros(n + 1, dtype='uint64')
+            np.cumsum(lengths, out=offset[1:])
+            parts.append(offset.tobytes())
+            parts.append(b''.join(column))
+        else:
+            parts.append(np.ascontiguousarray(column, dtype=dtype).tobytes())
+    length = sum(len(x) for x in parts)
+    return [_HEADER.pack(kind, length)] + parts
+
+
+def _decode(kind, data):
+    """
+    Return the columns of the record of ``kind`` in the bytes-like ``data``.
+    """
+    n = _COUNT.unpack_from(data, 0)[0]
+    pos = _COUNT.size
+    columns = []
+    for dtype in _COLUMNS[kind]:
+        if dtype == 'bytes':
+            offset = np.frombuffer(data, dtype='uint64', count=n + 1,
+                                   offset=pos)
+            pos += offset.nbytes
+            values = bytes(data[pos:pos + int(offset[-1])])
+            columns.append([values[int(offset[j]):int(offset[j + 1])]
+                            for j in range(n)])
+            pos += int(offset[-1])
+        else:
+            column = np.frombuffer(data, dtype=dtype, count=n, offset=pos)
+            columns.append(column)
+            pos += column.nbytes
+    return columns
+
+
+class Journal(object):
+    '''
+    A write-ahead journal, stored in the directory ``path``; pass it to an
+    :class:`ftprime.ARGrecorder` as ``journal`` to record to it, and use
+    :meth:`ftprime.ARGrecorder.recover` to restore the recorder from it.
+
+    Records are held in memory until there are ``write_size`` bytes of them,
+    and are then written out at once (rows added one at a time are first
+    staged as columns, and encoded once there are ``write_size`` bytes of
+    them, or a whole record is appended); a new segment file is started once the
+    current one holds ``segment_size`` bytes.  After a write, the segment is
+    synced to disk (with ``os.fsync``) if it has been ``fsync_interval``
+    seconds since it last was.  So, a crash loses at most the records in
+    memory and those written in the last ``fsync_interval`` seconds; call
+    ``flush`` to write and sync everything now.
+    '''
+
+    def __init__(self, path, write_size=2**20, segment_size=2**26,
+                 fsync_interval=1.0):
+        """
+        :param str path: The directory to keep the journal in, which is
+            created if need be; any segments already there are kept, to be
+            replayed, and new ones are numbered after them.
+        :param int write_size: The number of bytes to collect before writing.
+        :param int segment_size: The number of bytes after which to start a
+            new segment file.
+        :param float fsync_interval: The least time, in seconds, between
+            syncs; 0 syncs after every write, and None leaves it to the
+            operating system.
+        """
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.write_size = write_size
+        self.segment_size = segment_size
+        self.fsync_interval = fsync_interval
+        segments = self.segments()
+        if len(segments) > 0:
+            self._next_segment = self._segment_number(segments[-1]) + 1
+        else:
+            self._next_segment = 0
+        self._file = None
+        self._segment_bytes = 0
+        self._pending = []
+        self._pending_bytes = 0
+        # the columns staged by append_row, for each kind
+        self._rows = {}
+        self._row_bytes = 0
+        self._last_sync = timer.monotonic()
+
+    @staticmethod
+    def _segment_number(name):
+        return int(name.split('.')[0].split('-')[1])
+
+    def segments(self):
+        """
+        Return the file names (within ``path``) of the segments on disk, in
+        order.
+        """
+        names = [x for x in os.listdir(self.path)
+                 if x.startswith('segment-') and x.endswith('.journal')]
+        return sorted(names, key=self._segment_number)
+
+    def append(self, kind, columns):
+        """
+        Add a record of ``kind`` (one of the constants in this module) with
+        the given columns.
+        """
+        self._encode_rows()
+        parts = _encode(kind, columns)
+        self._pending.extend(parts)
+        self._pending_bytes += sum(len(x) for x in parts)
+        if self._pending_bytes >= self.write_size:
+            self._write()
+
+    def append_row(self, kind, row):
+        """
+        Add one row, with a value for each column, to the record of ``kind``
+        (``NODES``, ``EDGES`` or ``MUTATIONS``) being staged.
+        """
+        columns = self._rows.get(kind)
+        if columns is None:
+            columns = self._rows[kind] = tuple([] for _ in _COLUMNS[kind])
+        for column, value in zip(columns, row):
+            column.append(value)
+        self._row_bytes += _ROW_BYTES[kind]
+        if self._row_bytes >= self.write_size:
+            self._encode_rows()
+            self._write()
+
+    def _encode_rows(self):
+        """
+        Encode the rows staged by ``append_row``, as one record per kind.
+        """
+        if self._row_bytes == 0:
+            return
+        for kind in sorted(self._rows):
+            parts = _encode(kind, self._rows[kind])
+            self._pending.extend(parts)
+            self._pending_bytes += sum(len(x) for x in parts)
+        self._rows = {}
+        self._row_bytes = 0
+
+    def _write(self):
+        """
+        Write the records held in memory to the current segment.
+        """
+        if self._file is None or self._segment_bytes >= self.segment_size:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+            name = 'segment-%06d.journal' % self._next_segment
+            self._next_segment += 1
+            self._file = open(os.path.join(self.path, name), 'wb')
+            self._segment_bytes = 0
+        data = b''.join(self._pending)
+        self._file.write(data)
+        self._segment_bytes += len(data)
+        self._pending = []
+        self._pending_bytes = 0
+        if (self.fsync_interval is not None
+                and timer.monotonic() - self._last_sync >= self.fsync_interval):
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._last_sync = timer.monotonic()
+
+    def rotate(self):
+        """
+        Write out and sync any records held in memory, and start a new
+        segment for the records that follow.
+
+        :return int: The number of the new segment.
+        """
+        self.close()
+        return self._next_segment
+
+    def remove_before(self, segment):
+        """
+        Remove the segments numbered before ``segment`` from disk, as when a
+        checkpoint has been saved that includes all of them.
+        """
+        for name in self.segments():
+            if self._segment_number(name) < segment:
+                os.remove(os.path.join(self.path, name))
+
+    def flush(self):
+        """
+        Write out any records held in memory, and sync the journal to disk.
+        """
+        self._encode_rows()
+        if self._pending_bytes > 0:
+            self._write()
+        if self._file is not None:
+            self._sync()
+
+    def close(self):
+        """
+        Write out and sync any records held in memory, and close the current
+        segment.
+        """
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def records(self, start=0):
+        """
+        Iterate over the records in the segments on disk, in order, as pairs
+        ``(kind, columns)``.  A partly written record at the end of a segment
+        is skipped.
+
+        :param int start: The number of the first segment to read.
+        """
+        for name in self.segments():
+            if self._segment_number(name) < start:
+                continue
+            with open(os.path.join(self.path, name), 'rb') as f:
+                data = f.read()
+            view = memoryview(data)
+            pos = 0
+            while pos + _HEADER.size <= len(data):
+                kind, length = _HEADER.unpack_from(data, pos)
+                begin = pos + _HEADER.size
+                if begin + length > len(data):
+                    break
+                yield kind, _decode(kind, view[begin:begin + length])
+                pos = begin + length
+
+    def replay(self, recorder, start=0):
+        """
+        Redo the calls recorded in the journal on ``recorder`` (which should
+        not itself have a journal while this happens).
+
+        :param ARGrecorder recorder: The recorder, as restored from the
+            checkpoint that the journal follows on from.
+        :param int start: The number of the first segment to replay, as
+            stored in the checkpoint.
+        """
+        for kind, columns in self.records(start):
+            if kind == NODES:
+                input_ids, times, flags, populations = columns
+                recorder.add_individuals(input_ids, times, flags=flags,
+                                         populations=populations)
+            elif kind == EDGES:
+                recorder.add_records(*columns)
+            elif kind == MUTATIONS:
+                recorder.add_mutations(*columns)
+            elif kind == INFINITE_SITES_MUTATIONS:
+                recorder.add_mutations(*columns, infinite_sites=True)
+            elif kind == POPULATIONS:
+                recorder.set_populations(*columns)
+            elif kind == SIMPLIFY:
+                recorder.simplify(columns[0])
+            else:
+                raise ValueError("Unknown record in journal " + self.path + ".")
@@ -0,0 +1,179 @@
+import concurrent.futures
+import msprime
+import numpy as np
+
+from .parsing import ParsedRecombs, parse_recombs
+from .recomb_collector import RecombCollector
+
+
+class MultiChromRecombCollector(object):
+    '''
+    Collect and parse recombination events as output by simuPOP's
+    Recombinator, for a population with more than one chromosome, keeping a
+    separate :class:`RecombCollector` (and so a separate ARGrecorder and set of
+    tables) for each chromosome, in ``self.chromosomes``.
+
+    simuPOP numbers the loci of all chromosomes consecutively, and records free
+    recombination between chromosomes as a recombination after the last locus
+    of a chromosome.  So, each line of Recombinator output is split up: the
+    recombinations between loci of chromosome ``c`` go to collector ``c``, and
+    the chromosome that collector ``c`` starts on is switched once for each
+    recombination before the first locus of chromosome ``c``.
+
+    Simplification is done for all chromosomes at once, on a pool of threads,
+    so it takes about as long as the slowest one, given enough cores.
+    '''
+
+    def __init__(self, ts, node_ids, locus_position, num_threads=None,
+                 seed=None, **kwargs):
+        """
+        :param list ts: A list of tree sequences, one for each chromosome,
+            describing their history before the simulation starts.
+        :param dict node_ids: A dict indexed by (individual ID, ploidy), as for
+            :class:`RecombCollector`, or a list of these, one per chromosome.
+        :param list locus_position: A list of lists of coordinates of the loci
+            on each chromosome, which must each begin at zero and end at the
+            sequence length of the corresponding tree sequence.
+        :param int num_threads: The number of threads to simplify with; by
+            default, one per chromosome.
+        :param int seed: The seed for the random number generators used to
+            place breakpoints (each chromosome's is seeded with a different
+            number drawn using this one).
+        :param kwargs: Passed on to each RecombCollector (which must use the
+            default, 'immediate', collection, and no ``scheduler``, since one
+            scheduler cannot be shared between recorders).
+        """
+        if kwargs.get('collection', 'immediate') != 'immediate':
+            raise ValueError("Only 'immediate' collection is supported with "
+                             "more than one chromosome.")
+        if kwargs.get('scheduler') is not None:
+            raise ValueError("A scheduler is not supported with more than one "
+                             "chromosome.")
+        num_chroms = len(ts)
+        if len(locus_position) != num_chroms:
+            raise ValueError("There must be one list of locus positions per "
+                             "tree sequence.")
+        if isinstance(node_ids, dict):
+            node_ids = [node_ids] * num_chroms
+        if seed is None:
+            seeds = [None] * num_chroms
+        else:
+            seeds = np.random.RandomState(seed).randint(2**32, size=num_chroms,
+                                                      dtype=np.uint32)
+        self.chromosomes = [
+                RecombCollector(ts=ts[c], node_ids=node_ids[c],
+                                locus_position=locus_position[c],
+                                seed=seeds[c], **kwargs)
+                for c in range(num_chroms)]
+        # the global index of the first locus on each chromosome, and one past
+        # the last locus on the last one
+        num_loci = [len(x) for x in locus_position]
+        self.first_locus = np.concatenate([[0], np.cumsum(num_loci)])
+        self.time = 0.0
+        if num_threads is None:
+            num_threads = num_chroms
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=num_threads)
+
+    @property
+    def num_chromosomes(self):
+        return len(self.chromosomes)
+
+    def increment_time(self):
+        self.set_time(self.time + 1.0)
+
+    def set_time(self, time):
+        """
+        Record individuals collected from now on as born at ``time``.
+        """
+        self.time = float(time)
+        for rc in self.chromosomes:
+            rc.set_time(time)
+
+    def flush(self):
+        for rc in self.chromosomes:
+            rc.flush()
+
+    def split_recombs(self, parsed):
+        """
+        Split up a parsed block of Recombinator output by chromosome.
+
+        :param ParsedRecombs parsed: The output of :func:`parse_recombs`, with
+            recombinations numbered by loci across all chromosomes.
+        :return list: A list of ParsedRecombs, one per chromosome, with
+            recombinations numbered by loci within that chromosome.
+        """
+        num_lines = len(parsed.child)
+        rec_line = np.repeat(np.arange(num_lines), np.diff(parsed.rec_offset))
+        out = []
+        for c in range(self.num_chromosomes):
+            first = self.first_locus[c]
+            last = self.first_locus[c + 1] - 1
+            # recombinations on earlier chromosomes, or between them and this
+            num_before = np.bincount(rec_line[parsed.rec < first],
+                                     minlength=num_lines)
+            here = np.logical_and(parsed.rec >= first, parsed.rec < last)
+            rec_offset = np.zeros(num_lines + 1, dtype='int64')
+            np.cumsum(np.bincount(rec_line[here], minlength=num_lines),
+                      out=rec_offset[1:])
+            out.append(ParsedRecombs(child=parsed.child, parent=parsed.parent,
+                                     ploidy=(parsed.ploidy + num_before) % 2,
+                                     rec_offset=rec_offset,
+                                     rec=parsed.rec[here] - first))
+        return out
+
+    def collect_recombs(self, lines, populations=msprime.NULL_POPULATION):
+        """
+        Collects recombinations arriving from simuPOP, as for
+        :meth:`RecombCollector.collect_recombs`, and records them on each
+        chromosome.
+
+        :param str lines: Recombination data from simuPOP.
+        :param populations: The population the offspring are born in, as for
+            :meth:`RecombCollector.collect_recombs`.
+        """
+        parsed = parse_recombs(lines)
+        if callable(populations):
+            populations = populations(parsed.child, parsed.parent)
+        for rc, chrom_parsed in zip(self.chromosomes, self.split_recombs(parsed)):
+            rc.record_parsed(chrom_parsed, populations)
+
+    def _map(self, method, *args, **kwargs):
+        """
+        Call ``method`` of every chromosome's RecombCollector, in parallel, and
+        return the list of results.
+        """
+        futures = [self.executor.submit(getattr(rc, method), *args, **kwargs)
+                   for rc in self.chromosomes]
+        return [f.result() for f in futures]
+
+    def simplify(self, samples):
+        """
+        Simplify the tables of every chromosome in parallel, retaining only
+        information relevant to the diploid individuals listed in `samples`.
+
+        :param list samples: A list of diploid input individual IDs.
+        """
+        self._map('simplify', samples)
+
+    def tree_sequence(self, samples):
+        """
+        Return a list of tree sequences, one for each chromosome, that retain
+        only information relevant to the diploid individuals in `samples`.
+
+        :param list samples: A list of diploid input individual IDs.
+        """
+        return self._map('tree_sequence', samples)
+
+    def add_locations(self, input_ids, locations):
+        """
+        Assign the `population` field of each individual in `input_ids` to the
+        corresponding entry in `locations`, on every chromosome.
+        """
+        for rc in self.chromosomes:
+            rc.add_locations(input_ids, locations)
+
+    def close(self):
+        for rc in self.chromosomes:
+            rc.close()
+        self.executor.shutdown()
@@ -0,0 +1,196 @@
+'''
+simuPOP operators for use with a :class:`ftprime.RecombCollector`.  This
+module needs simuPOP, so it is not imported by ``import ftprime``.
+'''
+import numpy as np
+import simuPOP as sim
+
+
+def simplify_operator(rc, **kwargs):
+    """
+    Return a simuPOP operator that, each time it is applied, asks the
+    scheduler of ``rc`` whether it is time to simplify, and if so simplifies,
+    keeping everyone currently in the population (as given by the ``ind_id``
+    information field).  For instance, put
+
+        simplify_operator(rc)
+
+    in the ``postOps`` of ``pop.evolve()``.
+
+    :param RecombCollector rc: The RecombCollector, which must have been given
+        a :class:`ftprime.scheduler.SimplifyScheduler`.
+    :param kwargs: Passed on to ``simuPOP.PyOperator``.
+    """
+    if rc.args.scheduler is None:
+        raise ValueError("The RecombCollector must have a scheduler.")
+
+    def _simplify(pop):
+        rc.maybe_simplify(pop.indInfo("ind_id"))
+        return True
+
+    return sim.PyOperator(func=_simplify, **kwargs)
+
+
+def time_marker_operator(output, **kwargs):
+    """
+    Return a simuPOP operator that writes a time marker line, as read by
+    :func:`ftprime.stream.read_recombs`, to ``output``, so that the
+    recombinations written there by a Recombinator in the generation that
+    follows are recorded at the right time.  Put it in the ``preOps`` of
+    ``pop.evolve()``, with the same ``output`` as the Recombinator:
+
+        preOps=[time_marker_operator('>>' + path)],
+        matingScheme=sim.RandomMating(ops=[
+            id_tagger, sim.Recombinator(output='>>' + path, ...)]),
+
+    As with ``increment_time()`` in the preOps, the offspring of generation
+    ``gen`` are recorded at time ``gen + 1``.
+
+    :param str output: The simuPOP output specification, e.g. ``'>>' + path``.
+    :param kwargs: Passed on to ``simuPOP.PyEval``.
+    """
+    return sim.PyEval(r"'#T %d\n' % (gen + 1)", output=output, **kwargs)
+
+
+def population_marker_operator(output, simplify=False, **kwargs):
+    """
+    Return a simuPOP operator that writes a marker line listing everyone in
+    the population (by the ``ind_id`` information field), as read by
+    :func:`ftprime.stream.read_recombs`, to ``output``: a ``#P`` line, at
+    which the collector simplifies to them if its scheduler says it is time
+    to, or with ``simplify=True``, a ``#S`` line, at which it always does.
+    Without these, a collector reading the stream never simplifies, and keeps
+    the history of everyone ever born.  Put it in the ``postOps`` of
+    ``pop.evolve()``, with the same ``output`` as the Recombinator, and
+    simplify at the end, so that the tree sequence written out is for the
+    final generation:
+
+        postOps=[population_marker_operator('>>' + path),
+                 population_marker_operator('>>' + path, simplify=True,
+                                            at=-1)],
+
+    :param str output: The simuPOP output specification, e.g. ``'>>' + path``.
+    :param bool simplify: Whether to write a ``#S`` marker rather than a
+        ``#P`` marker.
+    :param kwargs: Passed on to ``simuPOP.PyEval``.
+    """
+    kind = 'S' if simplify else 'P'
+    return sim.PyEval(r"'#" + kind + r" %s\n' % ' '.join(map(str, "
+                      r"map(int, pop.indInfo('ind_id'))))",
+                      exposePop='pop', output=output, **kwargs)
+
+
+def pedigree_only_operator(rc, rates=None, intensity=None, **kwargs):
+    """
+    Return a simuPOP operator for pedigree-only runs, in which simuPOP only
+    supplies the pedigree and ``rc`` simulates the chromosomes: it records
+    the births of everyone in the population with ``rc``, using the
+    ``ind_id``, ``father_id`` and ``mother_id`` information fields (as set by
+    ``simuPOP.IdTagger`` and ``simuPOP.PedigreeTagger``), and draws its own
+    crossovers with :meth:`RecombCollector.collect_matings`.  Put it in the
+    ``postOps`` of ``pop.evolve()``, with ``rc.increment_time()`` in the
+    ``preOps``, and with non-overlapping generations.
+
+    The crossovers are not those simuPOP uses to pass on genotypes, so the
+    recorded genealogy does not match any genotypes simuPOP carries: this is
+    not a replacement for recording a Recombinator's output, and is only for
+    runs where simuPOP's genotypes do not matter (no selection, and no loci
+    read back from simuPOP), with mutations put on the tree sequence
+    afterwards.
+
+    :param RecombCollector rc: The RecombCollector to record with.
+    :param rates: The probability of a crossover between each pair of
+        adjacent loci, or a single probability for every pair.
+    :param float intensity: Alternatively, the probability of a crossover per
+        unit of distance between adjacent loci, as for simuPOP's Recombinator.
+    :param kwargs: Passed on to ``simuPOP.PyOperator``.
+
+    Each child is recorded as born in the population given by the index of
+    its simuPOP subpopulation.
+    """
+    if (rates is None) == (intensity is None):
+        raise ValueError("Exactly one of rates and intensity must be given.")
+    if intensity is not None:
+        rates = [intensity * (b - a) for a, b in zip(rc.locus_position[:-1],
+                                                     rc.locus_position[1:])]
+
+    def _record(pop):
+        rc.collect_matings(pop.indInfo("ind_id"), pop.indInfo("father_id"),
+                           pop.indInfo("mother_id"), rates,
+                           populations=subpop_index(pop))
+        return True
+
+    return sim.PyOperator(func=_record, **kwargs)
+
+
+def subpop_index(pop):
+    """
+    Return the array of the index of the subpopulation that each individual
+    in ``pop`` is in, in the order of ``pop.indInfo()``.
+    """
+    return np.repeat(np.arange(pop.numSubPop()), pop.subPopSizes())
+
+
+def location_operator(rc, **kwargs):
+    """
+    Return a simuPOP operator that records the index of the subpopulation
+    that each individual in the population is in as its population, with
+    :meth:`RecombCollector.add_locations`.  Put it in the ``postOps`` of
+    ``pop.evolve()`` to record where each generation is born.  (To record
+    it as each generation is born, use :func:`birth_location_operator`.)
+
+    :param RecombCollector rc: The RecombCollector to record with.
+    :param kwargs: Passed on to ``simuPOP.PyOperator``.
+    """
+
+    def _locate(pop):
+        rc.add_locations(pop.indInfo("ind_id"), subpop_index(pop))
+        return True
+
+    return sim.PyOperator(func=_locate, **kwargs)
+
+
+def birth_location_operator(**kwargs):
+    """
+    Return a simuPOP operator, and a function to pass as the ``populations``
+    of :meth:`RecombCollector.collect_recombs`, that record each offspring as
+    born in the index of the subpopulation its parents are in, in the same
+    call that records its birth.  Put the operator in the ``preOps`` of
+    ``pop.evolve()`` (after any migration), where it looks up the
+    subpopulation of everyone in the population, by the ``ind_id``
+    information field:
+
+        locate, populations = birth_location_operator()
+        pop.evolve(preOps=[..., locate],
+                   matingScheme=sim.RandomMating(ops=[
+                       id_tagger, sim.Recombinator(
+                           output=functools.partial(rc.collect_recombs,
+                                                    populations=populations),
+                           ...)]))
+
+    This is only right if parents mate within their own subpopulation, and
+    their offspring stay there, as with simuPOP's ``RandomMating``.
+
+    :param kwargs: Passed on to ``simuPOP.PyOperator``.
+    :return tuple: The operator and the function.
+    """
+    # the sorted IDs of the current population, and their subpopulations
+    lookup = {}
+
+    def _locate(pop):
+        ids = np.asarray(pop.indInfo("ind_id")).astype('int64')
+        order = np.argsort(ids)
+        lookup['ids'] = ids[order]
+        lookup['subpops'] = subpop_index(pop)[order]
+        return True
+
+    def _populations(child, parent):
+        if 'ids' not in lookup:
+            raise ValueError("The operator must be applied before mating.")
+        index = np.searchsorted(lookup['ids'], parent)
+        index = np.minimum(index, len(lookup['ids']) - 1)
+        if np.any(lookup['ids'][index] != parent):
+            raise ValueError("A parent is not in the population.")
+        return lookup['subpops'][index]
+
+    return sim.PyOperator(func=_locate, **kwargs), _populations
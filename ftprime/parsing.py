@@ -0,0 +1,110 @@
+import collections
+import numpy as np
+
+# the bytes that may separate numbers: ' ', and '\t' through '\r'
+_SPACE = ord(' ')
+_CONTROL_SPACE = (ord('\t'), ord('\r'))
+
+
+ParsedRecombs = collections.namedtuple(
+        'ParsedRecombs', ['child', 'parent', 'ploidy', 'rec_offset', 'rec'])
+ParsedRecombs.__doc__ = '''
+A block of output from simuPOP's Recombinator, parsed into arrays: line ``k``
+says that chromosome ``ploidy[k]`` of ``parent[k]`` was the starting
+chromosome inherited by ``child[k]``, which then switched chromosomes after
+each of the loci ``rec[rec_offset[k]:rec_offset[k+1]]``.
+'''
+
+
+def parse_recombs(lines):
+    """
+    Parse a block of lines of the form
+
+        offspringID parentID startingPloidy rec1 rec2 ....
+
+    as output by ``simuPOP.Recombinator()``, all at once.  The numbers are
+    found and converted with array operations over the bytes of ``lines``,
+    rather than splitting them line by line, and if ``lines`` is already
+    bytes-like, this is done without copying it.  Blank lines are ignored.
+
+    :param lines: The text, as a ``str``, or a ``bytes``, ``bytearray`` or
+        ``memoryview`` of ASCII text.
+    :return ParsedRecombs: The parsed block.
+    """
+    if isinstance(lines, str):
+        lines = lines.encode('ascii')
+    data = np.frombuffer(lines, dtype='uint8')
+    is_digit = np.logical_and(data >= ord('0'), data <= ord('9'))
+    is_space = np.logical_or(data == _SPACE,
+                             np.logical_and(data >= _CONTROL_SPACE[0],
+                                            data <= _CONTROL_SPACE[1]))
+    if not np.all(np.logical_or(is_digit, is_space)):
+        bad = np.flatnonzero(np.logical_not(np.logical_or(is_digit, is_space)))[0]
+        raise ValueError("Unexpected character " + repr(chr(data[bad])) +
+                         " in recombination data.")
+    # the positions of the first and one-past-the-last digit of each number
+    edges = np.diff(np.concatenate([[0], is_digit.view('int8'), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    # the value of each digit, times ten to the number of digits after it
+    digits = data[is_digit].astype('int64') - ord('0')
+    lengths = ends - starts
+    number = np.repeat(np.arange(len(starts)), lengths)
+    digit_start = np.cumsum(lengths) - lengths
+    place = np.repeat(lengths, lengths) - 1 - (np.arange(len(digits))
+                                               - digit_start[number])
+    values = np.zeros(len(starts), dtype='int64')
+    if len(digits) > 0:
+        values = np.add.reduceat(digits * np.power(10, place, dtype='int64'),
+                                 digit_start)
+    # which line each number is on
+    line = np.cumsum(data == ord('\n'))[starts]
+    _, first, counts = np.unique(line, return_index=True, return_counts=True)
+    if np.any(counts < 3):
+        raise ValueError("Each line of recombination data must have at least "
+                         "an offspring ID, a parent ID and a starting ploidy.")
+    position = np.arange(len(values)) - np.repeat(first, counts)
+    rec_offset = np.zeros(len(first) + 1, dtype='int64')
+    np.cumsum(counts - 3, out=rec_offset[1:])
+    return ParsedRecombs(child=values[first], parent=values[first + 1],
+                         ploidy=values[first + 2], rec_offset=rec_offset,
+                         rec=values[position >= 3])
+
+
+def concatenate_recombs(first, second):
+    """
+    Join two parsed blocks of Recombinator output, as if their lines had been
+    parsed together.
+
+    :param ParsedRecombs first: The first block.
+    :param ParsedRecombs second: The block whose lines follow.
+    :return ParsedRecombs: The lines of ``first`` and then ``second``.
+    """
+    return ParsedRecombs(
+            child=np.concatenate([first.child, second.child]),
+            parent=np.concatenate([first.parent, second.parent]),
+            ploidy=np.concatenate([first.ploidy, second.ploidy]),
+            rec_offset=np.concatenate([first.rec_offset[:-1],
+                                       second.rec_offset + first.rec_offset[-1]]),
+            rec=np.concatenate([first.rec, second.rec]))
+
+
+def take_recombs(parsed, lines):
+    """
+    Select lines from a parsed block of Recombinator output.
+
+    :param ParsedRecombs parsed: The parsed block.
+    :param array lines: The indices of the lines to keep, in the order wanted.
+    :return ParsedRecombs: The lines ``parsed[lines[0]], parsed[lines[1]]``,
+        and so on.
+    """
+    lines = np.asarray(lines, dtype='int64')
+    counts = (parsed.rec_offset[lines + 1] - parsed.rec_offset[lines])
+    rec_offset = np.zeros(len(lines) + 1, dtype='int64')
+    np.cumsum(counts, out=rec_offset[1:])
+    # the index in parsed.rec of each of the recombinations kept
+    rec_index = (np.repeat(parsed.rec_offset[lines] - rec_offset[:-1], counts)
+                 + np.arange(rec_offset[-1]))
+    return ParsedRecombs(child=parsed.child[lines], parent=parsed.parent[lines],
+                         ploidy=parsed.ploidy[lines], rec_offset=rec_offset,
+                         rec=parsed.rec[rec_index])
@@ -1,7 +1,32 @@
+from . import checkpoint
 from .argrecorder import ARGrecorder
-import random
+import msprime
+import numbers
+import numpy as np
+import queue
+import threading
 import time as timer
 from .benchmarker import Timings
+from .parsing import (ParsedRecombs, parse_recombs, concatenate_recombs,
+                      take_recombs)
+from .windows import WindowedARGrecorder
+
+# chunks of recombination data at most this long (in characters) are parsed
+# line by line, which is faster than parse_recombs for the one or two lines
+# passed to each call by simuPOP
+_SCALAR_LENGTH = 256
+
+
+def _same_populations(first, second):
+    """
+    Whether chunks collected with ``populations`` of ``first`` and ``second``
+    can be recorded together: both the same function, or both the same single
+    population.  Arrays are for just the one chunk.
+    """
+    if callable(first) or callable(second):
+        return first is second
+    return (isinstance(first, numbers.Integral)
+            and isinstance(second, numbers.Integral) and first == second)
 
 
 class RecombCollector:
@@ -21,7 +46,9 @@ class RecombCollector:
         - the first generation is recorded at time 1.0
     '''
     def __init__(self, ts, node_ids, locus_position, benchmark=False,
-                 mode='text'):
+                 mode='text', id_map='dict', scheduler=None, seed=None,
+                 collection='immediate', queue_size=64, pairing='arrival',
+                 num_windows=1, args=None):
         """
         :param TreeSequence ts: A tree sequence describing the history of each
             chromosome in the population before the simulation starts.
@@ -37,6 +64,36 @@ class RecombCollector:
             ARGrecorder.
         :param str mode: can be 'text or 'binary' then bstrs must be passed to
             `.collect_recombs`.
+        :param str id_map: How the ARGrecorder stores the map from input IDs
+            to node IDs: 'dict' or 'dense' (see :class:`ARGrecorder`).
+        :param ftprime.scheduler.SimplifyScheduler scheduler: An object to
+            decide when ``maybe_simplify`` should simplify.
+        :param int seed: The seed for the random number generator used to
+            place breakpoints between loci; if None, a fresh one is chosen.
+        :param str collection: When the data passed to ``collect_recombs`` is
+            recorded: 'immediate' parses and records each chunk as it arrives,
+            while 'generation' only stores the chunks, and then parses and
+            records all of them at once when next needed (by
+            ``increment_time``, ``simplify``, ``tree_sequence``, or ``flush``).
+            'threaded' passes the chunks to a worker thread, which parses and
+            records them while the caller carries on, and ``flush`` waits for
+            it to catch up.  In 'generation' or 'threaded' mode, call
+            ``flush`` before using ``args`` directly.
+        :param int queue_size: In 'threaded' mode, the number of chunks that
+            may be waiting for the worker before ``collect_recombs`` blocks.
+        :param str pairing: How the two lines for each offspring are matched
+            up: 'arrival' assumes that they arrive one right after the other,
+            while 'child' sorts the lines by offspring ID, so that lines
+            for different offspring may be interleaved (as when simuPOP mates
+            on several threads).  In either case the first of the two lines
+            to arrive is for the paternal chromosome.
+        :param int num_windows: If more than one, the genome is split into
+            this many windows that are simplified in parallel (see
+            :class:`ftprime.windows.WindowedARGrecorder`).
+        :param ARGrecorder args: An existing ARGrecorder to record with, as
+            restored by ``load``; then ``ts`` and ``node_ids`` are not used,
+            nor are the options that only affect how the ARGrecorder is made
+            (``benchmark``, ``id_map``, ``scheduler`` and ``num_windows``).
 
         """
         if mode == 'text':
@@ -45,22 +102,60 @@ class RecombCollector:
             self.split = b'\n'
         else:
             raise ValueError("mode must be 'str' or 'binary'")
-        self.sequence_length = ts.sequence_length
+        if args is not None:
+            self.sequence_length = args.sequence_length
+        else:
+            self.sequence_length = ts.sequence_length
         self.locus_position = locus_position
+        self._locus_position = np.array(locus_position, dtype='float64')
+        # used only to place the breakpoints
+        self.rng = np.random.RandomState(seed)
         self.last_child = -1
         self.time = 0.0
+        if collection not in ('immediate', 'generation', 'threaded'):
+            raise ValueError("collection must be 'immediate', 'generation' "
+                             "or 'threaded'.")
+        self.collection = collection
+        if pairing not in ('arrival', 'child'):
+            raise ValueError("pairing must be 'arrival' or 'child'.")
+        self.pairing = pairing
+        # with pairing='child', lines still waiting for the other line of
+        # their pair, and the populations they are born in
+        self._unpaired = None
+        self._unpaired_populations = None
+        # held while recording, in case collect_recombs is called from more
+        # than one thread at once
+        self._lock = threading.Lock()
+        # chunks passed to collect_recombs but not yet recorded, with their
+        # populations
+        self._pending = []
+        if collection == 'threaded':
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._error = None
+            self._worker = threading.Thread(target=self._work)
+            self._worker.daemon = True
+            self._worker.start()
 
         if locus_position[0] != 0.0 or locus_position[-1] != self.sequence_length:
             raise ValueError("locus_position (and lociPos) must include a locus\
                               at each end of the chromosome.")
 
-        haploid_node_ids = {self.i2c(x[0], x[1]):node_ids[(x[0], x[1])] 
-                            for x in node_ids}
-        if not benchmark:
-            self.args = ARGrecorder(node_ids=haploid_node_ids, ts=ts)
+        if args is not None:
+            self.args = args
         else:
-            self.args = ARGrecorder(node_ids=haploid_node_ids, ts=ts,
-                                    timings=Timings())
+            haploid_node_ids = {self.i2c(x[0], x[1]):node_ids[(x[0], x[1])] 
+                                for x in node_ids}
+            timings = Timings() if benchmark else None
+            if num_windows == 1:
+                self.args = ARGrecorder(node_ids=haploid_node_ids, ts=ts,
+                                        timings=timings, id_map=id_map,
+                                        scheduler=scheduler)
+            else:
+                self.args = WindowedARGrecorder(num_windows=num_windows,
+                                                node_ids=haploid_node_ids,
+                                                ts=ts, timings=timings,
+                                                id_map=id_map,
+                                                scheduler=scheduler)
 
         # will record IDs of diploid samples here when they are chosen
         # but note we don't keep anything else about them here (time, location)
@@ -98,16 +193,120 @@ class RecombCollector:
 
         :return int: The node ID for this chromosome in the output tables.
         """
+        self.flush()
         return self.args.node_ids[self.i2c(k,p)]
 
     def increment_time(self):
+        self.flush()
+        self._check_paired()
         self.time += 1.0
 
-    def collect_recombs(self, lines):
+    def set_time(self, time):
+        """
+        Record individuals collected from now on as born at ``time``.
+        """
+        self.flush()
+        self._check_paired()
+        self.time = float(time)
+
+    def flush(self):
+        """
+        Parse and record any chunks of recombination data that have been
+        collected but not yet recorded (in 'generation' mode), or wait until
+        the worker has recorded them (in 'threaded' mode).
+        """
+        if self.collection == 'threaded':
+            self._queue.join()
+            if self._error is not None:
+                error = self._error
+                self._error = None
+                raise error
+        elif len(self._pending) > 0:
+            pending = self._pending
+            self._pending = []
+            self._record_items([(self.time,) + x for x in pending])
+
+    def _record_items(self, items):
+        """
+        Record a list of ``(time, populations, chunk)`` tuples, in order,
+        parsing each run of chunks that can be recorded together all at once.
+        """
+        start = 0
+        for k in range(1, len(items) + 1):
+            if (k == len(items) or items[k][0] != items[start][0]
+                    or not _same_populations(items[k][1], items[start][1])):
+                self._record_chunks([x for _, _, x in items[start:k]],
+                                    items[start][0], items[start][1])
+                start = k
+
+    def _record_chunks(self, chunks, time, populations=msprime.NULL_POPULATION):
+        """
+        Parse and record a list of chunks of recombination data, collected at
+        ``time``, all at once.
+        """
+        if self.args.timings is not None:
+            before = timer.process_time()
+        if len(chunks) == 1:
+            lines = chunks[0]
+        else:
+            lines = self.split.join(chunks)
+        parsed = parse_recombs(lines)
+        with self._lock:
+            self._record_parsed(parsed, time, populations)
+        if self.args.timings is not None:
+            self.args.timings.time_appending += timer.process_time() - before
+
+    def _work(self):
+        """
+        Record the chunks put on the queue in 'threaded' mode, taking all the
+        chunks that are waiting each time.
+        """
+        while True:
+            items = [self._queue.get()]
+            while items[-1] is not None:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # None means close() was called
+            stop = items[-1] is None
+            if stop:
+                items.pop()
+                self._queue.task_done()
+            try:
+                if self._error is None:
+                    self._record_items(items)
+            except Exception as e:
+                self._error = e
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def close(self):
+        """
+        Record everything collected so far and, in 'threaded' mode, stop the
+        worker thread; no more data may be collected afterwards.
+        """
+        self.flush()
+        if self.collection == 'threaded' and self._worker.is_alive():
+            self._queue.put(None)
+            self._worker.join()
+        self.args.close()
+
+    def collect_recombs(self, lines, populations=msprime.NULL_POPULATION):
         """
         Collects recombinations arriving in text form from simuPOP.
 
-        :param str lines: Recombination data from simuPOP.
+        :param str lines: Recombination data from simuPOP (or, in 'binary'
+            mode, a ``bytes``, ``bytearray`` or ``memoryview``, which is parsed
+            without copying).
+        :param populations: The population the offspring are born in: one for
+            all of them, an array with one entry per line of ``lines``, or a
+            function that is passed the arrays of the offspring ID and the
+            parent ID on each line, and returns the array of the population
+            of each (e.g., :func:`ftprime.operators.birth_location_operator`).
 
         :details
 
@@ -118,61 +317,401 @@ class RecombCollector:
         in *pairs* for (paternal, maternal) chromosomes, as output by
         ``simuPOP.Recombinator()``. A parental chromosome inherited without a
         crossover would be recorded with no recombinations.
+
+        The whole of ``lines`` is parsed at once (see :func:`parse_recombs`),
+        and then the new individuals and edges are recorded in bulk; but a
+        short chunk, such as simuPOP passes for each offspring, is parsed and
+        recorded line by line, which is cheaper.  In 'generation' mode,
+        ``lines`` is just stored until the next ``flush``, and in 'threaded'
+        mode, it is put on the worker's queue.  Chunks whose populations
+        are given by an array or a function are always parsed at once.
         """
+        if self.collection == 'immediate':
+            if (len(lines) <= _SCALAR_LENGTH and self.pairing == 'arrival'
+                    and isinstance(populations, numbers.Integral)):
+                self._record_lines(lines, self.time, populations)
+            else:
+                self._record_chunks([lines], self.time, populations)
+            return
+        if not isinstance(lines, (str, bytes)):
+            # the caller may reuse a bytearray or memoryview
+            lines = bytes(lines)
+        if self.collection == 'generation':
+            self._pending.append((populations, lines))
+        else:
+            self._queue.put((self.time, populations, lines))
+
+    def record_parsed(self, parsed, populations=msprime.NULL_POPULATION):
+        """
+        Record a block of Recombinator output that has already been parsed
+        (e.g., by :func:`parse_recombs`), as ``collect_recombs`` records the
+        text, at the current time.  Anything collected before is recorded
+        first.
+
+        :param ParsedRecombs parsed: The parsed block.
+        :param populations: The population the offspring are born in, as for
+            ``collect_recombs``.
+        """
+        self.flush()
         if self.args.timings is not None:
             before = timer.process_time()
-        for line in lines.strip().split(self.split):
-            # print("A: "+line)
-            # child, parent, ploid,*rec = [int(x) for x in line.split()]
-            linex = [int(x) for x in line.split()]
-            child = linex[0]
-            parent = linex[1]
-            ploid = linex[2]
-            rec = linex[3:]
-            # lines come in pairs: maternal/paternal.
-            if child == self.last_child:
-                child_p = 1
-            else:
-                child_p = 0
-                self.last_child = child
-            # if self.ind_to_time(child) > self.ind_to_time(parent):
-            #     raise ValueError(str(child)+" at "+
-            #            str(self.ind_to_time(child))+'
-            #            " does not come after " + str(parent)+
-            #            " at "+str(self.ind_to_time(parent)))
-
-            start = 0.0
-            child_chrom = self.i2c(child, child_p)
-            # print("  existing parent:",parent, ploid,"-i2c->",
-            # self.i2c(parent, ploid))
-
-            # print("  adding child:",child, child_p,"-i2c->",child_chrom,
-            # self.time)
-            self.args.add_individual(child_chrom, self.time)
-            for r in rec:
-                # do this check to avoid a simuPOP bug
-                if r < len(self.locus_position) - 1:
-                    breakpoint = random.uniform(self.locus_position[r],
-                                                self.locus_position[r + 1])
-                    # print("--- ",start, self.locus_position[r],
-                    #       "< = ",breakpoint,"<=",self.locus_position[r+1])
-                    self.args.add_record(
-                            left=start,
-                            right=breakpoint,
-                            parent=self.i2c(parent, ploid),
-                            children=(child_chrom,))
-                    start = breakpoint
-                    ploid = ((ploid + 1) % 2)
-            # print("--- ",start, self.sequence_length," |")
-            self.args.add_record(
-                    left=start,
-                    right=self.sequence_length,
-                    parent=self.i2c(parent, ploid),
-                    children=(child_chrom,))
+        with self._lock:
+            self._record_parsed(parsed, self.time, populations)
+        if self.args.timings is not None:
+            self.args.timings.time_appending += timer.process_time() - before
+
+    def _record_lines(self, lines, time, population=msprime.NULL_POPULATION):
+        """
+        Parse and record a short chunk of recombination data one line at a
+        time, as :meth:`_record_parsed` would, but without the fixed cost of
+        the array operations; the offspring are all born in ``population``.
+        """
+        if self.args.timings is not None:
+            before = timer.process_time()
+        if isinstance(lines, memoryview):
+            lines = lines.tobytes()
+        num_loci = len(self.locus_position)
+        with self._lock:
+            for line in lines.split(self.split):
+                linex = [int(x) for x in line.split()]
+                if len(linex) == 0:
+                    continue
+                if len(linex) < 3:
+                    raise ValueError("Each line of recombination data must "
+                                     "have at least an offspring ID, a parent "
+                                     "ID and a starting ploidy.")
+                child, parent, ploid = linex[:3]
+                # lines come in pairs: paternal/maternal.
+                if child == self.last_child:
+                    child_p = 1
+                else:
+                    child_p = 0
+                    self.last_child = child
+                child_chrom = self.i2c(child, child_p)
+                self.args.add_individual(child_chrom, time,
+                                         population=population)
+                start = 0.0
+                for r in linex[3:]:
+                    # do this check to avoid a simuPOP bug
+                    if r < num_loci - 1:
+                        breakpoint = self.rng.uniform(self.locus_position[r],
+                                                      self.locus_position[r + 1])
+                        self.args.add_record(start, breakpoint,
+                                             self.i2c(parent, ploid),
+                                             (child_chrom,))
+                        start = breakpoint
+                        ploid = 1 - ploid
+                self.args.add_record(start, self.sequence_length,
+                                     self.i2c(parent, ploid), (child_chrom,))
+        if self.args.timings is not None:
+            self.args.timings.time_appending += timer.process_time() - before
+
+    def _record_parsed(self, parsed, time, populations=msprime.NULL_POPULATION):
+        """
+        Record the individuals and edges described by a parsed block of
+        Recombinator output, in bulk.
+
+        :param ParsedRecombs parsed: The output of :func:`parse_recombs`.
+        :param float time: The time at which the children were born.
+        :param populations: The population the children were born in, as
+            for ``collect_recombs``.
+        """
+        num_lines = len(parsed.child)
+        if callable(populations):
+            populations = populations(parsed.child, parsed.parent)
+        populations = np.asarray(populations, dtype='int32')
+        if populations.ndim == 0:
+            populations = np.full(num_lines, populations, dtype='int32')
+        elif populations.shape != (num_lines,):
+            raise ValueError("There must be one population per line of "
+                             "recombination data.")
+        if self.pairing == 'child':
+            parsed, populations = self._pair_by_child(parsed, populations)
+            num_lines = len(parsed.child)
+        if num_lines == 0:
+            return
+        child = parsed.child
+        # lines come in pairs: paternal/maternal.
+        prev_child = np.concatenate([[self.last_child], child[:-1]])
+        child_p = (child == prev_child).astype('int64')
+        self.last_child = int(child[-1])
+        self._record_loci(2 * child + child_p, parsed, time, populations)
+
+    def _record_loci(self, child_chrom, parsed, time,
+                     populations=msprime.NULL_POPULATION):
+        """
+        Record the births of the chromosomes ``child_chrom``, one for each line
+        of ``parsed``, placing the breakpoints at random between the loci
+        given there.
+        """
+        num_lines = len(child_chrom)
+        # the line each recombination is on
+        rec_line = np.repeat(np.arange(num_lines), np.diff(parsed.rec_offset))
+        # do this check to avoid a simuPOP bug
+        valid = parsed.rec < len(self.locus_position) - 1
+        rec = parsed.rec[valid]
+        rec_line = rec_line[valid]
+        breakpoints = self.rng.uniform(self._locus_position[rec],
+                                       self._locus_position[rec + 1])
+        self._record_chromosomes(child_chrom, parsed.parent, parsed.ploidy,
+                                 rec_line, breakpoints, time, populations)
+
+    def _record_chromosomes(self, child_chrom, parent, ploidy, bp_line,
+                            breakpoints, time,
+                            populations=msprime.NULL_POPULATION):
+        """
+        Record the births of the chromosomes ``child_chrom``, where
+        ``child_chrom[k]`` inherits first from chromosome ``ploidy[k]`` of
+        diploid ``parent[k]``, and then switches to the other one at each of
+        the breakpoints on it: ``breakpoints[bp_line == k]``, which must be in
+        increasing order.  They are born in ``populations``.
+        """
+        num_lines = len(child_chrom)
+        self.args.add_individuals(child_chrom, time, populations=populations)
+        # each line gives one more edge than it has recombinations
+        num_segments = np.bincount(bp_line, minlength=num_lines) + 1
+        seg_line = np.repeat(np.arange(num_lines), num_segments)
+        seg_start = np.cumsum(num_segments) - num_segments
+        seg_index = np.arange(len(seg_line)) - seg_start[seg_line]
+        is_first = (seg_index == 0)
+        is_last = (seg_index == num_segments[seg_line] - 1)
+        lefts = np.zeros(len(seg_line), dtype='float64')
+        lefts[~is_first] = breakpoints
+        rights = np.full(len(seg_line), self.sequence_length, dtype='float64')
+        rights[~is_last] = breakpoints
+        # each recombination switches to the other parental chromosome
+        parent_p = (ploidy[seg_line] + seg_index) % 2
+        self.args.add_records(lefts, rights,
+                              2 * parent[seg_line] + parent_p,
+                              child_chrom[seg_line])
+
+    def add_diploid(self, child, father, mother, father_breakpoints=(),
+                    mother_breakpoints=(), father_ploidy=0, mother_ploidy=0,
+                    population=msprime.NULL_POPULATION):
+        """
+        Record the birth, at the current time, of the diploid ``child`` of
+        ``father`` and ``mother``.  The child's paternal (0) chromosome starts
+        out as the father's chromosome ``father_ploidy``, and switches between
+        the father's two chromosomes at each of ``father_breakpoints``; and
+        likewise for the maternal (1) chromosome.
+
+        :param int child: The input ID of the child.
+        :param int father: The input ID of the father.
+        :param int mother: The input ID of the mother.
+        :param array father_breakpoints: The positions of the crossovers in the
+            chromosome inherited from the father, in increasing order.
+        :param array mother_breakpoints: The same, for the mother.
+        :param int father_ploidy: Which of the father's chromosomes (0 or 1)
+            is inherited from at the start of the chromosome.
+        :param int mother_ploidy: The same, for the mother.
+        :param int population: The population the child is born in.
+        """
+        self.add_diploids([child], [father], [mother], [father_breakpoints],
+                          [mother_breakpoints], father_ploidy, mother_ploidy,
+                          population)
 
+    def add_diploids(self, children, fathers, mothers, father_breakpoints=None,
+                     mother_breakpoints=None, father_ploidy=0, mother_ploidy=0,
+                     populations=msprime.NULL_POPULATION):
+        """
+        Record many births at once: the array version of ``add_diploid``, so
+        that ``children[k]`` is the child of ``fathers[k]`` and
+        ``mothers[k]``, with crossovers at ``father_breakpoints[k]`` and
+        ``mother_breakpoints[k]``.  Both chromosomes of every child are
+        recorded with one call to each of ``add_individuals`` and
+        ``add_records`` of the underlying ARGrecorder.
+
+        :param array children: The input IDs of the children.
+        :param array fathers: The input IDs of their fathers.
+        :param array mothers: The input IDs of their mothers.
+        :param list father_breakpoints: A list of arrays of crossover
+            positions, one per child, or None if there are no crossovers.
+        :param list mother_breakpoints: The same, for the mothers.
+        :param array father_ploidy: The chromosome of each father (0 or 1) to
+            start from, or one value for all of them.
+        :param array mother_ploidy: The same, for the mothers.
+        :param array populations: The population each child is born in, or
+            one for all of them.
+        """
+        children = np.asarray(children).astype('int64')
+        n = len(children)
+        parent = np.column_stack([np.asarray(fathers).astype('int64'),
+                                  np.asarray(mothers).astype('int64')]).ravel()
+        ploidy = np.column_stack(
+                [np.broadcast_to(np.asarray(father_ploidy, dtype='int64'), (n,)),
+                 np.broadcast_to(np.asarray(mother_ploidy, dtype='int64'), (n,))]
+                ).ravel()
+        if np.any(np.logical_and(ploidy != 0, ploidy != 1)):
+            raise ValueError("Chromosome ID must be 0 (paternal) or 1 (maternal).")
+        values = []
+        lines = []
+        for p, bps in ((0, father_breakpoints), (1, mother_breakpoints)):
+            if bps is None:
+                continue
+            if len(bps) != n:
+                raise ValueError("There must be one array of breakpoints per child.")
+            lengths = [len(x) for x in bps]
+            values.extend(bps)
+            lines.append(np.repeat(2 * np.arange(n) + p, lengths))
+        breakpoints = np.concatenate([np.zeros(0)] + [
+                np.asarray(x, dtype='float64') for x in values])
+        bp_line = np.concatenate([np.zeros(0, dtype='int64')] + lines)
+        order = np.argsort(bp_line, kind='stable')
+        breakpoints = breakpoints[order]
+        bp_line = bp_line[order]
+        if np.any(np.logical_or(breakpoints <= 0.0,
+                                breakpoints >= self.sequence_length)):
+            raise ValueError("Breakpoints must be inside the chromosome.")
+        if np.any(np.logical_and(np.diff(bp_line) == 0,
+                                 np.diff(breakpoints) <= 0)):
+            raise ValueError("Breakpoints must be in increasing order.")
+        self.flush()
+        if self.args.timings is not None:
+            before = timer.process_time()
+        with self._lock:
+            self._record_chromosomes(
+                    self.haploid_ids(children), parent, ploidy, bp_line,
+                    breakpoints, self.time,
+                    np.repeat(np.broadcast_to(np.asarray(populations, dtype='int32'),
+                                              (n,)), 2))
+        if self.args.timings is not None:
+            self.args.timings.time_appending += timer.process_time() - before
+
+    def collect_matings(self, children, fathers, mothers, rates,
+                        populations=msprime.NULL_POPULATION):
+        """
+        Record the births of ``children``, whose chromosomes are drawn from
+        those of their ``fathers`` and ``mothers``, with crossovers placed at
+        random by the collector's random number generator: as for simuPOP's
+        Recombinator, each inherited chromosome starts on a random one of the
+        parent's two, and switches between loci ``j`` and ``j+1`` with
+        probability ``rates[j]``.  This records lines of data like those
+        passed to ``collect_recombs``, but without formatting or parsing text.
+        Since the crossovers are drawn here, they have nothing to do with any
+        that simuPOP uses to pass on genotypes, so this is only for runs where
+        simuPOP's genotypes do not matter (see
+        :func:`ftprime.operators.pedigree_only_operator`).
+
+        :param array children: The diploid input IDs of the offspring.
+        :param array fathers: The diploid input IDs of their fathers, from
+            whom they inherit their paternal (0) chromosomes.
+        :param array mothers: The diploid input IDs of their mothers, from
+            whom they inherit their maternal (1) chromosomes.
+        :param rates: The probability of a crossover between each pair of
+            adjacent loci, as an array with one fewer entries than
+            ``locus_position``, or a single probability for every pair.
+        :param array populations: The population that each child is born in
+            (e.g., simuPOP's subpopulation index), or one for all of them.
+        """
+        children = np.asarray(children).astype('int64')
+        num_lines = 2 * len(children)
+        num_intervals = len(self._locus_position) - 1
+        rates = np.broadcast_to(np.asarray(rates, dtype='float64'),
+                                (num_intervals,))
+        self.flush()
+        if self.args.timings is not None:
+            before = timer.process_time()
+        parents = np.column_stack([np.asarray(fathers).astype('int64'),
+                                   np.asarray(mothers).astype('int64')]).ravel()
+        ploidy = self.rng.randint(2, size=num_lines)
+        # for each interval, choose the lines with a crossover there
+        num_recs = self.rng.binomial(num_lines, rates)
+        rec, rec_lines = self._choose_lines(num_recs, num_lines)
+        order = np.lexsort((rec, rec_lines))
+        rec_offset = np.zeros(num_lines + 1, dtype='int64')
+        np.cumsum(np.bincount(rec_lines, minlength=num_lines),
+                  out=rec_offset[1:])
+        parsed = ParsedRecombs(child=np.repeat(children, 2), parent=parents,
+                               ploidy=ploidy, rec_offset=rec_offset,
+                               rec=rec[order])
+        populations = np.repeat(np.broadcast_to(
+            np.asarray(populations, dtype='int32'), (len(children),)), 2)
+        with self._lock:
+            self._record_loci(self.haploid_ids(children), parsed, self.time,
+                              populations)
         if self.args.timings is not None:
             self.args.timings.time_appending += timer.process_time() - before
 
+    def _choose_lines(self, num_recs, num_lines):
+        """
+        For each interval ``j``, choose ``num_recs[j]`` distinct lines out of
+        ``num_lines`` at random, returning the intervals and lines chosen as
+        two arrays.  Lines are drawn with replacement, and any drawn twice for
+        the same interval are drawn again, except in intervals with more than
+        half of the lines, which are chosen by shuffling.
+        """
+        dense = np.flatnonzero(2 * num_recs > num_lines)
+        sparse_recs = num_recs.copy()
+        sparse_recs[dense] = 0
+        rec = np.repeat(np.arange(len(num_recs)), sparse_recs)
+        rec_lines = self.rng.randint(num_lines, size=len(rec))
+        while True:
+            _, first = np.unique(rec * num_lines + rec_lines,
+                                 return_index=True)
+            repeated = np.ones(len(rec), dtype='bool')
+            repeated[first] = False
+            num_repeated = np.count_nonzero(repeated)
+            if num_repeated == 0:
+                break
+            rec_lines[repeated] = self.rng.randint(num_lines,
+                                                   size=num_repeated)
+        rec = [rec] + [np.full(num_recs[j], j, dtype='int64') for j in dense]
+        rec_lines = [rec_lines] + [self.rng.permutation(num_lines)[:num_recs[j]]
+                                   for j in dense]
+        return (np.concatenate(rec).astype('int64'),
+                np.concatenate(rec_lines).astype('int64'))
+
+    def _pair_by_child(self, parsed, populations):
+        """
+        Sort the lines of ``parsed``, along with any left unpaired from before,
+        by offspring ID (keeping the order of the two lines of each pair), and
+        return those with both lines of their pair, and the populations for
+        them (one per line); the rest are kept for later.
+        """
+        if self._unpaired is not None:
+            parsed = concatenate_recombs(self._unpaired, parsed)
+            populations = np.concatenate([self._unpaired_populations,
+                                          populations])
+            self._unpaired = None
+            self._unpaired_populations = None
+        order = np.argsort(parsed.child, kind='stable')
+        child = parsed.child[order]
+        _, first, counts = np.unique(child, return_index=True,
+                                     return_counts=True)
+        if np.any(counts > 2):
+            raise ValueError("More than two lines of recombination data for "
+                             "offspring " + str(child[first[counts > 2][0]]) + ".")
+        paired = np.repeat(counts == 2, counts)
+        if not np.all(paired):
+            self._unpaired = take_recombs(parsed, order[~paired])
+            self._unpaired_populations = populations[order[~paired]]
+        # so that the first line is not taken as the second of a pair
+        self.last_child = -1
+        return (take_recombs(parsed, order[paired]),
+                populations[order[paired]])
+
+    def _check_paired(self):
+        """
+        Check that no lines are still waiting for the other line of their pair.
+        """
+        if self._unpaired is not None:
+            raise ValueError("Recombination data for offspring " +
+                             str(self._unpaired.child[0]) + " is missing a line.")
+
+    def haploid_ids(self, samples):
+        """
+        Get the chromosome IDs of both chromosomes of each of a list of
+        individuals, as with ``i2c``.
+
+        :param array samples: An array (or list) of diploid input individual IDs.
+
+        :return array: The array of the corresponding chromosome IDs, with the
+            paternal (0) then maternal (1) chromosome of ``samples[0]`` first,
+            and so on.
+        """
+        samples = np.asarray(samples).astype('int64')
+        return (2 * samples[:, np.newaxis] + np.array([0, 1])).ravel()
+
     def tree_sequence(self, samples):
             """
             Returns a tree sequence, that retains only information relevant
@@ -180,37 +719,156 @@ class RecombCollector:
 
             :param list samples: A list of diploid input individual IDs.
             """
-            haploid_ids = [self.i2c(i,p) for i in samples for p in (0,1)]
-            return self.args.tree_sequence(haploid_ids)
+            self.flush()
+            return self.args.tree_sequence(self.haploid_ids(samples))
+
+    def save(self, path):
+        """
+        Write the state of the collector, and of its ARGrecorder (see
+        :meth:`ARGrecorder.save`), to the directory ``path``, so that it can
+        be restored with ``load``; both are written to the same checkpoint,
+        which replaces any previous one at ``path`` all at once.  Everything
+        collected so far is recorded first.
 
-    def simplify(self, samples):
+        :param str path: The directory to write to.
+        """
+        self.flush()
+        self.args.save(path, save_extra=self._save_extra)
+
+    def _save_extra(self, path):
+        """
+        Write the state of the collector itself to the checkpoint directory
+        ``path``.
+        """
+        header = {
+            'locus_position': [float(x) for x in self.locus_position],
+            'mode': self.mode,
+            'pairing': self.pairing,
+            'time': self.time,
+            'last_child': self.last_child,
+            'unpaired': self._unpaired is not None,
+        }
+        name, keys, pos, has_gauss, cached_gaussian = self.rng.get_state()
+        header['rng_state'] = [name, int(pos), int(has_gauss),
+                               float(cached_gaussian)]
+        checkpoint.save_array(path, 'rng_keys', keys)
+        if self._unpaired is not None:
+            for field in ParsedRecombs._fields:
+                checkpoint.save_array(path, 'unpaired_' + field,
+                                      getattr(self._unpaired, field))
+            checkpoint.save_array(path, 'unpaired_populations',
+                                  self._unpaired_populations)
+        checkpoint.save_header(path, header, name='recomb_collector')
+
+    @classmethod
+    def load(cls, path, mmap=True, benchmark=False, scheduler=None,
+             num_windows=1, **kwargs):
+        """
+        Restore a collector written with ``save``.
+
+        :param str path: The directory written by ``save``.
+        :param bool mmap: Whether to memory-map the saved arrays.
+        :param bool benchmark: Whether to store benchmark information in the
+            ARGrecorder.
+        :param ftprime.scheduler.SimplifyScheduler scheduler: An object to
+            decide when ``maybe_simplify`` should simplify.
+        :param int num_windows: The number of windows to simplify in (see
+            :class:`ftprime.windows.WindowedARGrecorder`).
+        :param kwargs: Passed on to the constructor, for the options that are
+            not saved (``collection`` and ``queue_size``).
+        :return RecombCollector: The collector, as it was when saved.
+        """
+        path = checkpoint.find_checkpoint(path)
+        header = checkpoint.load_header(path, name='recomb_collector')
+        timings = Timings() if benchmark else None
+        if num_windows == 1:
+            args = ARGrecorder.load(path, mmap=mmap, timings=timings,
+                                    scheduler=scheduler)
+        else:
+            args = WindowedARGrecorder.load(path, mmap=mmap, timings=timings,
+                                            scheduler=scheduler,
+                                            num_windows=num_windows)
+        rc = cls(ts=None, node_ids=None,
+                 locus_position=header['locus_position'],
+                 mode=header['mode'], pairing=header['pairing'], args=args,
+                 **kwargs)
+        rc.time = header['time']
+        rc.last_child = header['last_child']
+        name, pos, has_gauss, cached_gaussian = header['rng_state']
+        rc.rng.set_state((name, np.array(checkpoint.load_array(path, 'rng_keys',
+                                                               mmap=False)),
+                          pos, has_gauss, cached_gaussian))
+        if header['unpaired']:
+            rc._unpaired = ParsedRecombs(
+                    *[np.array(checkpoint.load_array(path, 'unpaired_' + field,
+                                                     mmap))
+                      for field in ParsedRecombs._fields])
+            rc._unpaired_populations = np.array(
+                    checkpoint.load_array(path, 'unpaired_populations', mmap))
+        return rc
+
+    def snapshot(self, samples, path=None):
+        """
+        Export the tree sequence for the diploid individuals listed in
+        `samples` on another thread, while recording carries on (see
+        :meth:`ARGrecorder.snapshot`).
+
+        :param list samples: A list of diploid input individual IDs.
+        :param str path: If given, the file to write the tree sequence to.
+        :return concurrent.futures.Future: A future whose result is the tree
+            sequence.
+        """
+        self.flush()
+        return self.args.snapshot(self.haploid_ids(samples), path=path)
+
+    def simplify(self, samples, background=False, return_ts=False):
         """
         Simplify the underlying tree sequence, retaining only information relevant
         to the diploid individuals listed in `samples`.
 
         :param list samples: A list of diploid input individual IDs.
+        :param bool background: Whether to simplify on another thread (see
+            :meth:`ARGrecorder.simplify`).
+        :param bool return_ts: Whether to return the simplified tree sequence.
+        :return TreeSequence: If ``return_ts``, the tree sequence; otherwise
+            None.
+        """
+        self.flush()
+        self._check_paired()
+        return self.args.simplify(self.haploid_ids(samples),
+                                  background=background, return_ts=return_ts)
+
+    def maybe_simplify(self, samples, background=False):
+        """
+        Simplify, as with ``simplify(samples, background)``, if the
+        ARGrecorder's scheduler says it is time to (after waiting for any
+        simplification running in the background; see
+        :meth:`ARGrecorder.maybe_simplify`).
+
+        :param list samples: A list of diploid input individual IDs.
+        :param bool background: Whether to simplify on another thread.
+        :return bool: Whether simplification happened.
         """
-        haploid_ids = [self.i2c(i,p) for i in samples for p in (0,1)]
-        self.args.simplify(haploid_ids)
+        if self.args.scheduler is None:
+            raise ValueError("maybe_simplify() needs a scheduler.")
+        self.flush()
+        self.args.wait()
+        if self.args.scheduler.should_simplify(self.args):
+            self.simplify(samples, background=background)
+            return True
+        return False
 
     def add_locations(self, input_ids, locations):
         """
         Assign the `population` field of each individual in `input_ids` to the corresponding
-        entry in `locations`.
-
-        :param list input_ids: A list of input diploid individual IDs.
-        :param list locations: A list of population IDs.
-        """
-        populations = self.args.tables.nodes.population
-        max_loc = max(locations)
-        if max_loc > self.args.tables.populations.num_rows:
-            while self.args.tables.populations.num_rows <= max_loc:
-                self.args.tables.populations.add_row()
-        for i, loc in zip([int(j) for j in input_ids], locations):
-            for p in (0,1):
-                h = self.i2c(i, p)
-                node_id = self.args.node_ids[h]
-                populations[node_id] = int(loc)
-        self.args.tables.nodes.set_columns(flags=self.args.tables.nodes.flags,
-                                           time=self.args.tables.nodes.time,
-                                           population=populations)
+        entry in `locations`.  This is done for all of them at once, so it is
+        cheap enough to do every generation (e.g., with
+        :func:`ftprime.operators.location_operator`).
+
+        :param array input_ids: An array (or list) of input diploid individual IDs.
+        :param array locations: An array (or list) of population IDs.
+        """
+        self.flush()
+        locations = np.asarray(locations).astype('int32')
+        self.args.set_populations(self.haploid_ids(input_ids),
+                                  np.repeat(locations, 2))
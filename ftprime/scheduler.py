@@ -0,0 +1,111 @@
+# approximate sizes in bytes of a row of the NodeTable and of the EdgeTable,
+# used to estimate memory usage
+NODE_BYTES = 16
+EDGE_BYTES = 24
+
+
+class SimplifyScheduler(object):
+    '''
+    Decides when an ARGrecorder should simplify.  Simplifying too often wastes
+    time re-processing the tables retained from the last simplification, while
+    simplifying too rarely uses memory, and makes each sort more expensive.
+
+    This simplifies once the number of edges added since the last
+    simplification reaches ``ratio`` times the number of edges retained by it
+    (but at least ``min_edges``), or as soon as the estimated size of the
+    tables reaches ``memory_budget``.  The ``ratio`` is tuned as the
+    simulation goes: after each simplification, the time spent appending,
+    sorting and simplifying since the last one (as recorded in the recorder's
+    :class:`ftprime.benchmarker.Timings`) is divided by the number of new
+    edges, and ``ratio`` is moved up or down by a factor of ``step``, reversing
+    direction whenever this cost per edge got worse.
+
+    To use it, pass it as ``scheduler`` to an :class:`ftprime.ARGrecorder` or
+    :class:`ftprime.RecombCollector`, and call ``maybe_simplify(samples)`` on
+    that, every generation.  See also
+    :func:`ftprime.operators.simplify_operator` for use with simuPOP.
+    '''
+
+    def __init__(self, memory_budget=None, ratio=10.0, min_edges=10000,
+                 min_ratio=0.5, max_ratio=1000.0, step=1.25):
+        """
+        :param int memory_budget: The maximum size of the tables, in bytes
+            (approximately), or None for no limit.
+        :param float ratio: The initial ratio of new to retained edges at which
+            to simplify.
+        :param int min_edges: The minimum number of new edges to simplify at.
+        :param float min_ratio: The smallest value ``ratio`` may take.
+        :param float max_ratio: The largest value ``ratio`` may take.
+        :param float step: The factor to change ``ratio`` by each time.
+        """
+        if step <= 1.0:
+            raise ValueError("step must be greater than 1.")
+        self.memory_budget = memory_budget
+        self.ratio = ratio
+        self.min_edges = min_edges
+        self.min_ratio = min_ratio
+        self.max_ratio = max_ratio
+        self.step = step
+        # whether we are increasing or decreasing the ratio
+        self.direction = 1
+        # cost per new edge at the last simplification
+        self.last_cost = None
+        # number of edges retained by the last simplification
+        self.retained_edges = 0
+        # total time recorded by the timings at the last simplification
+        self.last_total_time = 0.0
+        # whether the last decision to simplify was forced by memory use
+        self.memory_bound = False
+
+    def start(self, recorder):
+        """
+        Begin scheduling for ``recorder``; this is called by the recorder
+        itself.
+        """
+        self.retained_edges = recorder.num_edges
+        self.last_total_time = sum(recorder.timings.times.values())
+
+    def memory_used(self, recorder):
+        """
+        Estimate the memory used by the tables in ``recorder``, in bytes.
+        """
+        return NODE_BYTES * recorder.num_nodes + EDGE_BYTES * recorder.num_edges
+
+    def num_new_edges(self, recorder):
+        """
+        The number of edges ``recorder`` has added since the last simplify.
+        """
+        return recorder.num_edges - self.retained_edges
+
+    def should_simplify(self, recorder):
+        """
+        Whether ``recorder`` should simplify now.
+        """
+        self.memory_bound = (self.memory_budget is not None
+                             and self.memory_used(recorder) >= self.memory_budget)
+        if self.memory_bound:
+            return True
+        return (self.num_new_edges(recorder)
+                >= max(self.min_edges, self.ratio * self.retained_edges))
+
+    def record_simplify(self, recorder, num_new_edges):
+        """
+        Update the schedule after ``recorder`` has simplified; this is called
+        by the recorder itself.
+
+        :param int num_new_edges: The number of edges that had been added since
+            the previous simplify.
+        """
+        total_time = sum(recorder.timings.times.values())
+        cost = total_time - self.last_total_time
+        self.last_total_time = total_time
+        # anything still in the buffer was added since simplifying
+        self.retained_edges = recorder.num_edges - recorder.buffer.num_edges
+        if num_new_edges > 0 and not self.memory_bound:
+            cost_per_edge = cost / num_new_edges
+            if self.last_cost is not None and cost_per_edge > self.last_cost:
+                self.direction = -self.direction
+            self.last_cost = cost_per_edge
+            self.ratio *= self.step ** self.direction
+            self.ratio = min(self.max_ratio, max(self.min_ratio, self.ratio))
+        self.memory_bound = False
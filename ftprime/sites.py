@@ -0,0 +1,142 @@
+import msprime
+import numpy as np
+
+
+class SiteIndex(object):
+    '''
+    A map from site positions to site IDs, for finding out whether a mutation
+    falls at an existing site.  This is stored as an array of positions in
+    sorted order, along with the corresponding site IDs, so that batched
+    lookups are done with ``np.searchsorted``.  Sites added one at a time are
+    kept in a dict, and those added in batches in a list of arrays, until the
+    next batched lookup merges them into the sorted arrays.  Lookups of one
+    position at a time use a dict of all the sites instead, which is made at
+    the first such lookup (and then kept up to date), so that recording that
+    is only batched never pays for it.
+
+    Since simplifying (or sorting) the tables renumbers and removes sites, the
+    index should be rebuilt from the SiteTable, with ``reset``, afterwards.
+    '''
+
+    def __init__(self, positions=None):
+        """
+        :param array positions: The positions of the sites numbered
+            ``0, 1, ...``, as in ``SiteTable.position``.
+        """
+        if positions is None:
+            positions = []
+        self.reset(positions)
+
+    def __len__(self):
+        return (len(self.positions) + len(self._recent)
+                + sum(len(p) for p, _ in self._chunks))
+
+    def __contains__(self, position):
+        return self.get(position) != msprime.NULL_NODE
+
+    @classmethod
+    def from_sorted(cls, positions, sites):
+        """
+        Make an index from the arrays returned by ``sorted_arrays``, without
+        sorting them again.
+        """
+        index = cls()
+        index.positions = np.asarray(positions, dtype='float64')
+        index.sites = np.asarray(sites, dtype='int32')
+        return index
+
+    def sorted_arrays(self):
+        """
+        Return the positions in the index, in sorted order, and the array of
+        corresponding site IDs.
+        """
+        self._merge()
+        return self.positions, self.sites
+
+    def reset(self, positions):
+        """
+        Empty the index, and then map ``positions[k]`` to ``k``.
+
+        :param array positions: An array of site positions.
+        """
+        positions = np.asarray(positions, dtype='float64')
+        order = np.argsort(positions, kind='mergesort')
+        self.positions = positions[order]
+        self.sites = order.astype('int32')
+        self._recent = {}
+        self._chunks = []
+        # all sites, for scalar lookups, or None if not made yet
+        self._index = None
+
+    def _merge(self):
+        """
+        Move any recently added sites into the sorted arrays.
+        """
+        if len(self._recent) > 0:
+            n = len(self._recent)
+            self._chunks.append(
+                (np.fromiter(self._recent.keys(), dtype='float64', count=n),
+                 np.fromiter(self._recent.values(), dtype='int32', count=n)))
+            self._recent = {}
+        if len(self._chunks) > 0:
+            positions = np.concatenate([self.positions]
+                                       + [p for p, _ in self._chunks])
+            sites = np.concatenate([self.sites] + [s for _, s in self._chunks])
+            self._chunks = []
+            order = np.argsort(positions, kind='mergesort')
+            self.positions = positions[order]
+            self.sites = sites[order]
+
+    def _find(self, positions):
+        k = np.searchsorted(self.positions, positions)
+        k[k == len(self.positions)] = 0
+        out = np.full(len(positions), msprime.NULL_NODE, dtype='int32')
+        if len(self.positions) > 0:
+            found = (self.positions[k] == positions)
+            out[found] = self.sites[k[found]]
+        return out
+
+    def get(self, position):
+        """
+        Return the site ID at ``position``, or ``msprime.NULL_NODE`` if there
+        is none.
+
+        :param float position: A site position.
+        """
+        if self._index is None:
+            self._merge()
+            self._index = dict(zip(self.positions.tolist(),
+                                   self.sites.tolist()))
+        return self._index.get(position, msprime.NULL_NODE)
+
+    def add(self, position, site):
+        """
+        Record that site ``site`` is at ``position``.
+        """
+        self._recent[position] = site
+        if self._index is not None:
+            self._index[position] = site
+
+    def lookup(self, positions):
+        """
+        Return the array of site IDs at ``positions``, with
+        ``msprime.NULL_NODE`` for any positions without a site.
+
+        :param array positions: An array of site positions.
+        """
+        self._merge()
+        return self._find(np.asarray(positions, dtype='float64'))
+
+    def add_many(self, positions, sites):
+        """
+        Record that the sites ``sites`` are at the corresponding ``positions``.
+        This does not check for positions that are already in the index.
+
+        :param array positions: An array of site positions.
+        :param array sites: An array of site IDs of the same length.
+        """
+        positions = np.array(positions, dtype='float64')
+        sites = np.array(sites, dtype='int32')
+        self._chunks.append((positions, sites))
+        if self._index is not None:
+            self._index.update(zip(positions.tolist(), sites.tolist()))
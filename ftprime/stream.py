@@ -0,0 +1,262 @@
+'''
+Recording from a stream of simuPOP Recombinator output, as written to a file
+or a named pipe (e.g., made with ``mkfifo``) with
+``simuPOP.Recombinator(output='>>' + path)``, instead of through a Python
+callback.
+
+Besides the usual lines of recombination data, the stream may contain marker
+lines, beginning with ``#``:
+
+    #T time
+        Record the lines that follow as born at ``time``.
+
+    #S id1 id2 ...
+        Simplify, keeping the history of the listed diploid individuals.
+
+    #P id1 id2 ...
+        The listed diploid individuals are alive: if the RecombCollector has a
+        scheduler, simplify to them if it says it is time to.
+
+The markers can be written into the stream by simuPOP itself, with
+:func:`ftprime.operators.time_marker_operator` and
+:func:`ftprime.operators.population_marker_operator`.  Or, the whole stream can be
+captured to a compressed log during the simulation by a :class:`RecombCapture`,
+and the genealogy recorded later, with :func:`replay_recombs`.
+'''
+import gzip
+import msprime
+import multiprocessing
+
+from .recomb_collector import RecombCollector
+
+
+def _read_marker(rc, marker):
+    """
+    Act on one marker line (a bytes-like object, without the ``#``).
+    """
+    fields = bytes(marker).split()
+    if len(fields) == 0:
+        raise ValueError("Empty marker line in recombination stream.")
+    if fields[0] == b'T' and len(fields) == 2:
+        rc.set_time(float(fields[1]))
+    elif fields[0] == b'S':
+        rc.simplify([int(x) for x in fields[1:]])
+    elif fields[0] == b'P':
+        if rc.args.scheduler is not None:
+            rc.maybe_simplify([int(x) for x in fields[1:]])
+    else:
+        raise ValueError("Unknown marker line in recombination stream: " +
+                         repr(bytes(marker)))
+
+
+def _feed(rc, data):
+    """
+    Pass the complete lines in the bytes ``data`` on to ``rc``, acting on
+    marker lines as they come.
+    """
+    view = memoryview(data)
+    pos = 0
+    while True:
+        mark = data.find(b'#', pos)
+        if mark < 0:
+            break
+        if mark > pos:
+            rc.collect_recombs(view[pos:mark])
+        end = data.find(b'\n', mark)
+        if end < 0:
+            end = len(data)
+        _read_marker(rc, view[mark + 1:end])
+        pos = end + 1
+    if pos < len(data):
+        rc.collect_recombs(view[pos:])
+
+
+def read_recombs(stream, rc, chunk_size=2**20):
+    """
+    Read Recombinator output (with markers) from ``stream`` until it ends, in
+    chunks of ``chunk_size`` bytes, and record it all with ``rc``, which
+    must be in 'binary' mode.
+
+    :param stream: A file object opened for reading in binary mode.
+    :param RecombCollector rc: The RecombCollector to record with.
+    :param int chunk_size: The number of bytes to read at a time.
+    :return RecombCollector: ``rc``.
+    """
+    if rc.mode != 'binary':
+        raise ValueError("The RecombCollector must be in 'binary' mode.")
+    rest = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if len(chunk) == 0:
+            break
+        data = rest + chunk
+        # only pass on complete lines
+        end = data.rfind(b'\n') + 1
+        rest = data[end:]
+        if end > 0:
+            _feed(rc, data[:end])
+    if len(rest.strip()) > 0:
+        _feed(rc, rest)
+    rc.flush()
+    return rc
+
+
+def _collect_stream(path, output, chunk_size, kwargs):
+    rc = RecombCollector(mode='binary', **kwargs)
+    with open(path, 'rb') as stream:
+        read_recombs(stream, rc, chunk_size=chunk_size)
+    rc.close()
+    rc.args.tree_sequence().dump(output)
+
+
+class StreamCollector(object):
+    '''
+    Records the Recombinator output written to ``path`` in a separate process,
+    so that it runs on its own core, and with its own memory, while simuPOP
+    runs.  Once the stream ends (i.e., the writer closes the pipe), the tree
+    sequence is written to ``output``, with the samples being those of the
+    last ``#S`` marker (or everyone born since).  The collector only
+    simplifies at the markers in the stream, so have simuPOP write them with
+    :func:`ftprime.operators.population_marker_operator`, and pass a
+    ``scheduler``; otherwise, the whole history of everyone ever born is
+    kept, and written out.  For instance:
+
+        os.mkfifo(path)
+        sc = StreamCollector(path, "out.trees", ts=init_ts, node_ids=node_ids,
+                             locus_position=locus_position,
+                             scheduler=SimplifyScheduler())
+        sc.start()
+        pop.evolve(
+            preOps=[time_marker_operator('>>' + path)],
+            matingScheme=sim.RandomMating(ops=[
+                id_tagger, sim.Recombinator(output='>>' + path, ...)]),
+            postOps=[population_marker_operator('>>' + path),
+                     population_marker_operator('>>' + path, simplify=True,
+                                                at=-1)],
+            ...)
+        ts = sc.join()
+
+    This uses the 'fork' start method, so that the arguments need not be
+    picklable.
+    '''
+
+    def __init__(self, path, output, chunk_size=2**20, **kwargs):
+        """
+        :param str path: The file or named pipe to read from.
+        :param str output: The file to write the resulting tree sequence to.
+        :param int chunk_size: The number of bytes to read at a time.
+        :param kwargs: Passed on to :class:`RecombCollector` (except for
+            ``mode``, which is always 'binary').
+        """
+        self.path = path
+        self.output = output
+        context = multiprocessing.get_context('fork')
+        self.process = context.Process(
+                target=_collect_stream,
+                args=(path, output, chunk_size, kwargs))
+        self.process.daemon = True
+
+    def start(self):
+        """
+        Start the reading process.  Opening a named pipe blocks until the
+        writer opens it too, but this happens in the other process.
+        """
+        self.process.start()
+
+    def join(self):
+        """
+        Wait for the stream to end and the tree sequence to be written.
+
+        :return TreeSequence: The tree sequence that was written to ``output``.
+        """
+        self.process.join()
+        if self.process.exitcode != 0:
+            raise RuntimeError("Reading recombinations from " + self.path +
+                               " failed with exit code " +
+                               str(self.process.exitcode) + ".")
+        return msprime.load(self.output)
+
+
+def replay_recombs(path, rc, chunk_size=2**20):
+    """
+    Record the recombinations in a log written by :class:`RecombCapture`
+    with ``rc``, which must be in 'binary' mode.  If ``rc`` has a scheduler,
+    it simplifies whenever the scheduler says to, at the points where the
+    population was noted with ``maybe_simplify``.
+
+    :param str path: The gzipped log file.
+    :param RecombCollector rc: The RecombCollector to record with.
+    :param int chunk_size: The number of (uncompressed) bytes to read at a time.
+    :return RecombCollector: ``rc``.
+    """
+    with gzip.open(path, 'rb') as stream:
+        return read_recombs(stream, rc, chunk_size=chunk_size)
+
+
+class RecombCapture(object):
+    '''
+    A stand-in for a :class:`RecombCollector` during a simulation, that writes
+    the Recombinator output it is given, along with marker lines for the
+    times and simplifications, to a gzipped log, and does nothing else.  The
+    genealogy can then be recorded from the log later, as many times as
+    needed, with :func:`replay_recombs`.
+
+    This has the methods of RecombCollector that are used while simuPOP runs:
+    ``collect_recombs``, ``increment_time``, ``set_time``, ``simplify`` and
+    ``maybe_simplify``; call ``close`` at the end.
+    '''
+
+    def __init__(self, path, compresslevel=1):
+        """
+        :param str path: The file to write the log to.
+        :param int compresslevel: The gzip compression level, from 1 (fastest)
+            to 9 (smallest).
+        """
+        self.path = path
+        self.time = 0.0
+        self.file = gzip.open(path, 'wb', compresslevel=compresslevel)
+
+    def _write_marker(self, kind, values):
+        self.file.write(("#" + kind + " " + " ".join(str(x) for x in values)
+                         + "\n").encode('ascii'))
+
+    def collect_recombs(self, lines):
+        """
+        Write recombinations arriving from simuPOP to the log.
+
+        :param str lines: Recombination data from simuPOP, as a ``str`` or
+            bytes-like object.
+        """
+        if isinstance(lines, str):
+            lines = lines.encode('ascii')
+        self.file.write(lines)
+        if len(lines) > 0 and lines[-1:] != b'\n':
+            self.file.write(b'\n')
+
+    def increment_time(self):
+        self.set_time(self.time + 1.0)
+
+    def set_time(self, time):
+        """
+        Mark the individuals collected from now on as born at ``time``.
+        """
+        self.time = float(time)
+        self._write_marker("T", [repr(self.time)])
+
+    def simplify(self, samples):
+        """
+        Mark that the genealogy should be simplified to the diploid
+        individuals in ``samples`` at this point.
+        """
+        self._write_marker("S", [int(x) for x in samples])
+
+    def maybe_simplify(self, samples):
+        """
+        Mark that the diploid individuals in ``samples`` are alive, so that
+        the genealogy may be simplified to them here if the scheduler of the
+        replaying RecombCollector says so.
+        """
+        self._write_marker("P", [int(x) for x in samples])
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,342 @@
+import concurrent.futures
+import msprime
+import numpy as np
+import time as timer
+
+from .argrecorder import ARGrecorder, copy_tables, sort_tables
+
+_EDGE_COLUMNS = ('left', 'right', 'parent', 'child')
+
+
+def _columns(table, names):
+    """
+    Return a dict of the given columns of ``table``.
+    """
+    return {name: getattr(table, name) for name in names}
+
+
+def _ragged_take(data, offset, rows):
+    """
+    Return the given rows of a ragged column, as the data and offset columns.
+    """
+    start = offset[rows].astype('int64')
+    length = offset[rows + 1].astype('int64') - start
+    new_offset = np.zeros(len(rows) + 1, dtype=offset.dtype)
+    np.cumsum(length, out=new_offset[1:])
+    index = (np.arange(new_offset[-1], dtype='int64')
+             + np.repeat(start - new_offset[:-1].astype('int64'), length))
+    return data[index], new_offset
+
+
+def _ragged_concatenate(columns):
+    """
+    Concatenate the ragged columns given as a list of (data, offset) pairs.
+    """
+    data = np.concatenate([x for x, _ in columns])
+    offset = [np.zeros(1, dtype=columns[0][1].dtype)]
+    base = 0
+    for x, y in columns:
+        offset.append(y[1:] + base)
+        base += len(x)
+    return data, np.concatenate(offset)
+
+
+def _join_edges(left, right, parent, child):
+    """
+    Join up sorted edges with the same parent and child that abut, as they do
+    where an edge was cut at a window boundary.
+    """
+    if len(left) == 0:
+        return left, right, parent, child
+    joined = np.concatenate([[False], np.logical_and.reduce([
+                parent[1:] == parent[:-1], child[1:] == child[:-1],
+                left[1:] == right[:-1]])])
+    starts = np.flatnonzero(np.logical_not(joined))
+    ends = np.concatenate([starts[1:], [len(left)]]) - 1
+    return left[starts], right[ends], parent[starts], child[starts]
+
+
+def _simplify_window(window, left, right, nodes, populations, edges, sites,
+                     mutations, samples):
+    """
+    Add the new edges that fall in ``[left, right)``, clipped to it, to the
+    edges already kept in ``window``, give it the nodes, populations, and the
+    sites in it and their mutations, and sort and simplify it.
+
+    :return array: The node map of the simplify.
+    """
+    num_old = window.edges.num_rows
+    keep = np.flatnonzero(np.logical_and(edges['left'] < right,
+                                         edges['right'] > left))
+    window.edges.append_columns(
+            left=np.maximum(edges['left'][keep], left),
+            right=np.minimum(edges['right'][keep], right),
+            parent=edges['parent'][keep], child=edges['child'][keep])
+    window.nodes.set_columns(**nodes)
+    window.populations.set_columns(**populations)
+    position = sites['position']
+    site_ids = np.flatnonzero(np.logical_and(position >= left,
+                                             position < right))
+    ancestral_state, ancestral_state_offset = _ragged_take(
+            sites['ancestral_state'], sites['ancestral_state_offset'],
+            site_ids)
+    window.sites.set_columns(position=position[site_ids],
+                             ancestral_state=ancestral_state,
+                             ancestral_state_offset=ancestral_state_offset)
+    new_site = np.full(len(position), msprime.NULL_NODE, dtype='int32')
+    new_site[site_ids] = np.arange(len(site_ids), dtype='int32')
+    site = new_site[mutations['site']]
+    mut_ids = np.flatnonzero(site != msprime.NULL_NODE)
+    derived_state, derived_state_offset = _ragged_take(
+            mutations['derived_state'], mutations['derived_state_offset'],
+            mut_ids)
+    window.mutations.set_columns(site=site[mut_ids],
+                                 node=mutations['node'][mut_ids],
+                                 derived_state=derived_state,
+                                 derived_state_offset=derived_state_offset)
+    sort_tables(window, num_old)
+    return np.asarray(window.simplify(samples))
+
+
+def _renumber_window(window, window_map, node_map):
+    """
+    Move the edges and mutations of a simplified window to the shared node
+    numbering.  Both numberings order nodes by time and then by original ID,
+    so the edges stay sorted.
+    """
+    window_nodes = np.flatnonzero(window_map != msprime.NULL_NODE)
+    to_shared = np.empty(len(window_nodes), dtype='int32')
+    to_shared[window_map[window_nodes]] = node_map[window_nodes]
+    edges = window.edges
+    edges.set_columns(left=edges.left, right=edges.right,
+                      parent=to_shared[edges.parent],
+                      child=to_shared[edges.child])
+    mutations = window.mutations
+    mutations.set_columns(site=mutations.site, node=to_shared[mutations.node],
+                          derived_state=mutations.derived_state,
+                          derived_state_offset=mutations.derived_state_offset)
+
+
+class WindowedARGrecorder(ARGrecorder):
+    '''
+    An :class:`ARGrecorder` that splits the genome into ``num_windows``
+    windows of equal length, each with a standing table collection of its own
+    holding the edges that were kept in that window by the last simplify,
+    with all windows sharing the node numbering of the tables.  The tables
+    hold the nodes, sites and mutations, and only the edges recorded since.
+
+    To simplify, each window takes the new edges that fall in it (clipped to
+    the window), the nodes, and its slice of the sites and mutations, and is
+    sorted and simplified; this is done for all windows at once on a pool of
+    threads.  Then the nodes kept in any window are renumbered as one simplify
+    would (``samples[k]`` becomes node ``k``, and the others follow in order
+    of time and then of their old IDs), which keeps each window's edges
+    sorted, and the sites and mutations are gathered back into the tables.
+    The windows are only stitched together (and edges cut at their boundaries
+    joined up) to export a tree sequence, or when the tables themselves are
+    asked for or saved.
+
+    Since msprime does not hold the GIL while sorting and simplifying, these
+    are spread over the cores, while the rest is a few passes over the new
+    edges and the nodes; ``devel/speed_windows.py`` measures the two.  The
+    result is the same as simplifying all at once.
+    '''
+
+    def __init__(self, num_windows, num_threads=None, **kwargs):
+        """
+        :param int num_windows: The number of windows to split the genome into.
+        :param int num_threads: The number of threads to simplify with; by
+            default, one per window.
+        :param kwargs: Passed on to :class:`ARGrecorder`.
+        """
+        if num_windows < 1:
+            raise ValueError("num_windows must be at least 1.")
+        # the tables of each window, or None if all edges are in the tables
+        self._windows = None
+        self._num_window_edges = 0
+        super(WindowedARGrecorder, self).__init__(**kwargs)
+        self.num_windows = num_windows
+        self.breaks = np.linspace(0.0, self.sequence_length, num_windows + 1)
+        if num_threads is None:
+            num_threads = num_windows
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=num_threads)
+
+    @property
+    def tables(self):
+        """
+        The underlying TableCollection, as for :class:`ARGrecorder`, with the
+        edges of the windows put back into it.
+        """
+        self._merge_windows()
+        return super(WindowedARGrecorder, self).tables
+
+    @property
+    def num_edges(self):
+        """
+        The number of edges recorded, including those held by the windows (in
+        which edges crossing a window boundary are cut in pieces) and any not
+        yet flushed.
+        """
+        return (super(WindowedARGrecorder, self).num_edges
+                + self._num_window_edges)
+
+    def __str__(self):
+        self._merge_windows()
+        return super(WindowedARGrecorder, self).__str__()
+
+    def _simplify_tables(self, sample_nodes):
+        if self.timings is not None:
+            start = timer.process_time()
+        tables = self._tables
+        samples = np.asarray(sample_nodes, dtype='int32')
+        if self._windows is None:
+            self._windows = [
+                    msprime.TableCollection(sequence_length=self.sequence_length)
+                    for _ in range(self.num_windows)]
+        nodes = _columns(tables.nodes, ('flags', 'time', 'population'))
+        populations = _columns(tables.populations,
+                               ('metadata', 'metadata_offset'))
+        edges = _columns(tables.edges, _EDGE_COLUMNS)
+        sites = _columns(tables.sites, ('position', 'ancestral_state',
+                                        'ancestral_state_offset'))
+        mutations = _columns(tables.mutations, ('site', 'node', 'derived_state',
+                                                'derived_state_offset'))
+        futures = [self.executor.submit(
+                        _simplify_window, window, self.breaks[w],
+                        self.breaks[w + 1], nodes, populations, edges, sites,
+                        mutations, samples)
+                   for w, window in enumerate(self._windows)]
+        window_maps = [f.result() for f in futures]
+        # the new numbering shared by all windows
+        num_nodes = len(nodes['time'])
+        kept = np.zeros(num_nodes, dtype='bool')
+        for window_map in window_maps:
+            kept[window_map != msprime.NULL_NODE] = True
+        kept[samples] = False
+        node_map = np.full(num_nodes, msprime.NULL_NODE, dtype='int32')
+        node_map[samples] = np.arange(len(samples), dtype='int32')
+        others = np.flatnonzero(kept)
+        others = others[np.argsort(nodes['time'][others], kind='mergesort')]
+        node_map[others] = np.arange(len(samples), len(samples) + len(others),
+                                     dtype='int32')
+        futures = [self.executor.submit(_renumber_window, window, window_map,
+                                        node_map)
+                   for window, window_map in zip(self._windows, window_maps)]
+        for f in futures:
+            f.result()
+        old_nodes = np.concatenate([samples, others])
+        flags = nodes['flags'][old_nodes] & ~np.uint32(msprime.NODE_IS_SAMPLE)
+        flags[:len(samples)] |= np.uint32(msprime.NODE_IS_SAMPLE)
+        tables.nodes.set_columns(flags=flags, time=nodes['time'][old_nodes],
+                                 population=nodes['population'][old_nodes])
+        empty = np.zeros(0)
+        tables.edges.set_columns(left=empty, right=empty,
+                                 parent=empty.astype('int32'),
+                                 child=empty.astype('int32'))
+        # gather the sites and mutations kept, in window order
+        site_base = np.cumsum([0] + [w.sites.num_rows for w in self._windows])
+        ancestral_state, ancestral_state_offset = _ragged_concatenate(
+                [(w.sites.ancestral_state, w.sites.ancestral_state_offset)
+                 for w in self._windows])
+        tables.sites.set_columns(
+                position=np.concatenate([w.sites.position
+                                         for w in self._windows]),
+                ancestral_state=ancestral_state,
+                ancestral_state_offset=ancestral_state_offset)
+        derived_state, derived_state_offset = _ragged_concatenate(
+                [(w.mutations.derived_state, w.mutations.derived_state_offset)
+                 for w in self._windows])
+        tables.mutations.set_columns(
+                site=np.concatenate([w.mutations.site + np.int32(base)
+                                     for w, base in zip(self._windows,
+                                                        site_base)]),
+                node=np.concatenate([w.mutations.node
+                                     for w in self._windows]),
+                derived_state=derived_state,
+                derived_state_offset=derived_state_offset)
+        if self.timings is not None:
+            self.timings.time_simplifying += timer.process_time() - start
+
+    def _finish_simplify(self, num_new_edges):
+        # before the scheduler looks at num_edges
+        self._num_window_edges = sum(w.edges.num_rows for w in self._windows)
+        super(WindowedARGrecorder, self)._finish_simplify(num_new_edges)
+
+    def _add_window_edges(self, tables):
+        """
+        Put the edges of the windows in front of those of ``tables`` (the
+        tables, or a copy of them), unsorted.
+        """
+        edges = tables.edges
+        edges.set_columns(**{k: np.concatenate(
+                                [getattr(w.edges, k) for w in self._windows]
+                                + [getattr(edges, k)])
+                             for k in _EDGE_COLUMNS})
+
+    def _stitch(self, tables):
+        """
+        Put the edges of the windows into ``tables``, sort them, and join up
+        the edges cut at window boundaries.
+        """
+        self._add_window_edges(tables)
+        tables.sort()
+        edges = tables.edges
+        left, right, parent, child = _join_edges(
+                edges.left, edges.right, edges.parent, edges.child)
+        edges.set_columns(left=left, right=right, parent=parent, child=child)
+
+    def _merge_windows(self):
+        """
+        Move the edges of the windows back into the tables, so that these hold
+        all edges (the next simplify splits them up again).
+        """
+        self.flush()
+        if self._windows is None:
+            return
+        self._stitch(self._tables)
+        self._windows = None
+        self._num_window_edges = 0
+        self.num_sorted_edges = self._tables.edges.num_rows
+        # sorting renumbers the sites
+        self.site_index.reset(self._tables.sites.position)
+
+    def _current_tree_sequence(self):
+        if self._windows is None:
+            return super(WindowedARGrecorder, self)._current_tree_sequence()
+        tables = copy_tables(self._tables)
+        self._stitch(tables)
+        return tables.tree_sequence()
+
+    def _simplified_tree_sequence(self, sample_nodes):
+        if self._windows is None:
+            return super(WindowedARGrecorder,
+                         self)._simplified_tree_sequence(sample_nodes)
+        tables = copy_tables(self._tables)
+        self._stitch(tables)
+        tables.simplify(sample_nodes)
+        return tables.tree_sequence()
+
+    def _copy_tables(self):
+        if self._windows is None:
+            return super(WindowedARGrecorder, self)._copy_tables()
+        tables = copy_tables(self._tables)
+        self._add_window_edges(tables)
+        return tables, 0
+
+    def save(self, path, save_extra=None):
+        """
+        Write the state of the recorder to ``path``, as for
+        :class:`ARGrecorder`, after moving the edges of the windows back into
+        the tables.
+        """
+        self._merge_windows()
+        super(WindowedARGrecorder, self).save(path, save_extra=save_extra)
+
+    def close(self):
+        """
+        Wait for any simplification running in the background to finish, and
+        shut down the threads used to simplify.
+        """
+        super(WindowedARGrecorder, self).close()
+        self.executor.shutdown()
@@ -43,3 +43,13 @@ class FtprimeTestCase(unittest.TestCase):
         self.assertEqual(len(x), len(y))
         for k in range(len(x)):
             self.assertEqual(x[k], y[k])
+
+    def assertTablesEqual(self, a, b, nodes=('time', 'population', 'flags'),
+                          edges=('left', 'right', 'parent', 'child'),
+                          sites=(), mutations=()):
+        # check the given columns of each of the tables agree
+        for table, names in (('nodes', nodes), ('edges', edges),
+                             ('sites', sites), ('mutations', mutations)):
+            for name in names:
+                self.assertArrayEqual(getattr(getattr(a, table), name),
+                                      getattr(getattr(b, table), name))
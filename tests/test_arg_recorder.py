@@ -1,6 +1,9 @@
 import ftprime
 import msprime
+import numpy as np
+import os
 import six
+import tempfile
 import unittest
 
 from tests import FtprimeTestCase
@@ -59,6 +62,103 @@ class BasicTestCase(FtprimeTestCase):
         # try adding record with parent who doesn't exist
         self.assertRaises(ValueError, records.add_record, 0.0, 0.5, 8, (0,1))
 
+    def test_add_individuals_records(self):
+        # the array versions should give the same tables as one-at-a-time
+        records_a = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records_a.add_individual(4, 2.0, population=2)
+        records_a.add_individual(5, 2.0, population=2)
+        records_a.add_record(0.0, 0.5, 0, (4,))
+        records_a.add_record(0.0, 0.5, 0, (5,))
+        records_a.add_record(0.5, 1.0, 1, (4,))
+        records_b = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records_b.add_individuals([4, 5], [2.0, 2.0], populations=2)
+        records_b.add_records([0.0, 0.0, 0.5], [0.5, 0.5, 1.0],
+                              [0, 0, 1], [4, 5, 4])
+        for r in (records_a, records_b):
+            r.update_times()
+        self.assertTablesEqual(records_a.tables, records_b.tables)
+        self.assertEqual(records_a.node_ids, records_b.node_ids)
+        self.assertEqual(records_b.max_time, 2.0)
+        self.assertRaises(ValueError, records_b.add_individuals, [6, 1], 3.0)
+        self.assertRaises(ValueError, records_b.add_individuals, [6, 6], 3.0)
+        self.assertRaises(ValueError, records_b.add_records,
+                          [0.0], [1.0], [8], [4])
+
+    def test_mismatched_lengths(self):
+        # a bad call is refused before anything is staged, so the recorder
+        # can still be used
+        records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records.add_individuals([4, 5], 2.0)
+        self.assertRaises(ValueError, records.add_records,
+                          [0.0, 0.0], [1.0], [0, 1], [4, 5])
+        self.assertRaises(ValueError, records.add_records,
+                          [0.0, 0.0], [1.0, 1.0], [0, 1], [4])
+        self.assertRaises(ValueError, records.add_mutations,
+                          [0.25, 0.75], [4, 5], [b'1'], b'0')
+        self.assertRaises(ValueError, records.add_mutations,
+                          [0.25, 0.75], [4, 5], b'1', [b'0', b'0', b'0'])
+        self.assertEqual(records.buffer.num_edges, 0)
+        self.assertEqual(records.buffer.num_sites, 0)
+        records.add_records([0.0, 0.0], [1.0, 1.0], [0, 1], [4, 5])
+        records.add_mutations([0.25, 0.75], [4, 5], b'1', b'0')
+        records.simplify([4, 5])
+        self.assertEqual(records.tables.mutations.num_rows, 2)
+
+    def test_buffer(self):
+        records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records.add_individual(4, 2.0, population=2)
+        records.add_record(0.0, 1.0, 0, (4,))
+        records.add_mutation(0.5, 4, b'1', b'0')
+        # nothing has reached the tables yet
+        self.assertEqual(records.buffer.num_nodes, 1)
+        self.assertEqual(records.buffer.num_edges, 1)
+        self.assertEqual(records.buffer.num_sites, 1)
+        self.assertEqual(records.buffer.num_mutations, 1)
+        # but looking at the tables flushes the buffer
+        tables = records.tables
+        self.assertEqual(records.buffer.num_nodes, 0)
+        self.assertEqual(records.buffer.num_edges, 0)
+        self.assertEqual(tables.nodes.num_rows, self.init_ts.num_nodes + 1)
+        self.assertEqual(tables.edges.num_rows, self.init_ts.num_edges + 1)
+        self.assertEqual(tables.edges.child[-1], records.node_ids[4])
+        self.assertEqual(tables.sites.num_rows, 1)
+        self.assertEqual(tables.mutations.node[0], records.node_ids[4])
+
+    def test_add_mutations(self):
+        # the array version should give the same tables as one-at-a-time
+        positions = [0.5, 0.25, 0.5, 0.75]
+        nodes = [4, 5, 5, 4]
+        derived = [b'1', b'1', b'2', b'1']
+        records_a = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records_b = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        for r in (records_a, records_b):
+            r.add_individuals([4, 5], 2.0)
+            r.add_records([0.0, 0.0], [1.0, 1.0], [0, 1], [4, 5])
+        for x, u, d in zip(positions, nodes, derived):
+            records_a.add_mutation(x, u, d, b'0')
+        records_b.add_mutations(positions[:2], nodes[:2], derived[:2], b'0')
+        records_b.add_mutations(positions[2:], nodes[2:], derived[2:], b'0')
+        self.assertTablesEqual(
+                records_a.tables, records_b.tables, nodes=(), edges=(),
+                sites=('position', 'ancestral_state', 'ancestral_state_offset'),
+                mutations=('site', 'node', 'derived_state',
+                           'derived_state_offset'))
+        self.assertEqual(records_b.tables.sites.num_rows, 3)
+        self.assertRaises(KeyError, records_b.add_mutations, [0.1], [7], b'1', b'0')
+        # after simplifying, sites are looked up in the simplified tables
+        for r in (records_a, records_b):
+            r.simplify([4, 5])
+        records_a.add_mutation(0.75, 4, b'2', b'0')
+        records_b.add_mutations([0.75], [4], b'2', b'0')
+        records_b.add_mutations([0.125], [5], b'1', b'0', infinite_sites=True)
+        for r, k in ((records_a, -1), (records_b, -2)):
+            site = r.tables.mutations.site[k]
+            self.assertEqual(r.tables.sites.position[site], 0.75)
+        self.assertEqual(records_a.tables.sites.num_rows, 3)
+        self.assertEqual(records_b.tables.sites.num_rows, 4)
+        self.assertEqual(records_a.tables.mutations.site[-1],
+                         records_b.tables.mutations.site[-2])
+
     def test_update_times(self):
         records_a = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
         # check doing update_times along the way doesn't change things
@@ -80,6 +180,26 @@ class BasicTestCase(FtprimeTestCase):
         # and check is right answer
         self.assertArrayEqual(records_a.tables.nodes.time, [3, 2.2, 2, 0, 0])
 
+    def test_end_time(self):
+        # with end_time given, node times go in as time-ago directly
+        records_a = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map,
+                                        end_time=3.0)
+        records_b = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        for r in (records_a, records_b):
+            r.add_individual(4, 2.0, population=2)
+            r.add_individual(5, 3.0, population=2)
+            r.add_record(0.0, 0.5, 0, (4, 5))
+            r.add_record(0.5, 1.0, 0, (4,))
+        self.assertArrayEqual(records_a.tables.nodes.time, [4, 3.2, 3, 1, 0])
+        records_b.update_times()
+        self.assertArrayEqual(records_a.tables.nodes.time,
+                              records_b.tables.nodes.time)
+        self.check_trees(records_a.tree_sequence([4, 5]),
+                         records_b.tree_sequence([4, 5]))
+        self.assertRaises(ValueError, records_a.add_individual, 6, 3.5)
+        self.assertRaises(ValueError, ftprime.ARGrecorder, ts=self.init_ts,
+                          node_ids=self.init_map, time=1.0, end_time=0.5)
+
     def test_simplify(self):
         # test that we get the same tree sequence by doing tree_sequence
         # and simplify -> tree_sequence
@@ -98,6 +218,182 @@ class BasicTestCase(FtprimeTestCase):
         print(tsb.dump_tables())
         self.check_trees(tsa, tsb)
 
+    def test_simplify_keeps_time_origin(self):
+        # simplifying doesn't shift the node times already in the table, but
+        # the tree sequence comes out right anyway
+        records_a = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records_b = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        for r in (records_a, records_b):
+            r.add_individuals([4, 5], 2.0, populations=2)
+            r.add_records([0.0, 0.0, 0.5], [0.5, 0.5, 1.0],
+                          [0, 0, 1], [4, 5, 4])
+            r.add_individuals([6, 7], 3.0, populations=2)
+            r.add_records([0.0, 0.5, 0.0], [0.5, 1.0, 1.0],
+                          [4, 5, 5], [6, 6, 7])
+        records_a.simplify([6, 7])
+        self.assertEqual(records_a.last_update_time, 0.0)
+        self.assertEqual(records_a._tables.nodes.time[records_a.node_ids[6]],
+                         -3.0)
+        self.check_trees(records_a.tree_sequence([6, 7]),
+                         records_b.tree_sequence([6, 7]))
+        self.assertEqual(records_a.last_update_time, 3.0)
+        self.assertEqual(records_a.tables.nodes.time[records_a.node_ids[6]],
+                         0.0)
+
+    def test_cached_tree_sequence(self):
+        records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records.add_individuals([4, 5], 2.0, populations=2)
+        records.add_records([0.0, 0.0, 0.5], [0.5, 0.5, 1.0],
+                            [0, 0, 1], [4, 5, 4])
+        tsa = records.tree_sequence([4, 5])
+        self.assertIs(records.tree_sequence([4, 5]), tsa)
+        self.assertIsNot(records.tree_sequence([5, 4]), tsa)
+        self.assertIsNot(records.tree_sequence([4, 5]), tsa)
+        # simplify gives the same tree sequence, and keeps it
+        tsb = records.simplify([4, 5], return_ts=True)
+        self.check_trees(tsa, tsb)
+        self.assertIs(records.tree_sequence([4, 5]), tsb)
+        # until anything else is recorded
+        records.add_individual(6, 3.0)
+        records.add_record(0.0, 1.0, 4, (6,))
+        tsc = records.tree_sequence([4, 5])
+        self.assertIsNot(tsc, tsb)
+        self.check_trees(tsb, tsc)
+        # or the tables are used directly
+        self.assertIs(records.tree_sequence([4, 5]), tsc)
+        records.tables
+        self.assertIsNot(records.tree_sequence([4, 5]), tsc)
+
+    def test_save_load(self):
+        # carrying on from a checkpoint should be the same as not stopping
+        for id_map in ('dict', 'dense'):
+            for end_time in (None, 10.0):
+                path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+                records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map,
+                                              id_map=id_map, end_time=end_time)
+                records.add_individuals([4, 5], 2.0, populations=2)
+                records.add_records([0.0, 0.0, 0.5], [0.5, 0.5, 1.0],
+                                    [0, 0, 1], [4, 5, 4])
+                records.add_mutations([0.25, 0.75], [4, 5], "1", "0")
+                records.simplify([4, 5])
+                records.add_individuals([6, 7], 3.0)
+                records.add_records([0.0, 0.0], [1.0, 1.0], [4, 5], [6, 7])
+                records.save(path)
+                loaded = ftprime.ARGrecorder.load(path)
+                self.assertEqual(loaded.max_time, records.max_time)
+                self.assertEqual(loaded.last_update_node, records.last_update_node)
+                self.assertEqual(loaded.end_time, end_time)
+                self.assertListEqual(sorted(loaded.node_ids.items()),
+                                     sorted(records.node_ids.items()))
+                self.assertTrue(0.25 in loaded.site_index)
+                for r in (records, loaded):
+                    r.add_individual(8, 4.0)
+                    r.add_record(0.0, 1.0, 6, (8,))
+                    r.add_mutations([0.75, 0.5], [8, 8], "2", "0")
+                tsa = records.tree_sequence([7, 8])
+                tsb = loaded.tree_sequence([7, 8])
+                self.check_trees(tsa, tsb)
+                self.check_haplotypes(tsa, tsb)
+                self.assertArrayEqual(tsa.tables.nodes.time, tsb.tables.nodes.time)
+
+    def test_save_interrupted(self):
+        # dying part-way through saving a checkpoint leaves the previous one
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+        records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records.add_individuals([4, 5], 2.0, populations=2)
+        records.add_records([0.0, 0.0, 0.5], [0.5, 0.5, 1.0],
+                            [0, 0, 1], [4, 5, 4])
+        records.save(path)
+        records.add_individuals([6, 7], 3.0)
+        records.add_records([0.0, 0.0], [1.0, 1.0], [4, 5], [6, 7])
+
+        def die(new):
+            raise RuntimeError("killed")
+
+        self.assertRaises(RuntimeError, records.save, path, save_extra=die)
+        loaded = ftprime.ARGrecorder.load(path)
+        self.assertEqual(loaded.max_time, 2.0)
+        self.assertFalse(6 in loaded.node_ids)
+        # or after the previous one has been moved aside
+        os.rename(path, path + '.old')
+        loaded = ftprime.ARGrecorder.load(path)
+        self.assertEqual(loaded.max_time, 2.0)
+        # the next save replaces both
+        records.save(path)
+        self.assertFalse(os.path.exists(path + '.new'))
+        self.assertFalse(os.path.exists(path + '.old'))
+        loaded = ftprime.ARGrecorder.load(path)
+        self.assertEqual(loaded.max_time, 3.0)
+        self.check_trees(loaded.tree_sequence([6, 7]),
+                         records.tree_sequence([6, 7]))
+
+    def test_save_synced(self):
+        # every file of a checkpoint, and its directory and the parent, are
+        # synced before it is renamed into place, and the parent again after
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+        records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map)
+        records.add_individuals([4, 5], 2.0)
+        records.save(path)
+        events = []
+        fsync, rename = os.fsync, os.rename
+
+        def record_fsync(fd):
+            events.append(('fsync', os.fstat(fd).st_ino))
+            fsync(fd)
+
+        def record_rename(src, dst):
+            events.append(('rename', dst))
+            rename(src, dst)
+
+        os.fsync, os.rename = record_fsync, record_rename
+        try:
+            records.save(path)
+        finally:
+            os.fsync, os.rename = fsync, rename
+        swap = events.index(('rename', path))
+        synced = set(x for kind, x in events[:swap] if kind == 'fsync')
+        for name in os.listdir(path) + ['.', '..']:
+            self.assertTrue(os.stat(os.path.join(path, name)).st_ino in synced)
+        parent = os.stat(os.path.dirname(path)).st_ino
+        self.assertTrue(('fsync', parent) in events[swap:])
+
+    def test_dense_id_map(self):
+        # should get the same thing storing node_ids in a dict or an array
+        tss = []
+        for id_map in ('dict', 'dense'):
+            records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map,
+                                          id_map=id_map)
+            records.add_individuals([4, 5], 2.0, populations=2)
+            records.add_records([0.0, 0.0, 0.5], [0.5, 0.5, 1.0],
+                                [0, 0, 1], [4, 5, 4])
+            records.simplify([4, 5])
+            self.assertEqual(records.node_ids[4], 0)
+            self.assertEqual(records.node_ids[5], 1)
+            self.assertFalse(0 in records.node_ids)
+            records.add_individual(6, 3.0)
+            records.add_record(0.0, 1.0, 5, (6,))
+            tss.append(records.tree_sequence([6]))
+        self.check_trees(tss[0], tss[1])
+
+    def test_array_ids(self):
+        for id_map in ('dict', 'dense'):
+            records = ftprime.ARGrecorder(ts=self.init_ts, node_ids=self.init_map,
+                                          id_map=id_map)
+            records.add_individuals(np.array([4, 5]), 2.0)
+            self.assertListEqual(list(records.has_ids([0, 4, 7])),
+                                 [True, True, False])
+            records.check_ids(np.array([4, 5]))
+            self.assertRaises(ValueError, records.check_ids, np.array([4, 7]))
+            nodes = records.get_nodes(np.array([5, 4]))
+            self.assertTrue(isinstance(nodes, np.ndarray))
+            self.assertListEqual(list(nodes),
+                                 [records.node_ids[5], records.node_ids[4]])
+            self.assertRaises(KeyError, records.get_nodes, [4, 7])
+            records.mark_samples(np.array([4, 5]))
+            samples = records.sample_ids()
+            self.assertTrue(isinstance(samples, np.ndarray))
+            self.assertListEqual(sorted(samples), [4, 5])
+
     def test_simplify2(self):
         # test that nonsensical sequence_length gets caught
         self.assertRaises(ValueError, ftprime.ARGrecorder, ts=self.init_ts, 
@@ -1,15 +1,19 @@
 import ftprime
 import msprime
+import numpy as np
+import os
 import six
 import random
 import math
+import tempfile
 
 from tests import FtprimeTestCase
 
 
 class RecombCollectorTest(FtprimeTestCase):
 
-    def simple_ex(self):
+    def simple_ex(self, mode='text', seed=None, collection='immediate',
+                  pairing='arrival'):
         # this will begin with a single diploid indiv
         nodes = six.StringIO("""\
         id      is_sample   population      time
@@ -36,15 +40,19 @@ class RecombCollectorTest(FtprimeTestCase):
         locus_position = [0.0, 1.0, 2.0, 3.0]
         rc = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids, 
                                      locus_position=locus_position,
-                                     benchmark=True)
+                                     benchmark=True, seed=seed,
+                                     collection=collection, pairing=pairing)
         assert rc.mode == 'text'
         rc2 = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids, 
                                      locus_position=locus_position,
-                                     benchmark=True, mode='binary')
+                                     benchmark=True, mode='binary',
+                                     seed=seed)
         assert rc2.mode == 'binary'
+        if mode == 'binary':
+            return rc2, node_ids
         return rc, node_ids
 
-    def bigger_ex(self):
+    def bigger_ex(self, mode='text', seed=None, collection='immediate'):
         """
         Below we have this situation ('indiv' is the diploid ID)
             indiv   chromosome  parent:[left,right) ...
@@ -87,7 +95,8 @@ class RecombCollectorTest(FtprimeTestCase):
         --1-- --2-- --0-- --3--  --0-- --3-- --1-- --2--  --0-- --3-- --1-- --2--  --0-- --3-- --1-- --2--
                                0.5                     1.5
         """
-        rc, node_ids = self.simple_ex()
+        rc, node_ids = self.simple_ex(mode=mode, seed=seed,
+                                      collection=collection)
         self.assertListEqual(rc.locus_position, 
                              [0.0, 1.0, 2.0, 3.0])
         # Input is pairs of
@@ -108,10 +117,180 @@ class RecombCollectorTest(FtprimeTestCase):
         """]
         for lines in lines_list:
             rc.increment_time()
+            if mode == 'binary':
+                lines = lines.encode('ascii')
             rc.collect_recombs(lines)
+        rc.flush()
         rc.args.update_times()
         return rc
 
+    def test_binary_mode(self):
+        # passing bytes in binary mode should give the same tables
+        rc = self.bigger_ex()
+        rc2 = self.bigger_ex(mode='binary')
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables,
+                               edges=('parent', 'child'))
+
+    def test_seed(self):
+        # breakpoints are reproducible given the seed
+        rc = self.bigger_ex(seed=5)
+        rc2 = self.bigger_ex(seed=5)
+        rc3 = self.bigger_ex(seed=6)
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables, nodes=(),
+                               edges=('left', 'right'))
+        self.assertFalse(np.array_equal(rc.args.tables.edges.left,
+                                        rc3.args.tables.edges.left))
+
+    def test_callback_sized_chunks(self):
+        # short chunks, as simuPOP passes, are parsed line by line, and should
+        # give the same tables as one long chunk parsed all at once
+        lines = ["%d 0 %d" % (c, p) + ["", " 1", " 0 2"][(c + p) % 3]
+                 for c in range(1, 61) for p in range(2)]
+        rc, _ = self.simple_ex(seed=5)
+        rc2, _ = self.simple_ex(seed=5)
+        rc.increment_time()
+        rc2.increment_time()
+        block = "\n".join(lines) + "\n"
+        self.assertGreater(len(block), ftprime.recomb_collector._SCALAR_LENGTH)
+        rc.collect_recombs(block)
+        for j in range(0, len(lines), 2):
+            rc2.collect_recombs(lines[j] + "\n" + lines[j + 1] + "\n")
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables)
+        self.assertRaises(ValueError, rc2.collect_recombs, "61 0\n")
+
+    def test_record_parsed(self):
+        # recording an already parsed block is the same as collecting the text
+        lines = "1 0 1\n1 0 0 1\n2 0 0 0 2\n2 0 1\n"
+        rc, _ = self.simple_ex(seed=5)
+        rc2, _ = self.simple_ex(seed=5)
+        for r in (rc, rc2):
+            r.increment_time()
+        rc.collect_recombs(lines)
+        rc2.record_parsed(ftprime.parse_recombs(lines))
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables, nodes=())
+
+    def test_snapshot(self):
+        rc = self.bigger_ex(seed=5)
+        future = rc.snapshot([4, 5])
+        self.check_trees(future.result(), rc.tree_sequence([4, 5]))
+        rc.close()
+
+    def test_save_load(self):
+        # a collector restored from a checkpoint places the same breakpoints
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+        rc = self.bigger_ex(seed=5)
+        rc.save(path)
+        rc2 = ftprime.RecombCollector.load(path)
+        self.assertEqual(rc2.time, rc.time)
+        self.assertListEqual(rc2.locus_position, rc.locus_position)
+        for r in (rc, rc2):
+            r.increment_time()
+            r.collect_recombs("6 4 0 0 1\n6 5 1 2\n")
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables, nodes=())
+        self.check_trees(rc.tree_sequence([5, 6]), rc2.tree_sequence([5, 6]))
+
+    def test_generation_collection(self):
+        # storing chunks until the end of the generation gives the same tables
+        rc = self.bigger_ex(seed=5)
+        rc2 = self.bigger_ex(seed=5, collection='generation')
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables)
+        rc3, _ = self.simple_ex(collection='generation')
+        rc3.increment_time()
+        rc3.collect_recombs("1 0 1\n")
+        rc3.collect_recombs("1 0 0\n")
+        self.assertEqual(rc3.args.num_nodes, 3)
+        rc3.increment_time()
+        self.assertEqual(rc3.args.num_nodes, 5)
+        self.assertRaises(ValueError, self.simple_ex, collection='never')
+
+    def test_threaded_collection(self):
+        # recording on a worker thread gives the same tables
+        rc = self.bigger_ex(seed=5)
+        rc2 = self.bigger_ex(seed=5, collection='threaded')
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables)
+        rc2.close()
+        self.assertFalse(rc2._worker.is_alive())
+        # errors on the worker come out at the next flush
+        rc3, _ = self.simple_ex(collection='threaded')
+        rc3.increment_time()
+        rc3.collect_recombs("1 0 x\n")
+        self.assertRaises(ValueError, rc3.increment_time)
+        rc3.close()
+
+    def test_pairing_by_child(self):
+        # lines for different offspring may be interleaved, even across chunks
+        for collection in ('immediate', 'generation'):
+            rc, _ = self.simple_ex(collection=collection, pairing='child')
+            rc.increment_time()
+            rc.collect_recombs("2 0 1\n1 0 1\n2 0 0\n")
+            rc.collect_recombs("1 0 0 1\n")
+            rc.increment_time()
+            edges = rc.args.tables.edges
+            parents = {}
+            for j in range(edges.num_rows):
+                parents.setdefault(edges.child[j], []).append(edges.parent[j])
+            self.assertListEqual(parents[rc.i2n(1, 0)], [rc.i2n(0, 1)])
+            self.assertListEqual(parents[rc.i2n(1, 1)],
+                                 [rc.i2n(0, 0), rc.i2n(0, 1)])
+            self.assertListEqual(parents[rc.i2n(2, 0)], [rc.i2n(0, 1)])
+            self.assertListEqual(parents[rc.i2n(2, 1)], [rc.i2n(0, 0)])
+            # a missing line is caught at the end of the generation
+            rc.collect_recombs("3 1 1\n")
+            self.assertRaises(ValueError, rc.increment_time)
+        self.assertRaises(ValueError, self.simple_ex, pairing='none')
+
+    def test_collect_matings(self):
+        rc, _ = self.simple_ex(seed=3)
+        rc.increment_time()
+        # no crossovers: each chromosome comes whole from one parental one
+        rc.collect_matings([1, 2], [0, 0], [0, 0], 0.0)
+        self.assertEqual(rc.args.num_nodes, 3 + 4)
+        self.assertEqual(rc.args.num_edges, 2 + 4)
+        rc.increment_time()
+        # crossovers everywhere
+        rc.collect_matings([3], [1], [2], [1.0, 1.0, 1.0])
+        edges = rc.args.tables.edges
+        self.assertEqual(edges.num_rows, 2 + 4 + 8)
+        for p, parent in ((0, 1), (1, 2)):
+            child = rc.i2n(3, p)
+            lefts = [edges.left[j] for j in range(edges.num_rows)
+                     if edges.child[j] == child]
+            parents = [edges.parent[j] for j in range(edges.num_rows)
+                       if edges.child[j] == child]
+            self.assertEqual([math.floor(x) for x in lefts], [0, 0, 1, 2])
+            self.assertEqual(parents[0], parents[2])
+            self.assertEqual(parents[1], parents[3])
+            self.assertEqual(sorted(parents[:2]),
+                             sorted([rc.i2n(parent, 0), rc.i2n(parent, 1)]))
+
+    def test_add_diploids(self):
+        # one at a time and all at once should give the same tables
+        rc, _ = self.simple_ex()
+        rc2, _ = self.simple_ex()
+        for r in (rc, rc2):
+            r.increment_time()
+        rc.add_diploid(1, 0, 0, mother_ploidy=1)
+        rc.add_diploid(2, 0, 0, [0.5], [1.5, 2.5], father_ploidy=1)
+        rc2.add_diploids([1, 2], [0, 0], [0, 0], [[], [0.5]], [[], [1.5, 2.5]],
+                         father_ploidy=[0, 1], mother_ploidy=[1, 0])
+        for r in (rc, rc2):
+            r.args.update_times()
+        self.assertTablesEqual(rc.args.tables, rc2.args.tables)
+        edges = rc.args.tables.edges
+        self.assertArrayEqual(edges.left[2:], [0.0, 0.0, 0.0, 0.5, 0.0, 1.5, 2.5])
+        self.assertArrayEqual(edges.right[2:], [3.0, 3.0, 0.5, 3.0, 1.5, 2.5, 3.0])
+        self.assertArrayEqual(edges.parent[2:],
+                              [rc.i2n(0, 0), rc.i2n(0, 1), rc.i2n(0, 1),
+                               rc.i2n(0, 0), rc.i2n(0, 0), rc.i2n(0, 1),
+                               rc.i2n(0, 0)])
+        self.assertArrayEqual(edges.child[2:],
+                              [rc.i2n(1, 0), rc.i2n(1, 1), rc.i2n(2, 0),
+                               rc.i2n(2, 0), rc.i2n(2, 1), rc.i2n(2, 1),
+                               rc.i2n(2, 1)])
+        self.assertRaises(ValueError, rc.add_diploid, 3, 0, 0, [2.0, 1.0])
+        self.assertRaises(ValueError, rc.add_diploid, 3, 0, 0, [3.0])
+        self.assertRaises(ValueError, rc.add_diploid, 3, 0, 0, father_ploidy=2)
+
     def check_node_ids(self, rc, haploid_node_ids):
         rc, node_ids = self.simple_ex()
         for h in haploid_node_ids:
@@ -248,6 +427,68 @@ class RecombCollectorTest(FtprimeTestCase):
         print(obs_locations)
         self.assertArrayEqual(true_locations, obs_locations)
 
+    def test_add_locations_staged(self):
+        # locations can be set while the nodes are still in the buffer, or
+        # after they have been flushed, and new populations are added
+        rc = self.bigger_ex()
+        rc.increment_time()
+        rc.add_diploids([6], [4], [5])
+        self.assertEqual(rc.args.buffer.num_nodes, 2)
+        rc.add_locations([6, 1], [7, 3])
+        self.assertEqual(rc.args.buffer.num_nodes, 2)
+        nodes = rc.args.tables.nodes
+        for k, loc in ((6, 7), (1, 3)):
+            for p in (0, 1):
+                self.assertEqual(nodes.population[rc.i2n(k, p)], loc)
+        self.assertEqual(rc.args.tables.populations.num_rows, 8)
+        # and at birth
+        rc.increment_time()
+        rc.add_diploids([7, 8], [4, 4], [5, 5], populations=[1, 2])
+        rc.collect_matings([9], [4], [5], 0.0, populations=4)
+        nodes = rc.args.tables.nodes
+        for k, loc in ((7, 1), (8, 2), (9, 4)):
+            for p in (0, 1):
+                self.assertEqual(nodes.population[rc.i2n(k, p)], loc)
+
+    def test_collect_recombs_populations(self):
+        # populations can be recorded at birth, with the recombinations: one
+        # for the chunk, one per line, or from a function of the parents
+        def by_parent(child, parent):
+            return 3 + parent
+
+        for collection in ('immediate', 'generation', 'threaded'):
+            rc = self.bigger_ex(collection=collection)
+            rc.increment_time()
+            rc.collect_recombs("6 4 0\n6 5 1\n", populations=2)
+            rc.collect_recombs("7 4 0\n7 5 1 1\n", populations=[1, 1])
+            rc.collect_recombs("8 4 1\n8 4 0\n9 5 0\n9 4 0\n",
+                               populations=by_parent)
+            rc.flush()
+            nodes = rc.args.tables.nodes
+            for k, locs in ((6, (2, 2)), (7, (1, 1)), (8, (7, 7)),
+                            (9, (8, 7))):
+                for p in (0, 1):
+                    self.assertEqual(nodes.population[rc.i2n(k, p)], locs[p])
+            rc.close()
+        rc, _ = self.simple_ex()
+        rc.increment_time()
+        self.assertRaises(ValueError, rc.collect_recombs, "1 0 0\n1 0 1\n",
+                          populations=[1, 2, 3])
+        # with pairing by child, a line waiting for its pair keeps its
+        # population, even through a checkpoint
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+        rc, _ = self.simple_ex(pairing='child')
+        rc.increment_time()
+        rc.collect_recombs("2 0 1\n1 0 1\n2 0 0\n", populations=[5, 6, 5])
+        rc.save(path)
+        rc2 = ftprime.RecombCollector.load(path)
+        for r in (rc, rc2):
+            r.collect_recombs("1 0 0 1\n", populations=[4])
+            nodes = r.args.tables.nodes
+            self.assertEqual(nodes.population[r.i2n(1, 0)], 6)
+            self.assertEqual(nodes.population[r.i2n(1, 1)], 4)
+            self.assertEqual(nodes.population[r.i2n(2, 0)], 5)
+
     def test_simple_simplify(self):
         rc, node_ids = self.simple_ex()
         rc.simplify([0])
@@ -0,0 +1,43 @@
+import msprime
+import numpy as np
+
+from ftprime.idmap import DenseIDMap
+from tests import FtprimeTestCase
+
+
+class DenseIDMapTestCase(FtprimeTestCase):
+
+    def test_dict_methods(self):
+        ids = DenseIDMap({10: 0, 12: 1})
+        self.assertEqual(len(ids), 2)
+        self.assertTrue(10 in ids)
+        self.assertFalse(11 in ids)
+        self.assertFalse(3 in ids)
+        self.assertFalse(1000 in ids)
+        self.assertEqual(ids[12], 1)
+        self.assertRaises(KeyError, ids.__getitem__, 11)
+        ids[20] = 2
+        ids[5] = 3
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(dict(ids.items()), {5: 3, 10: 0, 12: 1, 20: 2})
+        self.assertArrayEqual(list(ids), [5, 10, 12, 20])
+
+    def test_array_methods(self):
+        ids = DenseIDMap()
+        ids.set_many([4, 5, 6, 8], [0, 1, 2, 3])
+        self.assertEqual(len(ids), 4)
+        self.assertArrayEqual(ids.contains([3, 4, 7, 8, 100]),
+                              [False, True, False, True, False])
+        self.assertArrayEqual(ids.lookup([8, 4, 7, 100]),
+                              [3, 0, msprime.NULL_NODE, msprime.NULL_NODE])
+        ids.set_many(np.arange(9, 1000), np.arange(4, 995))
+        self.assertEqual(len(ids), 995)
+        self.assertEqual(ids[999], 994)
+
+    def test_reset(self):
+        ids = DenseIDMap({k: k for k in range(10)})
+        ids.reset([8, 3, 9])
+        self.assertEqual(len(ids), 3)
+        self.assertEqual(ids.base, 3)
+        self.assertEqual(dict(ids.items()), {8: 0, 3: 1, 9: 2})
+        self.assertFalse(0 in ids)
@@ -0,0 +1,113 @@
+import ftprime
+import os
+import tempfile
+
+from ftprime import journal as jnl
+from ftprime.journal import Journal
+from tests import FtprimeTestCase
+from .wf import wf
+
+
+class JournalTestCase(FtprimeTestCase):
+
+    def record(self, records, parents, t0, t1):
+        # a few generations of a haploid Wright-Fisher population, with
+        # mutations, recorded with the array methods and the single ones
+        N = len(parents)
+        for t in range(t0, t1):
+            children = [1000 * t + k for k in range(N)]
+            records.add_individuals(children[1:], float(t), populations=1)
+            records.add_individual(children[0], float(t))
+            records.add_records([0.0] * N, [0.5] * N, parents, children)
+            for k in range(N):
+                records.add_record(0.5, 1.0, parents[(k + 1) % N],
+                                   (children[k],))
+            records.add_mutations([t / 100.0, t / 100.0 + 0.5],
+                                  children[:2], "1", "0")
+            records.add_mutation(t / 100.0 + 0.001, children[2], "1", "0")
+            records.set_populations(children[:2], 2)
+            if t % 3 == 0:
+                records.simplify(children)
+            parents = children
+        return parents
+
+    def test_recover(self):
+        N = 5
+        tmpdir = tempfile.mkdtemp()
+        checkpoint = os.path.join(tmpdir, "checkpoint")
+        journal = Journal(os.path.join(tmpdir, "journal"), write_size=100,
+                          segment_size=1000, fsync_interval=0.0)
+        records = wf(N=N, ngens=4, nsamples=N, seed=self.random_seed)
+        records.journal = journal
+        parents = self.record(records, list(records.sample_ids()), 10, 12)
+        records.save(checkpoint)
+        self.assertEqual(len(journal.segments()), 0)
+        samples = self.record(records, parents, 12, 20)
+        journal.flush()
+        self.assertTrue(len(journal.segments()) > 1)
+        # a partly written record at the end is ignored
+        with open(os.path.join(journal.path, journal.segments()[-1]), 'ab') as f:
+            f.write(b'\x01\x00\x01')
+        recovered = ftprime.ARGrecorder.recover(
+                checkpoint, Journal(journal.path))
+        self.assertEqual(recovered.num_simplifies, records.num_simplifies)
+        tsa = records.tree_sequence(samples)
+        tsb = recovered.tree_sequence(samples)
+        self.check_trees(tsa, tsb)
+        self.check_haplotypes(tsa, tsb)
+        self.assertArrayEqual(tsa.tables.nodes.population,
+                              tsb.tables.nodes.population)
+        # the recovered recorder carries on journaling
+        self.record(recovered, samples, 20, 21)
+        recovered.close()
+        self.assertTrue(len(recovered.journal.segments()) > 0)
+
+    def test_recover_before_removal(self):
+        # if the process dies after the checkpoint is saved but before the
+        # journal segments it includes are removed, they aren't replayed
+        N = 5
+        tmpdir = tempfile.mkdtemp()
+        checkpoint = os.path.join(tmpdir, "checkpoint")
+        journal = Journal(os.path.join(tmpdir, "journal"), write_size=100,
+                          segment_size=1000, fsync_interval=0.0)
+        records = wf(N=N, ngens=4, nsamples=N, seed=self.random_seed)
+        records.journal = journal
+        parents = self.record(records, list(records.sample_ids()), 10, 12)
+
+        def die(segment):
+            raise RuntimeError("killed")
+
+        journal.remove_before = die
+        self.assertRaises(RuntimeError, records.save, checkpoint)
+        num_saved = len(journal.segments())
+        self.assertTrue(num_saved > 0)
+        samples = self.record(records, parents, 12, 15)
+        journal.flush()
+        self.assertTrue(len(journal.segments()) > num_saved)
+        recovered = ftprime.ARGrecorder.recover(
+                checkpoint, Journal(journal.path))
+        self.assertEqual(recovered.num_simplifies, records.num_simplifies)
+        tsa = records.tree_sequence(samples)
+        tsb = recovered.tree_sequence(samples)
+        self.check_trees(tsa, tsb)
+        self.check_haplotypes(tsa, tsb)
+        # the next save removes the old segments
+        recovered.save(checkpoint)
+        self.assertEqual(len(recovered.journal.segments()), 0)
+
+    def test_staged_rows(self):
+        # rows recorded one at a time are encoded as one record per kind
+        tmpdir = tempfile.mkdtemp()
+        journal = Journal(os.path.join(tmpdir, "journal"))
+        records = wf(N=3, ngens=2, nsamples=3, seed=self.random_seed)
+        records.journal = journal
+        parents = list(records.sample_ids())
+        for k in range(3):
+            records.add_individual(100 + k, 3.0)
+            records.add_record(0.0, 1.0, parents[k], (100 + k,))
+            records.add_mutation(0.5 + k / 10.0, 100 + k, "1", "0")
+        records.simplify([100, 101, 102])
+        journal.flush()
+        kinds = [(kind, len(columns[0])) for kind, columns in journal.records()]
+        self.assertEqual(kinds, [(jnl.NODES, 3), (jnl.EDGES, 3),
+                                 (jnl.MUTATIONS, 3), (jnl.SIMPLIFY, 3)])
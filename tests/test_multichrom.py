@@ -0,0 +1,82 @@
+import ftprime
+import msprime
+import six
+
+from tests import FtprimeTestCase
+
+
+class MultiChromTestCase(FtprimeTestCase):
+
+    def init_ts(self, length):
+        nodes = six.StringIO("""\
+        id      is_sample   population      time
+        0       0           -1              1.00000000000000
+        1       1           -1              0.00000000000000
+        2       1           -1              0.00000000000000
+        """)
+        edges = six.StringIO("""\
+        id      left            right           parent  child
+        0       0.00000000      {0}      0       1
+        1       0.00000000      {0}      0       2
+        """.format(length))
+        return msprime.load_text(nodes=nodes, edges=edges, strict=False)
+
+    def example(self):
+        # chromosome 0 has global loci 0-3 and chromosome 1 has loci 4-6
+        locus_position = [[0.0, 1.0, 2.0, 3.0], [0.0, 1.0, 2.0]]
+        mc = ftprime.MultiChromRecombCollector(
+                ts=[self.init_ts(3.0), self.init_ts(2.0)],
+                node_ids={(0, 0): 1, (0, 1): 2},
+                locus_position=locus_position, seed=3)
+        mc.increment_time()
+        # 1: paternal switches between the chromosomes, maternal within each
+        # 2: paternal switches within chromosome 0, maternal within 1
+        mc.collect_recombs("1 0 1 3\n1 0 0 0 5\n2 0 0 1\n2 0 1 4\n")
+        return mc
+
+    def parents(self, rc, k, p):
+        edges = rc.args.tables.edges
+        child = rc.i2n(k, p)
+        return [(edges.left[j], edges.parent[j]) for j in range(edges.num_rows)
+                if edges.child[j] == child]
+
+    def test_split(self):
+        mc = self.example()
+        self.assertEqual(mc.num_chromosomes, 2)
+        rc0, rc1 = mc.chromosomes
+        self.assertEqual(rc0.args.tables.nodes.num_rows, 3 + 4)
+        self.assertEqual(rc1.args.tables.nodes.num_rows, 3 + 4)
+        self.assertListEqual([u for _, u in self.parents(rc0, 1, 0)],
+                             [rc0.i2n(0, 1)])
+        self.assertListEqual([u for _, u in self.parents(rc1, 1, 0)],
+                             [rc1.i2n(0, 0)])
+        self.assertListEqual([u for _, u in self.parents(rc0, 1, 1)],
+                             [rc0.i2n(0, 0), rc0.i2n(0, 1)])
+        self.assertListEqual([u for _, u in self.parents(rc1, 1, 1)],
+                             [rc1.i2n(0, 1), rc1.i2n(0, 0)])
+        self.assertListEqual([u for _, u in self.parents(rc0, 2, 0)],
+                             [rc0.i2n(0, 0), rc0.i2n(0, 1)])
+        lefts = [x for x, _ in self.parents(rc0, 2, 0)]
+        self.assertTrue(1.0 <= lefts[1] <= 2.0)
+        self.assertListEqual([u for _, u in self.parents(rc1, 2, 1)],
+                             [rc1.i2n(0, 1), rc1.i2n(0, 0)])
+        lefts = [x for x, _ in self.parents(rc1, 2, 1)]
+        self.assertTrue(0.0 <= lefts[1] <= 1.0)
+
+    def test_simplify(self):
+        mc = self.example()
+        mc.simplify([1, 2])
+        ts_list = mc.tree_sequence([1, 2])
+        self.assertEqual(len(ts_list), 2)
+        for ts, length in zip(ts_list, (3.0, 2.0)):
+            self.assertEqual(ts.sequence_length, length)
+            self.assertEqual(ts.num_samples, 4)
+        mc.close()
+
+    def test_scheduler(self):
+        # one scheduler can't be shared by the recorders of every chromosome
+        self.assertRaises(ValueError, ftprime.MultiChromRecombCollector,
+                          ts=[self.init_ts(3.0), self.init_ts(2.0)],
+                          node_ids={(0, 0): 1, (0, 1): 2},
+                          locus_position=[[0.0, 3.0], [0.0, 2.0]],
+                          scheduler=ftprime.SimplifyScheduler())
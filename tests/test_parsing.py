@@ -0,0 +1,54 @@
+import numpy as np
+
+from ftprime.parsing import parse_recombs
+from tests import FtprimeTestCase
+
+
+class ParseRecombsTestCase(FtprimeTestCase):
+
+    lines = """
+        4   2   0   0 1
+        4   1   1
+
+        15  1   1   0
+        15  2   0   0 1 12
+        """
+
+    def check_parsed(self, parsed):
+        self.assertArrayEqual(parsed.child, [4, 4, 15, 15])
+        self.assertArrayEqual(parsed.parent, [2, 1, 1, 2])
+        self.assertArrayEqual(parsed.ploidy, [0, 1, 1, 0])
+        self.assertArrayEqual(parsed.rec_offset, [0, 2, 2, 3, 6])
+        self.assertArrayEqual(parsed.rec, [0, 1, 0, 0, 1, 12])
+
+    def test_text(self):
+        self.check_parsed(parse_recombs(self.lines))
+
+    def test_binary(self):
+        data = self.lines.encode('ascii')
+        self.check_parsed(parse_recombs(data))
+        self.check_parsed(parse_recombs(bytearray(data)))
+        self.check_parsed(parse_recombs(memoryview(data)))
+
+    def test_agrees_with_split(self):
+        lines = "\n".join(" ".join(str(x) for x in
+                                   np.random.randint(0, 10**8, size=3 + k % 4))
+                          for k in range(100))
+        parsed = parse_recombs(lines)
+        for k, line in enumerate(lines.split("\n")):
+            linex = [int(x) for x in line.split()]
+            self.assertEqual(parsed.child[k], linex[0])
+            self.assertEqual(parsed.parent[k], linex[1])
+            self.assertEqual(parsed.ploidy[k], linex[2])
+            self.assertArrayEqual(
+                    parsed.rec[parsed.rec_offset[k]:parsed.rec_offset[k+1]],
+                    linex[3:])
+
+    def test_empty(self):
+        parsed = parse_recombs("  \n")
+        self.assertEqual(len(parsed.child), 0)
+        self.assertArrayEqual(parsed.rec_offset, [0])
+
+    def test_errors(self):
+        self.assertRaises(ValueError, parse_recombs, "4 2 0\n4 1\n")
+        self.assertRaises(ValueError, parse_recombs, "4 2 -1\n")
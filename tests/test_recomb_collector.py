@@ -5,6 +5,7 @@ import random
 
 import ftprime
 import msprime
+import numpy as np
 
 
 # increases reproducibility by
@@ -74,7 +75,7 @@ def make_pop(request):
                                 for p in (0,1)]
         node_ids = {x:j for x, j in zip(haploid_labels, init_ts.samples())}
         rc = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids,
-                                     locus_position=locus_position)
+                                     locus_position=locus_position, seed=123)
         recombinator = sim.Recombinator(intensity=recomb_rate,
                                         output=rc.collect_recombs,
                                         infoFields="ind_id")
@@ -203,3 +204,128 @@ def test_recombination(make_pop, generations, popsize, locus_position):
     print(z)
     assert(all([abs(zz) < 3.5 for zz in z]))
 
+
+
+@pytest.mark.parametrize(('generations', 'popsize'), [
+    (3, 10),
+    (10, 20),
+])
+def test_pedigree_only_operator(generations, popsize):
+    from ftprime.operators import pedigree_only_operator
+    nsamples = 2
+    locus_position = [0.0, 0.5, 1.0]
+    # a pedigree-only run: simuPOP carries a single dummy locus
+    pop = sim.Population(
+            size=[popsize],
+            loci=[1],
+            infoFields=['ind_id', 'father_id', 'mother_id'])
+    id_tagger = sim.IdTagger(begin=0)
+    id_tagger.reset(startID=1)
+    id_tagger.apply(pop)
+    first_gen = pop.indInfo("ind_id")
+    init_ts = msprime.simulate(2 * popsize, length=max(locus_position))
+    haploid_labels = [(k,p) for k in first_gen for p in (0,1)]
+    node_ids = {x:j for x, j in zip(haploid_labels, init_ts.samples())}
+    rc = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids,
+                                 locus_position=locus_position, seed=123)
+    pop.evolve(
+        initOps=[sim.InitSex()],
+        preOps=[sim.PyOperator(lambda pop: rc.increment_time() or True)],
+        matingScheme=sim.RandomMating(
+            ops=[id_tagger, sim.PedigreeTagger(),
+                 sim.MendelianGenoTransmitter()]),
+        postOps=[pedigree_only_operator(rc, intensity=1.0)],
+        gen=generations
+    )
+    check_tables(rc.args)
+    diploid_samples = random.sample(pop.indInfo("ind_id"), nsamples)
+    rc.simplify(diploid_samples)
+    ts = rc.args.tree_sequence()
+    assert ts.sample_size == 2 * nsamples
+
+
+def test_birth_location_operator():
+    import functools
+    from ftprime.operators import birth_location_operator, subpop_index
+    popsize = 10
+    generations = 5
+    locus_position = [0.0, 0.5, 1.0]
+    pop = sim.Population(
+            size=[popsize, popsize],
+            loci=[len(locus_position)],
+            lociPos=locus_position,
+            infoFields=['ind_id', 'migrate_to'])
+    id_tagger = sim.IdTagger(begin=0)
+    id_tagger.reset(startID=1)
+    id_tagger.apply(pop)
+    first_gen = pop.indInfo("ind_id")
+    init_ts = msprime.simulate(4 * popsize, length=max(locus_position))
+    haploid_labels = [(k,p) for k in first_gen for p in (0,1)]
+    node_ids = {x:j for x, j in zip(haploid_labels, init_ts.samples())}
+    rc = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids,
+                                 locus_position=locus_position, seed=123)
+    locate, populations = birth_location_operator()
+    pop.evolve(
+        initOps=[sim.InitSex()],
+        preOps=[sim.PyOperator(lambda pop: rc.increment_time() or True),
+                sim.Migrator(rate=[[0.8, 0.2], [0.2, 0.8]]),
+                locate],
+        matingScheme=sim.RandomMating(
+            ops=[id_tagger,
+                 sim.Recombinator(intensity=1.0,
+                                  output=functools.partial(
+                                      rc.collect_recombs,
+                                      populations=populations),
+                                  infoFields="ind_id")]),
+        gen=generations
+    )
+    check_tables(rc.args)
+    ids = rc.haploid_ids(pop.indInfo("ind_id"))
+    nodes = [rc.args.node_ids[x] for x in ids]
+    recorded = rc.args.tables.nodes.population[nodes]
+    assert list(recorded) == list(np.repeat(subpop_index(pop), 2))
+
+
+def test_stream_markers(tmpdir):
+    from ftprime.operators import (time_marker_operator,
+                                   population_marker_operator)
+    popsize = 10
+    generations = 10
+    locus_position = [0.0, 0.5, 1.0]
+    path = str(tmpdir.join("recombs"))
+    pop = sim.Population(
+            size=[popsize],
+            loci=[len(locus_position)],
+            lociPos=locus_position,
+            infoFields=['ind_id'])
+    id_tagger = sim.IdTagger(begin=0)
+    id_tagger.reset(startID=1)
+    id_tagger.apply(pop)
+    first_gen = pop.indInfo("ind_id")
+    init_ts = msprime.simulate(2 * popsize, length=max(locus_position))
+    haploid_labels = [(k,p) for k in first_gen for p in (0,1)]
+    node_ids = {x:j for x, j in zip(haploid_labels, init_ts.samples())}
+    pop.evolve(
+        initOps=[sim.InitSex()],
+        preOps=[time_marker_operator('>>' + path)],
+        matingScheme=sim.RandomMating(
+            ops=[id_tagger, sim.Recombinator(intensity=1.0,
+                                             output='>>' + path,
+                                             infoFields="ind_id")]),
+        postOps=[population_marker_operator('>>' + path),
+                 population_marker_operator('>>' + path, simplify=True,
+                                            at=-1)],
+        gen=generations
+    )
+    scheduler = ftprime.SimplifyScheduler(ratio=0.0, min_ratio=0.0,
+                                          min_edges=0)
+    rc = ftprime.RecombCollector(ts=init_ts, node_ids=node_ids,
+                                 locus_position=locus_position, seed=123,
+                                 mode='binary', scheduler=scheduler)
+    with open(path, 'rb') as stream:
+        ftprime.read_recombs(stream, rc)
+    # simplified at every generation, and once more at the end
+    assert rc.args.num_simplifies == generations + 1
+    check_tables(rc.args)
+    ts = rc.args.tree_sequence()
+    assert ts.num_samples == 2 * popsize
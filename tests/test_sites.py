@@ -0,0 +1,38 @@
+import msprime
+import numpy as np
+
+from ftprime.sites import SiteIndex
+from tests import FtprimeTestCase
+
+
+class SiteIndexTestCase(FtprimeTestCase):
+
+    def test_lookup(self):
+        index = SiteIndex([0.5, 0.1, 0.3])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.get(0.1), 1)
+        self.assertEqual(index.get(0.2), msprime.NULL_NODE)
+        self.assertTrue(0.3 in index)
+        self.assertFalse(0.9 in index)
+        self.assertArrayEqual(index.lookup([0.3, 0.9, 0.5, 0.0]),
+                              [2, msprime.NULL_NODE, 0, msprime.NULL_NODE])
+
+    def test_add(self):
+        index = SiteIndex()
+        self.assertArrayEqual(index.lookup([0.5]), [msprime.NULL_NODE])
+        index.add(0.5, 0)
+        index.add_many([0.25, 0.75], [1, 2])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.get(0.75), 2)
+        index.add(0.125, 3)
+        self.assertEqual(index.get(0.125), 3)
+        # the dict for scalar lookups follows batched additions
+        index.add_many([0.375], [4])
+        self.assertEqual(index.get(0.375), 4)
+        self.assertArrayEqual(index.lookup([0.375]), [4])
+        self.assertArrayEqual(index.lookup([0.125, 0.25, 0.5, 0.75, 1.0]),
+                              [3, 1, 0, 2, msprime.NULL_NODE])
+        index.reset([0.75])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.get(0.75), 0)
+        self.assertFalse(0.5 in index)
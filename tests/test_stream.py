@@ -0,0 +1,108 @@
+import ftprime
+import io
+import msprime
+import os
+import six
+import tempfile
+import threading
+
+from tests import FtprimeTestCase
+
+
+class StreamTestCase(FtprimeTestCase):
+
+    nodes = """\
+    id      is_sample   population      time
+    0       0           0               1.00000000000000
+    1       1           1               0.00000000000000
+    2       1           2               0.00000000000000
+    """
+    edges = """\
+    id      left            right           parent  child
+    0       0.00000000      3.00000000      0       1
+    1       0.00000000      3.00000000      0       2
+    """
+    lines_list = ["""
+        1   0   1
+        1   0   0
+        2   0   1   0
+        2   0   0   1
+        """, """
+        3   2   0   0 1
+        3   1   1   0
+        4   1   1   0
+        4   2   0   0 1 2
+        """]
+    stream = ("#T 1\n" + lines_list[0].strip() + "\n#T 2\n" +
+              lines_list[1].strip() + "\n#S 3 4\n").encode('ascii')
+
+    def rc_kwargs(self):
+        init_ts = msprime.load_text(nodes=six.StringIO(self.nodes),
+                                    edges=six.StringIO(self.edges),
+                                    strict=False)
+        return dict(ts=init_ts, node_ids={(0, 0): 1, (0, 1): 2},
+                    locus_position=[0.0, 1.0, 2.0, 3.0], seed=7)
+
+    def callback_ts(self):
+        rc = ftprime.RecombCollector(**self.rc_kwargs())
+        for lines in self.lines_list:
+            rc.increment_time()
+            rc.collect_recombs(lines)
+        rc.simplify([3, 4])
+        return rc.args.tree_sequence()
+
+    def test_read_recombs(self):
+        for chunk_size in (7, 2**20):
+            rc = ftprime.RecombCollector(mode='binary', **self.rc_kwargs())
+            ftprime.read_recombs(io.BytesIO(self.stream), rc,
+                                 chunk_size=chunk_size)
+            self.assertEqual(rc.time, 2.0)
+            self.assertEqual(rc.args.num_simplifies, 1)
+            self.check_trees(rc.args.tree_sequence(), self.callback_ts())
+        rc = ftprime.RecombCollector(**self.rc_kwargs())
+        self.assertRaises(ValueError, ftprime.read_recombs,
+                          io.BytesIO(self.stream), rc)
+        rc = ftprime.RecombCollector(mode='binary', **self.rc_kwargs())
+        self.assertRaises(ValueError, ftprime.read_recombs,
+                          io.BytesIO(b"#X 1\n"), rc)
+
+    def test_fifo(self):
+        tmpdir = tempfile.mkdtemp()
+        path = os.path.join(tmpdir, "recombs")
+        output = os.path.join(tmpdir, "out.trees")
+        os.mkfifo(path)
+        sc = ftprime.StreamCollector(path, output, chunk_size=16,
+                                     **self.rc_kwargs())
+        sc.start()
+
+        def write():
+            with open(path, 'wb') as f:
+                f.write(self.stream)
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        ts = sc.join()
+        writer.join()
+        self.check_trees(ts, self.callback_ts())
+
+    def test_capture_replay(self):
+        path = os.path.join(tempfile.mkdtemp(), "recombs.log.gz")
+        capture = ftprime.RecombCapture(path)
+        for lines in self.lines_list:
+            capture.increment_time()
+            capture.maybe_simplify([0] if capture.time == 1.0 else [1, 2])
+            capture.collect_recombs(lines)
+        capture.simplify([3, 4])
+        capture.close()
+        rc = ftprime.RecombCollector(mode='binary', **self.rc_kwargs())
+        ftprime.replay_recombs(path, rc)
+        self.assertEqual(rc.args.num_simplifies, 1)
+        self.check_trees(rc.args.tree_sequence(), self.callback_ts())
+        # with a scheduler, simplify at the population markers too
+        scheduler = ftprime.SimplifyScheduler(ratio=0.0, min_ratio=0.0,
+                                              min_edges=0)
+        rc = ftprime.RecombCollector(mode='binary', scheduler=scheduler,
+                                     **self.rc_kwargs())
+        ftprime.replay_recombs(path, rc)
+        self.assertEqual(rc.args.num_simplifies, 3)
+        self.check_trees(rc.args.tree_sequence(), self.callback_ts())
@@ -1,6 +1,8 @@
 import ftprime
 import msprime
 import numpy as np
+import os
+import tempfile
 import unittest
 
 from tests import *
@@ -11,10 +13,14 @@ from .wf import wf
 class WfTestCase(FtprimeTestCase):
 
     def run_wf(self, N, ngens, nsamples, survival=0.0, simplify_interval=10,
-               mutation_rate=0.0):
+               mutation_rate=0.0, scheduler=None, background=False,
+               num_windows=1, batch_mutations=True):
         records = wf(N=N, ngens=ngens, nsamples=nsamples, survival=survival,
                      debug=False, simplify_interval=simplify_interval,
-                     seed=self.random_seed, mutation_rate=mutation_rate)
+                     seed=self.random_seed, mutation_rate=mutation_rate,
+                     scheduler=scheduler, background=background,
+                     num_windows=num_windows,
+                     batch_mutations=batch_mutations)
         return records
 
     def check_tables(self, records):
@@ -61,6 +67,150 @@ class WfTestCase(FtprimeTestCase):
             self.check_haplotypes(records_a.tree_sequence(sample_ids),
                                   records_c.tree_sequence(sample_ids))
 
+    def test_scalar_mutations(self):
+        # recording mutations one at a time should give the same trees and
+        # haplotypes as recording a generation's at once
+        N = 5
+        ngens = 20
+        records_a = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=3,
+                                mutation_rate=1.0)
+        records_b = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=3,
+                                mutation_rate=1.0, batch_mutations=False)
+        self.assertTrue(records_b.tables.mutations.num_rows > 0)
+        sample_ids = [N*ngens + x for x in range(N)]
+        self.check_trees(records_a.tree_sequence(sample_ids),
+                         records_b.tree_sequence(sample_ids))
+        self.check_haplotypes(records_a.tree_sequence(sample_ids),
+                              records_b.tree_sequence(sample_ids))
+
+    def test_background_simplify(self):
+        # simplifying in the background should give the same trees
+        N = 5
+        ngens = 20
+        for mut_rate in [0.0, 1.0]:
+            records_a = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=3,
+                                    mutation_rate=mut_rate)
+            records_b = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=3,
+                                    mutation_rate=mut_rate, background=True)
+            self.assertEqual(records_a.num_simplifies, records_b.num_simplifies)
+            self.check_tables(records_b)
+            sample_ids = [N*ngens + x for x in range(N)]
+            self.check_trees(records_a.tree_sequence(sample_ids),
+                             records_b.tree_sequence(sample_ids))
+            self.check_haplotypes(records_a.tree_sequence(sample_ids),
+                                  records_b.tree_sequence(sample_ids))
+
+    def test_windowed_simplify(self):
+        # simplifying window by window should give the same trees
+        N = 5
+        ngens = 20
+        for mut_rate in [0.0, 1.0]:
+            records_a = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=3,
+                                    mutation_rate=mut_rate)
+            for background in (False, True):
+                records_b = self.run_wf(N=N, ngens=ngens, nsamples=N,
+                                        simplify_interval=3, mutation_rate=mut_rate,
+                                        background=background, num_windows=4)
+                # the windows hold edges cut at their boundaries until the
+                # tables are asked for
+                self.assertTrue(records_b.num_edges >= records_a.num_edges)
+                self.assertEqual(records_a.tables.edges.num_rows,
+                                 records_b.tables.edges.num_rows)
+                self.assertEqual(records_a.num_edges, records_b.num_edges)
+                self.assertEqual(records_a.tables.sites.num_rows,
+                                 records_b.tables.sites.num_rows)
+                self.check_tables(records_b)
+                sample_ids = [N*ngens + x for x in range(N)]
+                self.check_trees(records_a.tree_sequence(sample_ids),
+                                 records_b.tree_sequence(sample_ids))
+                self.check_haplotypes(records_a.tree_sequence(sample_ids),
+                                      records_b.tree_sequence(sample_ids))
+                records_b.close()
+
+    def test_windowed_export(self):
+        # the windows are stitched together to export and to save, also with
+        # overlapping generations
+        N = 8
+        ngens = 20
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint")
+        for survival in (0.0, 0.5):
+            records_a = self.run_wf(N=N, ngens=ngens, nsamples=N, survival=survival,
+                                    simplify_interval=3, mutation_rate=1.0)
+            records_b = self.run_wf(N=N, ngens=ngens, nsamples=N, survival=survival,
+                                    simplify_interval=3, mutation_rate=1.0,
+                                    num_windows=3)
+            samples = records_a.sample_ids()
+            # made from the simplified windows, without simplifying again
+            ts_a = records_a.simplify(samples, return_ts=True)
+            ts_b = records_b.simplify(samples, return_ts=True)
+            self.check_trees(ts_a, ts_b)
+            self.check_haplotypes(ts_a, ts_b)
+            records_b.save(path)
+            records_c = ftprime.WindowedARGrecorder.load(path, num_windows=3)
+            self.check_trees(ts_b, records_c.tree_sequence(samples))
+            records_b.close()
+            records_c.close()
+
+    def test_snapshot(self):
+        # a snapshot should be what tree_sequence gives at the time it is
+        # taken, regardless of what is recorded afterwards
+        N = 10
+        ngens = 10
+        path = os.path.join(tempfile.mkdtemp(), "snapshot.trees")
+        for num_windows in (1, 3):
+            records = self.run_wf(N=N, ngens=ngens, nsamples=N, mutation_rate=1.0,
+                                  num_windows=num_windows)
+            parents = records.sample_ids()
+            num_sorted_edges = records.num_sorted_edges
+            future = records.snapshot(parents, path=path)
+            self.assertEqual(records.num_sorted_edges, num_sorted_edges)
+            children = [1000 + k for k in range(N)]
+            records.add_individuals(children, float(ngens + 1))
+            records.add_records(np.repeat(0.0, N), np.repeat(1.0, N),
+                                parents[::-1], children)
+            ts = future.result()
+            self.check_trees(ts, msprime.load(path))
+            ts_b = records.tree_sequence(parents)
+            self.check_trees(ts, ts_b)
+            self.check_haplotypes(ts, ts_b)
+            records.close()
+
+    def test_scheduler(self):
+        # simplifying when the scheduler says to should give the same trees
+        N = 5
+        ngens = 20
+        scheduler = ftprime.SimplifyScheduler(ratio=1.0, min_edges=20)
+        records_a = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=ngens)
+        records_b = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=None,
+                                scheduler=scheduler)
+        self.assertTrue(records_b.num_simplifies > 2)
+        self.assertEqual(scheduler.retained_edges, records_b.num_edges)
+        sample_ids = [N*ngens + x for x in range(N)]
+        self.check_trees(records_a.tree_sequence(sample_ids),
+                         records_b.tree_sequence(sample_ids))
+        # a tiny memory budget means simplifying every generation
+        scheduler = ftprime.SimplifyScheduler(memory_budget=1)
+        records_c = self.run_wf(N=N, ngens=ngens, nsamples=N, simplify_interval=None,
+                                scheduler=scheduler)
+        self.assertEqual(records_c.num_simplifies, ngens + 1)
+
+    def test_scheduler_background(self):
+        # the scheduler should see the edges kept by a simplify running in the
+        # background, and so simplify as often as in the foreground (with a
+        # fixed ratio, so timings do not matter)
+        N = 20
+        ngens = 60
+        num_simplifies = []
+        for background in (False, True):
+            scheduler = ftprime.SimplifyScheduler(ratio=1.0, min_ratio=1.0,
+                                                  max_ratio=1.0, min_edges=20)
+            records = self.run_wf(N=N, ngens=ngens, nsamples=N,
+                                  simplify_interval=None, scheduler=scheduler,
+                                  background=background)
+            num_simplifies.append(records.num_simplifies)
+        self.assertTrue(num_simplifies[0] > 2)
+        self.assertEqual(num_simplifies[0], num_simplifies[1])
+
     def test_get_nodes(self):
         N = 10
         ngens = 20
@@ -105,3 +255,29 @@ class WfTestCase(FtprimeTestCase):
 
         for t in ts.trees():
             print(t)
+
+    def test_sort_new_edges(self):
+        # after simplifying, sorting only the new edges should give
+        # properly sorted tables
+        N = 10
+        records = self.run_wf(N=N, ngens=10, nsamples=N)
+        parents = records.sample_ids()
+        for t in range(11, 13):
+            children = [1000 * t + k for k in range(N)]
+            records.add_individuals(children, float(t))
+            records.add_records(np.repeat(0.0, N), np.repeat(0.5, N),
+                                parents, children)
+            records.add_records(np.repeat(0.5, N), np.repeat(1.0, N),
+                                parents[::-1], children)
+            parents = children
+        records.update_times()
+        num_old = records.num_sorted_edges
+        self.assertTrue(num_old > 0)
+        records.sort_tables()
+        self.assertEqual(records.num_sorted_edges, records.tables.edges.num_rows)
+        self.check_tables(records)
+        # the new edges went in front
+        self.assertTrue(records.tables.edges.child[0] in
+                        [records.node_ids[u] for u in parents])
+        ts = records.tree_sequence(parents)
+        self.assertEqual(ts.num_samples, N)
@@ -1,5 +1,5 @@
 import msprime
-from ftprime import ARGrecorder
+from ftprime import ARGrecorder, WindowedARGrecorder
 from itertools import count
 import numpy as np
 
@@ -10,7 +10,8 @@ from .breakpoints import (
 
 
 def wf(N, ngens, nsamples, survival=0.0, mutation_rate=0.0, simplify_interval=10,
-       debug=False, seed=None) :
+       debug=False, seed=None, scheduler=None, background=False,
+       num_windows=1, batch_mutations=True) :
     '''
     SIMPLE simulation of a bisexual, haploid Wright-Fisher population of size N
     for ngens generations, in which each individual survives with probability
@@ -20,6 +21,13 @@ def wf(N, ngens, nsamples, survival=0.0, mutation_rate=0.0, simplify_interval=10
 
     Outputs an ARGrecorder object for the simulation.  In the final generation,
     a random set of individuals are chosen to be samples.
+
+    If simplify_interval is None, then scheduler decides when to simplify.
+    If background is True, simplification (except the last) is done on another
+    thread.
+    If num_windows is more than one, a WindowedARGrecorder is used.
+    If batch_mutations is False, mutations are recorded one at a time, rather
+    than a generation at once.
     '''
     if seed is not None:
         np.random.seed(seed)
@@ -30,7 +38,12 @@ def wf(N, ngens, nsamples, survival=0.0, mutation_rate=0.0, simplify_interval=10
     # initial population
     init_ts = msprime.simulate(N, recombination_rate=1.0, random_seed=seed)
     init_samples = init_ts.samples()
-    records = ARGrecorder(ts=init_ts, node_ids={k:init_samples[k] for k in range(N)})
+    node_ids = {k:init_samples[k] for k in range(N)}
+    if num_windows == 1:
+        records = ARGrecorder(ts=init_ts, node_ids=node_ids, scheduler=scheduler)
+    else:
+        records = WindowedARGrecorder(num_windows=num_windows, ts=init_ts,
+                                      node_ids=node_ids, scheduler=scheduler)
 
     for t in range(1, 1+ngens) :
         if debug:
@@ -38,14 +51,18 @@ def wf(N, ngens, nsamples, survival=0.0, mutation_rate=0.0, simplify_interval=10
             print("pop:", pop)
             print(records)
 
-        if (t % simplify_interval) == 0:
-            records.simplify(pop)
+        if simplify_interval is None:
+            records.maybe_simplify(pop, background=background)
+        elif (t % simplify_interval) == 0:
+            records.simplify(pop, background=background)
 
         dead = [(np.random.uniform() > survival) for k in pop]
         # this is: offspring ID, lparent, rparent, breakpoint
         new_inds = [(next(labels), np.random.choice(pop), np.random.choice(pop), 
                      random_breakpoint(), random_mutations(mutation_rate))
                     for k in range(sum(dead))]
+        mut_positions = []
+        mut_nodes = []
         j=0
         if debug:
             print("Replacing", sum(dead), "individuals.")
@@ -61,9 +78,17 @@ def wf(N, ngens, nsamples, survival=0.0, mutation_rate=0.0, simplify_interval=10
                 records.add_record(left=0.0, right=bp, parent=lparent, children=(offspring,))
             if bp < 1.0 :
                 records.add_record(left=bp, right=1.0, parent=rparent, children=(offspring,))
-            for mut in muts:
-                records.add_mutation(position=mut, node=offspring, 
-                                     derived_state=b'1', ancestral_state=b'0')
+            if batch_mutations:
+                mut_positions.extend(muts)
+                mut_nodes.extend([offspring] * len(muts))
+            else:
+                for mut in muts:
+                    records.add_mutation(position=mut, node=offspring,
+                                         derived_state=b'1', ancestral_state=b'0')
+        # positions are continuous, so every mutation gets a new site
+        records.add_mutations(positions=mut_positions, nodes=mut_nodes,
+                              derived_states=b'1', ancestral_states=b'0',
+                              infinite_sites=True)
 
     if debug:
         print("Done, now sampling.")